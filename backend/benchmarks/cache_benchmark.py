@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Response Cache Micro-Benchmark
+
+Measures the per-operation cost of inserts (with eviction) and lookups at several
+cache sizes for the response cache backends, and for the previous dict-based cache
+that scanned every timestamp on insert (kept here as a baseline).
+
+Usage:
+    cd backend
+    python benchmarks/cache_benchmark.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import stubs  # noqa: F401  (puts backend/ on sys.path)
+from response_cache import InMemoryResponseCache, SQLiteResponseCache
+
+RESPONSE = {"answer": "x" * 2000, "sources": [{"course_code": "DIT005"}] * 5, "content_type": "course"}
+
+
+class LegacyDictCache:
+    """The response cache as it was before: O(n) expiry scan and min() eviction on every insert."""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.response_cache = {}
+        self.cache_timestamps = {}
+
+    def get(self, cache_key: str):
+        if cache_key not in self.response_cache:
+            return None
+        if time.time() - self.cache_timestamps.get(cache_key, 0) > self.ttl:
+            del self.response_cache[cache_key]
+            del self.cache_timestamps[cache_key]
+            return None
+        return self.response_cache.get(cache_key)
+
+    def set(self, cache_key: str, response: Dict):
+        current_time = time.time()
+        expired_keys = [key for key, ts in self.cache_timestamps.items() if current_time - ts > self.ttl]
+        for key in expired_keys:
+            del self.response_cache[key]
+            del self.cache_timestamps[key]
+        if len(self.response_cache) >= self.max_size:
+            oldest_key = min(self.cache_timestamps.keys(), key=lambda k: self.cache_timestamps[k])
+            del self.response_cache[oldest_key]
+            del self.cache_timestamps[oldest_key]
+        self.response_cache[cache_key] = response
+        self.cache_timestamps[cache_key] = current_time
+
+
+def prefill(cache, size: int):
+    """Fill a cache to capacity without timing it (bypassing the O(n) insert of the legacy cache)."""
+    now = time.time()
+    if isinstance(cache, LegacyDictCache):
+        for i in range(size):
+            cache.response_cache[f"key-{i}"] = RESPONSE
+            cache.cache_timestamps[f"key-{i}"] = now
+    else:
+        for i in range(size):
+            cache.set(f"key-{i}", RESPONSE)
+
+
+def measure(cache, size: int, operations: int) -> Dict:
+    """Time inserts of new keys (each evicting one entry) and lookups of existing keys on a full cache."""
+    prefill(cache, size)
+
+    start = time.perf_counter()
+    for i in range(operations):
+        cache.set(f"new-{i}", RESPONSE)
+    insert_us = (time.perf_counter() - start) / operations * 1e6
+
+    start = time.perf_counter()
+    for i in range(operations):
+        cache.get(f"key-{size - 1 - (i % (size // 2))}")
+    lookup_us = (time.perf_counter() - start) / operations * 1e6
+
+    return {"insert_us": round(insert_us, 2), "lookup_us": round(lookup_us, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark response cache insert/lookup cost")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--operations", type=int, default=2000, help="timed inserts and lookups per size")
+    parser.add_argument("--legacy-max-size", type=int, default=10000,
+                        help="skip the O(n) legacy cache above this size")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results: List[Dict] = []
+    print(f"{'backend':<10} {'size':>8} {'insert_us':>10} {'lookup_us':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            backends = {
+                "memory": InMemoryResponseCache(size, ttl=3600),
+                "sqlite": SQLiteResponseCache(os.path.join(tmp_dir, f"cache-{size}.db"), size, ttl=3600),
+            }
+            if size <= args.legacy_max_size:
+                backends["legacy"] = LegacyDictCache(size, ttl=3600)
+
+            for name, cache in backends.items():
+                result = {"backend": name, "size": size, **measure(cache, size, args.operations)}
+                results.append(result)
+                print(f"{name:<10} {size:>8} {result['insert_us']:>10.2f} {result['lookup_us']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "response_cache", "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
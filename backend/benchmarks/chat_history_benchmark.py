@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Chat History Store Benchmark
+
+Seeds a SQLite ChatHistoryStore with many sessions and measures loading one
+history, listing the first page, deep pages (keyset cursor vs offset) and saving
+a conversation that grew by one message. The old in-memory dict (sorting every
+history on each listing) is timed on the same data for comparison.
+
+Usage:
+    cd backend
+    python benchmarks/chat_history_benchmark.py --sessions 100000
+"""
+
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from stubs import summarize_latencies
+from chat_history_store import ChatHistoryStore, _dump
+
+
+def message(i: int) -> Dict:
+    """A frontend-shaped chat message."""
+    if i % 2 == 0:
+        return {"role": "user", "content": f"What are the prerequisites for DIT{100 + i % 60}?"}
+    return {"role": "assistant", "content": "The course requires 7.5 credits in programming. " * 8,
+            "sources": [{"course_code": f"DIT{100 + i % 60}", "section": "Prerequisites"}]}
+
+
+def seed(store: ChatHistoryStore, sessions: int, messages_per_session: int) -> List[str]:
+    """Bulk insert sessions with distinct updated_at timestamps."""
+    start = datetime(2025, 1, 1)
+    session_ids = [f"session-{i:07d}" for i in range(sessions)]
+    with store.db.transaction() as conn:
+        for offset in range(0, sessions, 10000):
+            batch = session_ids[offset:offset + 10000]
+            conn.executemany(
+                "INSERT INTO chat_histories (session_id, title, message_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(sid, f"Chat {sid}", messages_per_session,
+                  (start + timedelta(seconds=offset + i)).isoformat(timespec="microseconds"),
+                  (start + timedelta(seconds=offset + i)).isoformat(timespec="microseconds"))
+                 for i, sid in enumerate(batch)]
+            )
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, position, message) VALUES (?, ?, ?)",
+                [(sid, position, _dump(message(position)))
+                 for sid in batch for position in range(messages_per_session)]
+            )
+    return session_ids
+
+
+def timed(func: Callable, repeats: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite chat history store")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=6, help="messages per session")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChatHistoryStore(str(Path(tmp) / "chat_histories.db"))
+        seed_start = time.perf_counter()
+        session_ids = seed(store, args.sessions, args.messages)
+        print(f"Seeded {args.sessions:,} sessions x {args.messages} messages in {time.perf_counter() - seed_start:.1f}s")
+
+        deep_offset = args.sessions // 2
+        deep_cursor = store.list(limit=deep_offset - 1, include_messages=False)["next_cursor"]
+        grown = [message(i) for i in range(args.messages + 1)]
+
+        results = {
+            "get": timed(lambda: store.get(rng.choice(session_ids)), args.repeats),
+            "list_first_page": timed(lambda: store.list(limit=args.page_size), args.repeats),
+            "list_first_page_no_messages": timed(
+                lambda: store.list(limit=args.page_size, include_messages=False), args.repeats),
+            "list_deep_page_cursor": timed(
+                lambda: store.list(limit=args.page_size, cursor=deep_cursor), args.repeats),
+            "list_deep_page_offset": timed(
+                lambda: store.list(limit=args.page_size, offset=deep_offset), max(1, args.repeats // 10)),
+            "save_grown_conversation": timed(
+                lambda: store.save(rng.choice(session_ids), grown[:args.messages + 1]), args.repeats),
+            "append_message": timed(
+                lambda: store.append_messages(rng.choice(session_ids), [message(0)]), args.repeats),
+        }
+
+        # Previous implementation: a dict of histories sorted on every listing
+        histories = {sid: {"session_id": sid, "messages": [message(p) for p in range(args.messages)],
+                           "updated_at": datetime(2025, 1, 1) + timedelta(seconds=i)}
+                     for i, sid in enumerate(session_ids)}
+        results["dict_list_first_page"] = timed(
+            lambda: sorted(histories.values(), key=lambda h: h["updated_at"], reverse=True)[:args.page_size],
+            max(1, args.repeats // 10)
+        )
+        store.close()
+
+    print(f"{'operation':<30} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:<30} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "chat_history", "sessions": args.sessions, "messages": args.messages,
+                       "page_size": args.page_size, "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Concurrency Benchmark
+
+Measures how /chat throughput scales with the number of concurrent requests when
+the query path is synchronous (query() called inside the event loop, as the API
+did before) versus asynchronous (aquery()), and the time to first token of the
+streaming path (astream_query()). Embeddings and Gemini are replaced by stubs
+with configurable latency so the benchmark runs offline.
+
+Usage:
+    cd backend
+    python benchmarks/concurrency_benchmark.py --levels 1 2 4 8 16 --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List
+
+from stubs import build_stub_engine, summarize_latencies
+from rag_system import ConversationContext
+
+QUESTIONS = [
+    "What are the prerequisites for DIT105?",
+    "What is DIT112 about?",
+    "How is DIT120 assessed?",
+    "Which courses cover machine learning?",
+    "Tell me about the computer science master program",
+    "What are the learning outcomes of DIT131?",
+]
+
+
+async def run_level(engine, mode: str, concurrency: int, requests_per_worker: int) -> Dict:
+    """Run `concurrency` workers that each send `requests_per_worker` questions back to back."""
+    latencies: List[float] = []
+    first_token_latencies: List[float] = []
+    
+    async def worker(worker_id: int):
+        for i in range(requests_per_worker):
+            question = QUESTIONS[(worker_id + i) % len(QUESTIONS)]
+            conversation = ConversationContext(client_id=f"bench-{mode}-{worker_id}-{i}")
+            start = time.perf_counter()
+            if mode == "sync":
+                engine.query(question, conversation=conversation)
+            elif mode == "async":
+                await engine.aquery(question, conversation=conversation)
+            else:
+                first_token_at = None
+                async for event in engine.astream_query(question, conversation=conversation):
+                    if event["event"] == "token" and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                first_token_latencies.append(first_token_at - start)
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    total_requests = concurrency * requests_per_worker
+    result = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total_requests / elapsed, 2),
+        **summarize_latencies(latencies),
+    }
+    if first_token_latencies:
+        result["time_to_first_token"] = summarize_latencies(first_token_latencies)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async query throughput")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests-per-worker", type=int, default=3)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the first LLM token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    engine = build_stub_engine(embedding_latency=args.embedding_latency, llm_latency=args.llm_latency,
+                               token_delay=args.token_delay)
+    engine.cache_enabled = False  # Measure the full pipeline on every request
+    
+    results = []
+    print(f"{'mode':<6} {'conc':>5} {'reqs':>5} {'elapsed_s':>10} {'req/s':>8} {'p50_ms':>9} {'p95_ms':>9} {'ttft_p50':>9}")
+    for mode in ("sync", "async", "stream"):
+        for concurrency in args.levels:
+            result = asyncio.run(run_level(engine, mode, concurrency, args.requests_per_worker))
+            results.append(result)
+            print(f"{mode:<6} {concurrency:>5} {result['requests']:>5} {result['elapsed_s']:>10.2f} "
+                  f"{result['throughput_rps']:>8.2f} {result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f} "
+                  f"{result.get('time_to_first_token', {}).get('p50_ms', float('nan')):>9.0f}")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "benchmark": "concurrency",
+                "embedding_latency_s": args.embedding_latency,
+                "llm_latency_s": args.llm_latency,
+                "results": results,
+            }, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
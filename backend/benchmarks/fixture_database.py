@@ -0,0 +1,124 @@
+"""
+Fixture course database for offline benchmarks.
+
+Builds a small SQLite database from database/schema.sql filled with synthetic
+courses (overview, sections, details, program mappings and URLs), so the real
+DatabaseDocumentLoader can produce the documents the benchmarks index, without
+the scraped data/csexpert.db.
+"""
+import os
+import sqlite3
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from stubs import BACKEND_DIR, BENCHMARK_DIR, SYNTHETIC_SECTIONS, SYNTHETIC_TOPICS
+from database_document_loader import DatabaseDocumentLoader
+
+SCHEMA_PATH = BACKEND_DIR.parent / "database" / "schema.sql"
+
+# Created by the scraper (scraper/database_url_extractor.py), not by schema.sql
+EXTRACTION_URLS_TABLE = """
+CREATE TABLE IF NOT EXISTS extraction_urls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    url_type TEXT NOT NULL CHECK (url_type IN ('syllabus', 'course_page', 'program_page', 'program_syllabus')),
+    course_code TEXT,
+    source_search_url TEXT,
+    extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status TEXT DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(url, url_type)
+);
+"""
+
+FIXTURE_DEPARTMENTS = [
+    "Department of Computer Science and Engineering",
+    "Department of Applied Information Technology",
+    "Department of Mathematical Sciences",
+]
+FIXTURE_PROGRAMS = ["N2COS", "N2SOF", "N1SOF"]
+FIXTURE_TERMS = ["Autumn 2025", "Spring 2026"]
+FIXTURE_STUDY_FORMS = ["Campus", "Distance"]
+
+
+def build_fixture_database(db_path: str, num_courses: int = 60) -> str:
+    """
+    Create a deterministic course database at db_path (replacing any existing file).
+
+    Args:
+        db_path: Where to write the SQLite database
+        num_courses: Number of synthetic courses (DIT100, DIT101, ...)
+
+    Returns:
+        The database path
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+        conn.executescript(EXTRACTION_URLS_TABLE)
+        program_ids = dict(conn.execute("SELECT program_code, id FROM programs").fetchall())
+
+        for i in range(num_courses):
+            course_code = f"DIT{100 + i:03d}"
+            topic = SYNTHETIC_TOPICS[i % len(SYNTHETIC_TOPICS)]
+            credits = 7.5 if i % 3 else 15.0
+            cursor = conn.execute(
+                """
+                INSERT INTO courses (course_code, course_title, department, credits, cycle,
+                                     language_of_instruction_id, study_form, term, main_field_of_study)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    course_code,
+                    f"{topic.title()} {i // len(SYNTHETIC_TOPICS) + 1}",
+                    FIXTURE_DEPARTMENTS[i % len(FIXTURE_DEPARTMENTS)],
+                    credits,
+                    "Second cycle" if i % 2 else "First cycle",
+                    1 + i % 2,
+                    FIXTURE_STUDY_FORMS[i % len(FIXTURE_STUDY_FORMS)],
+                    FIXTURE_TERMS[i % len(FIXTURE_TERMS)],
+                    topic.title(),
+                )
+            )
+            course_id = cursor.lastrowid
+
+            conn.executemany(
+                "INSERT INTO course_sections (course_id, section_name, section_content) VALUES (?, ?, ?)",
+                [(course_id, name, template.format(credits=credits, topic=topic))
+                 for name, template in SYNTHETIC_SECTIONS.items()]
+            )
+            conn.execute(
+                """
+                INSERT INTO course_details (course_id, tuition_fee, duration, application_period, application_code)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (course_id, 20000 + 500 * (i % 10) if i % 4 else None, "1 Sep 2025 - 2 Nov 2025",
+                 "15 March - 15 April", f"GU-{86000 + i}")
+            )
+            conn.execute(
+                "INSERT INTO course_program_mapping (course_id, program_id, is_primary) VALUES (?, ?, 1)",
+                (course_id, program_ids[FIXTURE_PROGRAMS[i % len(FIXTURE_PROGRAMS)]])
+            )
+            conn.executemany(
+                "INSERT INTO extraction_urls (url, url_type, course_code, status) VALUES (?, ?, ?, 'completed')",
+                [(f"https://www.gu.se/en/study-gothenburg/syllabus/{course_code}", "syllabus", course_code),
+                 (f"https://www.gu.se/en/study-gothenburg/course/{course_code}", "course_page", course_code)]
+            )
+    return db_path
+
+
+def fixture_documents(num_courses: int = 60, db_path: Optional[str] = None,
+                      programs_dir: Optional[str] = None) -> List[Document]:
+    """
+    Build the fixture database and load its documents with DatabaseDocumentLoader.
+
+    Args:
+        num_courses: Number of synthetic courses
+        db_path: Database location (default: a file in the benchmark temp directory)
+        programs_dir: Program JSON directory (default: the loader's data/programs)
+    """
+    db_path = build_fixture_database(db_path or os.path.join(BENCHMARK_DIR, "fixture.db"), num_courses)
+    return DatabaseDocumentLoader(db_path=db_path, programs_dir=programs_dir).load_all_documents()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Hybrid Retrieval Benchmark
+
+Compares the multi-query retrieval (one vector search per query variation) with
+hybrid retrieval (one vector search fused with FTS5/BM25 by reciprocal rank fusion)
+on latency, embedding calls and recall@k. Questions are labelled from the synthetic
+course documents, so the relevant set of every question is known exactly.
+
+Usage:
+    cd backend
+    python benchmarks/hybrid_benchmark.py --embedding-latency 0.1 --k 10
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List, Set, Tuple
+
+from langchain_core.documents import Document
+
+from stubs import SYNTHETIC_TOPICS, build_stub_engine, summarize_latencies, synthetic_documents
+from rag_system import GothenburgUniversityRAG
+
+
+def doc_id(doc: Document) -> Tuple[str, str]:
+    """Identity of a synthetic document: (course code, section name or doc type)."""
+    return doc.metadata.get("course_code", ""), doc.metadata.get("section_name") or doc.metadata.get("doc_type", "")
+
+
+def labelled_questions(documents: List[Document]) -> List[Tuple[str, Set[Tuple[str, str]]]]:
+    """Questions paired with the ids of the documents that answer them."""
+    questions = []
+    for topic in SYNTHETIC_TOPICS:
+        for question, section in [
+            (f"Which courses cover {topic}?", "Course content"),
+            (f"What will I be able to do after a course in {topic}?", "Learning outcomes"),
+        ]:
+            relevant = {
+                doc_id(doc) for doc in documents
+                if doc.metadata.get("section_name") == section and topic in doc.page_content
+            }
+            questions.append((question, relevant))
+
+    # Asked by title only (no course code), so the course metadata lookup doesn't apply
+    overviews = [doc for doc in documents if doc.metadata.get("doc_type") == "course_overview"]
+    for overview in overviews[::5]:
+        relevant = {doc_id(doc) for doc in documents if doc.metadata.get("course_code") == overview.metadata["course_code"]}
+        questions.append((f"Tell me about the course {overview.metadata['course_title']}", relevant))
+    return questions
+
+
+def recall_at_k(retrieved: List[Document], relevant: Set[Tuple[str, str]], k: int) -> float:
+    """Fraction of the relevant documents (at most k) found in the top k results."""
+    found = {doc_id(doc) for doc in retrieved[:k]} & relevant
+    return len(found) / min(len(relevant), k) if relevant else 0.0
+
+
+def run_mode(engine: GothenburgUniversityRAG, mode: str, questions, k: int, repeats: int) -> Dict:
+    """Retrieve every labelled question and summarize latency, embedding calls and recall@k."""
+    latencies: List[float] = []
+    recalls: List[float] = []
+    engine.embeddings.calls = engine.embeddings.texts_embedded = 0
+    if engine.embedding_cache:
+        engine.embedding_cache.clear()  # Measure cold embedding cost on the first repeat
+
+    for _ in range(repeats):
+        for question, relevant in questions:
+            content_type = engine.route_query(question)
+            start = time.perf_counter()
+            documents = engine.retrieve_documents(question, content_type, mode=mode)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(recall_at_k(documents, relevant, k))
+
+    retrievals = repeats * len(questions)
+    return {
+        "mode": mode,
+        "retrievals": retrievals,
+        f"recall_at_{k}": round(sum(recalls) / len(recalls), 3),
+        "embedding_calls_per_question": round(engine.embeddings.calls / retrievals, 2),
+        "texts_embedded_per_question": round(engine.embeddings.texts_embedded / retrievals, 2),
+        **summarize_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-query vs hybrid BM25 + vector retrieval")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10, help="cut-off for recall@k")
+    parser.add_argument("--courses", type=int, default=60, help="number of synthetic courses")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="seconds per embedding call")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    documents = synthetic_documents(args.courses)
+    engine = build_stub_engine(documents, embedding_latency=args.embedding_latency)
+    questions = labelled_questions(documents)
+
+    results = []
+    print(f"{'mode':<12} {'recall@' + str(args.k):>10} {'embed_calls/q':>14} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for mode in ("multi_query", "hybrid"):
+        result = run_mode(engine, mode, questions, args.k, args.repeats)
+        results.append(result)
+        print(f"{mode:<12} {result[f'recall_at_{args.k}']:>10.3f} {result['embedding_calls_per_question']:>14.2f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "benchmark": "hybrid_retrieval",
+                "questions": len(questions),
+                "embedding_latency_s": args.embedding_latency,
+                "results": results
+            }, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
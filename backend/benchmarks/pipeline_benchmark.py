@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Offline Query Pipeline Benchmark
+
+Builds a Chroma collection from a fixture course database (loaded with the real
+DatabaseDocumentLoader) using deterministic local embeddings and a fake LLM with
+configurable latency, replays a set of representative questions through
+GothenburgUniversityRAG.query() and reports p50/p95/p99 latency per pipeline stage
+and end to end, plus documents retrieved and context size per question.
+
+The response cache is cleared before every question, so each one runs the full
+route -> retrieve -> generate path. Results are written as JSON so runs from
+different commits can be diffed.
+
+Usage:
+    cd backend
+    python benchmarks/pipeline_benchmark.py --llm-latency 0.5 --output pipeline.json
+"""
+
+import argparse
+import functools
+import json
+import logging
+import platform
+import subprocess
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from stubs import BACKEND_DIR, build_stub_engine, percentile, summarize_latencies
+from fixture_database import fixture_documents
+from config import RAGConfig
+from rag_system import ConversationContext, GothenburgUniversityRAG
+
+# Engine methods timed on every call (inclusive of the stages they call)
+STAGES = [
+    "_validate_question",
+    "route_query",
+    "generate_query_variations",
+    "retrieve_documents",
+    "_truncate_context",
+    "generate_answer",
+]
+
+QUESTIONS = [
+    "What are the prerequisites for DIT105?",
+    "What are the learning outcomes of DIT112?",
+    "How is DIT120 assessed?",
+    "What is the tuition fee for DIT131?",
+    "Which courses cover machine learning?",
+    "Which courses teach software testing?",
+    "Tell me about the Computer Science Master's Programme",
+    "What courses are in the Software Engineering and Management Bachelor's Programme?",
+    "Which 7.5 credit courses are there?",
+    "courses in department of mathematical sciences",
+    "Which second cycle courses cover distributed systems?",
+    "Are there any distance courses in computer graphics?",
+    "What will I learn in a compilers course?",
+    "When is the application period for DIT140?",
+]
+
+
+class StageRecorder:
+    """Wraps engine methods to record call latencies and retrieval/context sizes."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.documents_retrieved: List[int] = []
+        self.raw_context_chars: List[int] = []
+        self.context_chars: List[int] = []
+
+    def instrument(self, engine: GothenburgUniversityRAG, name: str):
+        """Replace engine.<name> with a timed wrapper (instance attribute shadows the method)."""
+        method: Callable = getattr(engine, name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.latencies[name].append(time.perf_counter() - start)
+            if name == "retrieve_documents":
+                self.documents_retrieved.append(len(result))
+            elif name == "_truncate_context":
+                self.raw_context_chars.append(len(args[0]))
+                self.context_chars.append(len(result))
+            return result
+
+        setattr(engine, name, timed)
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    """Mean and p50/p95/p99 of plain counts."""
+    return {
+        "mean": round(sum(values) / len(values), 1) if values else 0.0,
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+    }
+
+
+def git_revision() -> str:
+    """Current commit of the repository, for labelling results."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run(engine: GothenburgUniversityRAG, recorder: StageRecorder, repeats: int) -> Dict:
+    """Replay the questions through the full pipeline and summarize the recorded stages."""
+    end_to_end: List[float] = []
+    errors = 0
+    for repeat in range(repeats):
+        for i, question in enumerate(QUESTIONS):
+            engine.clear_cache()
+            conversation = ConversationContext(client_id=f"benchmark-{repeat}-{i}")
+            start = time.perf_counter()
+            response = engine.query(question, conversation)
+            end_to_end.append(time.perf_counter() - start)
+            errors += bool(response.get("error"))
+
+    stages = {name: {"calls": len(recorder.latencies[name]), **summarize_latencies(recorder.latencies[name])}
+              for name in STAGES}
+    stages["end_to_end"] = {"calls": len(end_to_end), **summarize_latencies(end_to_end)}
+    return {
+        "queries": len(end_to_end),
+        "errors": errors,
+        "stages": stages,
+        "documents_retrieved": distribution(recorder.documents_retrieved),
+        "raw_context_chars": distribution(recorder.raw_context_chars),
+        "context_chars": distribution(recorder.context_chars),
+        "embedding_calls_per_query": round(engine.embeddings.calls / len(end_to_end), 2),
+        "llm_calls_per_query": round(engine.llm.calls / len(end_to_end), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the query pipeline per stage on a fixture database")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the question set")
+    parser.add_argument("--courses", type=int, default=60, help="number of fixture courses")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM call")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    documents = fixture_documents(args.courses)
+    engine = build_stub_engine(documents, embedding_latency=args.embedding_latency, llm_latency=args.llm_latency)
+    recorder = StageRecorder()
+    for name in STAGES:
+        recorder.instrument(engine, name)
+
+    result = run(engine, recorder, args.repeats)
+
+    print(f"{len(documents)} fixture documents, {result['queries']} queries ({result['errors']} errors)")
+    print(f"{'stage':<28} {'calls':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for name, stage in result["stages"].items():
+        print(f"{name:<28} {stage['calls']:>6} {stage['p50_ms']:>9.2f} {stage['p95_ms']:>9.2f} {stage['p99_ms']:>9.2f}")
+    print(f"documents retrieved p50/p95: {result['documents_retrieved']['p50']:.0f}/{result['documents_retrieved']['p95']:.0f}, "
+          f"context chars p50/p95: {result['context_chars']['p50']:.0f}/{result['context_chars']['p95']:.0f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "benchmark": "query_pipeline",
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "documents": len(documents),
+                "questions": len(QUESTIONS),
+                "repeats": args.repeats,
+                "embedding_latency_s": args.embedding_latency,
+                "llm_latency_s": args.llm_latency,
+                "retrieval_mode": RAGConfig.RETRIEVAL_MODE,
+                **result
+            }, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
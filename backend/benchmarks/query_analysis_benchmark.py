@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Query Analysis Micro-Benchmark
+
+Measures the per-question cost of the single-pass QueryAnalyzer against the
+previous approach, where validation, routing, query expansion, retrieval planning,
+history enhancement and cache scoping each ran their own regexes and keyword scans
+over the question (reproduced below as a baseline).
+
+Usage:
+    cd backend
+    python benchmarks/query_analysis_benchmark.py --iterations 20000
+"""
+
+import argparse
+import json
+import re
+import time
+from typing import Dict, List
+
+import stubs  # noqa: F401  (puts backend/ on sys.path)
+from config import RAGConfig
+from query_analysis import QueryAnalyzer
+
+QUESTIONS = [
+    "What are the prerequisites for DIT105?",
+    "Which courses cover machien learing?",
+    "Tell me about the computer science master programme",
+    "Which 7.5 credit courses are there?",
+    "courses in department of computer science",
+    "first cycle courses in mathematics",
+    "who teaches it",
+    "What are the learning outcomes of the course? " * 4,
+]
+
+
+def legacy_analysis(question: str) -> Dict:
+    """The scans the pipeline stages used to run separately for one question."""
+    # _validate_question: one search per suspicious pattern, one substitution per typo
+    for pattern in RAGConfig.SUSPICIOUS_PATTERNS:
+        if re.search(pattern, question, re.IGNORECASE):
+            raise ValueError("Question contains potentially unsafe content")
+    question = question.strip()
+    for typo, correction in RAGConfig.TYPO_CORRECTIONS.items():
+        question = re.sub(r'\b' + re.escape(typo) + r'\b', correction, question, flags=re.IGNORECASE)
+    query_lower = question.lower()
+
+    # _enhance_question_with_history
+    explicit = re.search(r'\b(DIT\d{3}|TIA\d{3}|MSA\d{3}|LT\d{4})\b', question, re.IGNORECASE)
+    referential = [term for term in ['the course', 'that course', 'this course', 'the same',
+                                     'mentioned above', 'previous', 'above'] if term in query_lower]
+    implicit = any(pattern in query_lower for pattern in [
+        'what are the', 'what is the', 'how many', 'when is', 'who teaches', 'learning outcomes',
+        'prerequisites', 'grading', 'assessment', 'credits', 'exam', 'examination'])
+
+    # route_query
+    route_code = re.search(r'\b([A-Z]{2,4}\d{3})\b', question.upper())
+    program = (any(k in query_lower for k in ['program', 'programme', 'bachelor', 'master', 'degree'])
+               or any(n in query_lower for n in ['computer science', 'software engineering', 'game design']))
+    both = any(p in query_lower for p in ['courses in', 'courses included', 'what courses', 'course list', 'which courses'])
+    section = any(k in query_lower for k in ['prerequisites', 'entry requirements', 'learning outcomes', 'course content',
+                                             'assessment', 'grading', 'credits', 'teaching', 'exam', 'assignment'])
+
+    # _plan_retrieval
+    plan_code = re.search(r'\b([A-Z]{2,4}\d{3})\b', question.upper())
+    context = re.search(r'\(context: ([A-Z]{2,4}\d{3})\)', question)
+    plan_program = any(p in query_lower for p in ['program', 'programme', 'master', 'bachelor'])
+    mapping = next((v for k, v in RAGConfig.PROGRAM_QUERY_MAPPINGS.items() if k in query_lower), None)
+    credit = any(p in query_lower for p in ['credit', 'hp', '7.5', '15', '30'])
+    credits = re.search(r'(\d+\.?\d*)', query_lower) if credit else None
+    department = any(p in query_lower for p in ['department', 'department of', 'courses in department'])
+    cycle = any(p in query_lower for p in ['bachelor', 'master', 'phd', 'first cycle', 'second cycle', 'third cycle'])
+    plan_section = any(k in query_lower for k in [
+        'entry requirements', 'prerequisites', 'learning outcomes', 'assessment', 'course content',
+        'grading', 'evaluation', 'teaching', 'sub-courses', 'position', 'confirmation'])
+
+    # generate_query_variations
+    variation_code = re.search(r'\b([A-Z]{2,4}\d{3})\b', question.upper())
+    section_term = next((t for t in RAGConfig.SECTION_QUERY_MAPPINGS if t in query_lower), None)
+    credit_variants = "credit" in query_lower
+
+    # Semantic cache scope
+    scope = sorted(set(re.findall(r'\b([A-Z]{2,4}\d{3})\b', question.upper())))
+
+    return {
+        "explicit": explicit, "referential": referential, "implicit": implicit, "route_code": route_code,
+        "program": program, "both": both, "section": section, "plan_code": plan_code, "context": context,
+        "plan_program": plan_program, "mapping": mapping, "credits": credits, "department": department,
+        "cycle": cycle, "plan_section": plan_section, "variation_code": variation_code,
+        "section_term": section_term, "credit_variants": credit_variants, "scope": scope
+    }
+
+
+def measure(analyze, iterations: int) -> float:
+    """Average microseconds per question over all benchmark questions."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for question in QUESTIONS:
+            analyze(question)
+    return (time.perf_counter() - start) / (iterations * len(QUESTIONS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark per-question query analysis cost")
+    parser.add_argument("--iterations", type=int, default=20000, help="passes over the question set")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    analyzer = QueryAnalyzer()
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    results: List[Dict] = [
+        {"approach": "legacy_scans", "us_per_question": round(measure(legacy_analysis, args.iterations), 2)},
+        {"approach": "query_analyzer", "us_per_question": round(measure(analyzer.analyze, args.iterations), 2)},
+    ]
+
+    print(f"QueryAnalyzer compiled in {compile_ms:.2f} ms")
+    print(f"{'approach':<16} {'us/question':>12}")
+    for result in results:
+        print(f"{result['approach']:<16} {result['us_per_question']:>12.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "query_analysis", "compile_ms": round(compile_ms, 2),
+                       "questions": len(QUESTIONS), "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
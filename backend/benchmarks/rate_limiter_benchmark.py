@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Benchmark
+
+Measures is_allowed() throughput of the sliding window RateLimiter (a deque of
+timestamps per client behind one global lock) against GCRARateLimiter (one float
+per client, lock striping) with many distinct clients under multi-threaded load.
+Also reports memory per client and the cost of a get_global_stats() sweep.
+
+Usage:
+    cd backend
+    python benchmarks/rate_limiter_benchmark.py --clients 100000 --threads 1 4 8 16
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import stubs  # noqa: F401  (puts backend/ on sys.path)
+from rate_limiter import GCRARateLimiter, RateLimiter
+
+LIMITERS: Dict[str, Callable[[int], RateLimiter]] = {
+    "sliding_window": lambda limit: RateLimiter(limit, 60),
+    "gcra": lambda limit: GCRARateLimiter(limit, 60),
+}
+
+
+def client_ids(count: int) -> List[str]:
+    """Distinct client identifiers shaped like IPv4 addresses."""
+    return [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(count)]
+
+
+def measure_memory(factory: Callable[[int], RateLimiter], clients: List[str], limit: int) -> float:
+    """Bytes allocated per client after every client made `limit` requests."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    limiter = factory(limit)
+    for client_id in clients:
+        for _ in range(limit):
+            limiter.is_allowed(client_id)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return allocated / len(clients)
+
+
+def measure_throughput(limiter: RateLimiter, clients: List[str], threads: int, checks_per_thread: int,
+                       sweep: bool = False) -> float:
+    """is_allowed() calls per second with `threads` threads picking random clients.
+
+    With sweep=True a background thread keeps calling get_global_stats(), as a
+    /status poller or cleanup job would, while the checks run.
+    """
+    barrier = threading.Barrier(threads + 1)
+    done = threading.Event()
+
+    def sweeper():
+        while not done.is_set():
+            limiter.get_global_stats()
+            done.wait(0.05)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        picks = [rng.choice(clients) for _ in range(checks_per_thread)]
+        barrier.wait()
+        for client_id in picks:
+            limiter.is_allowed(client_id)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    sweep_thread = threading.Thread(target=sweeper) if sweep else None
+    barrier.wait()
+    start = time.perf_counter()
+    if sweep_thread:
+        sweep_thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    if sweep_thread:
+        sweep_thread.join()
+    return threads * checks_per_thread / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sliding window vs GCRA rate limiters")
+    parser.add_argument("--clients", type=int, default=100000, help="number of distinct clients")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--checks", type=int, default=50000, help="is_allowed() calls per thread")
+    parser.add_argument("--limit", type=int, default=10, help="requests per minute per client")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    clients = client_ids(args.clients)
+    results = []
+
+    print(f"{'limiter':<16} {'threads':>8} {'checks/s':>12} {'with_sweeps':>12} {'bytes/client':>13} "
+          f"{'stats_sweep_ms':>15}")
+    for name, factory in LIMITERS.items():
+        bytes_per_client = measure_memory(factory, clients, args.limit)
+
+        limiter = factory(args.limit)
+        for client_id in clients:  # Every client is known, as after a busy period
+            limiter.is_allowed(client_id)
+        start = time.perf_counter()
+        limiter.get_global_stats()
+        stats_ms = (time.perf_counter() - start) * 1000
+
+        for threads in args.threads:
+            throughput = measure_throughput(limiter, clients, threads, args.checks)
+            swept = measure_throughput(limiter, clients, threads, args.checks, sweep=True)
+            results.append({
+                "limiter": name,
+                "threads": threads,
+                "checks_per_second": round(throughput),
+                "checks_per_second_with_sweeps": round(swept),
+                "bytes_per_client": round(bytes_per_client, 1),
+                "global_stats_ms": round(stats_ms, 2),
+            })
+            print(f"{name:<16} {threads:>8} {throughput:>12,.0f} {swept:>12,.0f} {bytes_per_client:>13.1f} "
+                  f"{stats_ms:>15.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "rate_limiter", "clients": args.clients, "limit": args.limit,
+                       "checks_per_thread": args.checks, "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Retrieval Benchmark
+
+Compares per-question retrieval latency of the batched/parallel retrieval stage
+(retrieve_documents: one embedding call for all planned queries, Chroma searches
+fanned out on a worker pool) against the previous sequential approach, where every
+planned search embedded its own query and ran one after another.
+
+Usage:
+    cd backend
+    python benchmarks/retrieval_benchmark.py --embedding-latency 0.1 --repeats 5
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List
+
+from stubs import build_stub_engine, summarize_latencies
+from rag_system import GothenburgUniversityRAG
+
+QUESTIONS = [
+    "What are the prerequisites for DIT105?",
+    "What is DIT112 about?",
+    "How is DIT120 assessed?",
+    "Which courses cover machine learning?",
+    "Tell me about the computer science master program",
+    "Which 7.5 credit courses are there?",
+]
+
+
+def sequential_retrieve(engine: GothenburgUniversityRAG, question: str, content_type: str):
+    """Baseline: one embedding round trip per planned search, searches run sequentially."""
+    plan = engine._plan_retrieval(question, content_type)
+    results = {}
+    for search in plan.searches:
+        results[id(search)] = engine._execute_search(search, engine.embeddings.embed_query(search.query))
+    for search in engine._plan_fallback_searches(plan, results):
+        results[id(search)] = engine._execute_search(search, engine.embeddings.embed_query(search.query))
+    return engine._merge_retrieval_results(plan, results)
+
+
+def run_mode(engine: GothenburgUniversityRAG, mode: str, repeats: int) -> Dict:
+    """Retrieve every benchmark question `repeats` times and summarize latency and embedding calls."""
+    latencies: List[float] = []
+    engine.embeddings.calls = engine.embeddings.texts_embedded = 0
+    for _ in range(repeats):
+        for question in QUESTIONS:
+            content_type = engine.route_query(question)
+            start = time.perf_counter()
+            if mode == "sequential":
+                sequential_retrieve(engine, question, content_type)
+            else:
+                engine.retrieve_documents(question, content_type)
+            latencies.append(time.perf_counter() - start)
+
+    retrievals = repeats * len(QUESTIONS)
+    return {
+        "mode": mode,
+        "retrievals": retrievals,
+        "embedding_calls_per_question": round(engine.embeddings.calls / retrievals, 2),
+        "texts_embedded_per_question": round(engine.embeddings.texts_embedded / retrievals, 2),
+        **summarize_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs batched/parallel retrieval")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="seconds per embedding call")
+    parser.add_argument("--output", help="optional path for JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    engine = build_stub_engine(embedding_latency=args.embedding_latency)
+
+    results = []
+    print(f"{'mode':<11} {'embed_calls/q':>14} {'texts/q':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for mode in ("sequential", "batched"):
+        result = run_mode(engine, mode, args.repeats)
+        results.append(result)
+        print(f"{mode:<11} {result['embedding_calls_per_question']:>14.1f} {result['texts_embedded_per_question']:>8.1f} "
+              f"{result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f} {result['p99_ms']:>9.0f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "benchmark": "retrieval",
+                "embedding_latency_s": args.embedding_latency,
+                "results": results,
+            }, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
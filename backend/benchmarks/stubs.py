@@ -0,0 +1,229 @@
+"""
+Offline stand-ins for the Google embedding model and Gemini used by the benchmarks.
+
+The stubs are deterministic and simulate network latency (blocking sleeps for the
+sync APIs, asyncio sleeps for the async ones), so benchmark numbers reflect how the
+RAG pipeline schedules work rather than how fast Google answers today.
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+# Keep Chroma from phoning home during benchmark runs
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+# Keep benchmark engines from touching the real lexical index (each gets its own, see build_stub_engine)
+BENCHMARK_DIR = tempfile.mkdtemp(prefix="csexpert-benchmark-")
+os.environ.setdefault("LEXICAL_INDEX_PATH", os.path.join(BENCHMARK_DIR, "lexical_index.db"))
+
+# Make backend modules importable when running scripts from any directory
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+import chromadb
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from rag_system import GothenburgUniversityRAG
+from lexical_index import LexicalIndex
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+COURSE_CODE_PATTERN = re.compile(r"\b([A-Z]{2,4}\d{3})\b")
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words hashing embeddings with simulated API latency.
+    
+    Texts sharing words get similar vectors, so retrieval results are meaningful
+    enough to compare strategies. Each call (single query or whole batch) costs
+    one simulated round trip.
+    """
+    
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+        self.texts_embedded = 0
+    
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(token.encode()).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+    
+    def _record(self, count: int):
+        self.calls += 1
+        self.texts_embedded += count
+    
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self._record(len(texts))
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        self._record(1)
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._record(len(texts))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        self._record(1)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+class StubChatModel(BaseChatModel):
+    """Fake Gemini: waits `latency` seconds, then answers citing course codes from the context."""
+    
+    latency: float = 0.0
+    token_delay: float = 0.0
+    calls: int = 0
+    
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+    
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        # Only cite courses from the retrieved context, not the examples in the system prompt
+        prompt = prompt.split("Context from course documents", 1)[-1]
+        codes = list(dict.fromkeys(COURSE_CODE_PATTERN.findall(prompt)))[:3]
+        if codes:
+            return f"Based on the course documents, the most relevant courses are {', '.join(codes)}. " \
+                   f"Please check the syllabus of each course for full details."
+        return "I don't have specific information about that in my current course database."
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for word in self._answer(messages).split(" "):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+SYNTHETIC_SECTIONS = {
+    "Entry requirements": "To be eligible for the course the student must have completed {credits} credits in computer science including programming.",
+    "Course content": "The course covers {topic}, including theory, practical assignments and a project.",
+    "Learning outcomes": "After completing the course the student should be able to explain and apply {topic}.",
+    "Assessment": "The course is assessed by a written examination and assignments. Grades: Pass, Pass with distinction, Fail.",
+    "Form of teaching": "Teaching consists of lectures, exercises and supervised laboratory sessions.",
+}
+
+SYNTHETIC_TOPICS = [
+    "machine learning", "software testing", "databases", "algorithms", "computer graphics",
+    "distributed systems", "requirements engineering", "game development", "computer security",
+    "human computer interaction", "compilers", "data science",
+]
+
+
+def synthetic_documents(num_courses: int = 60) -> List[Document]:
+    """Generate course overview and section documents shaped like DatabaseDocumentLoader output."""
+    documents = []
+    for i in range(num_courses):
+        course_code = f"DIT{100 + i:03d}"
+        topic = SYNTHETIC_TOPICS[i % len(SYNTHETIC_TOPICS)]
+        course_title = f"{topic.title()} {i // len(SYNTHETIC_TOPICS) + 1}"
+        cycle = "Second cycle" if i % 2 else "First cycle"
+        credits = "7.5" if i % 3 else "15"
+        base_metadata = {
+            "course_code": course_code,
+            "course_title": course_title,
+            "department": "Department of Computer Science and Engineering",
+            "credits": credits,
+            "cycle": cycle,
+        }
+        documents.append(Document(
+            page_content=f"Course: {course_code} - {course_title}\nCredits: {credits} HP\nCycle: {cycle}",
+            metadata={**base_metadata, "doc_type": "course_overview"}
+        ))
+        for section_name, template in SYNTHETIC_SECTIONS.items():
+            documents.append(Document(
+                page_content=f"Course: {course_code} - {course_title}\nSection: {section_name}\n\n"
+                             + template.format(credits=credits, topic=topic),
+                metadata={**base_metadata, "doc_type": "course_section", "section_name": section_name}
+            ))
+    return documents
+
+
+def build_stub_engine(documents: Optional[List[Document]] = None,
+                      embedding_latency: float = 0.0,
+                      llm_latency: float = 0.0,
+                      token_delay: float = 0.0) -> GothenburgUniversityRAG:
+    """Create a GothenburgUniversityRAG backed by stub models and an in-memory Chroma collection."""
+    embeddings = StubEmbeddings(latency=0.0)
+    llm = StubChatModel(latency=llm_latency, token_delay=token_delay)
+    engine = GothenburgUniversityRAG(client_id="benchmark", embeddings=embeddings, llm=llm)
+    
+    # Index without latency, then switch latency on for the measured queries
+    documents = documents or synthetic_documents()
+    engine.vector_store = Chroma.from_documents(
+        documents=documents,
+        embedding=embeddings,
+        client=chromadb.EphemeralClient(),
+        collection_name=f"benchmark_{id(engine)}"
+    )
+    engine._tally_doc_types(documents)
+    engine.lexical_index = LexicalIndex(os.path.join(BENCHMARK_DIR, f"lexical_{id(engine)}.db"))
+    engine.lexical_index.rebuild(documents)
+    embeddings.latency = embedding_latency
+    embeddings.calls = embeddings.texts_embedded = 0
+    engine.is_initialized = True
+    return engine
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile of a list of values (0 for an empty list)."""
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def summarize_latencies(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 summary (milliseconds) of latencies given in seconds."""
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
@@ -0,0 +1,309 @@
+"""
+SQLite-backed chat history store.
+Persists chat histories through the shared DatabaseManager so they survive
+restarts and are shared between uvicorn workers. Sessions are listed newest first
+with keyset pagination on an (updated_at, session_id) index, and messages live in
+their own table so appending to a conversation doesn't rewrite it.
+"""
+import base64
+import json
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# The database package lives at the project root, next to backend/
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from database.connection_manager import DatabaseManager
+
+from config import RAGConfig
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_histories (
+    session_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_histories_updated ON chat_histories(updated_at, session_id);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    session_id TEXT NOT NULL REFERENCES chat_histories(session_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    message TEXT NOT NULL,  -- JSON object as sent by the frontend
+    PRIMARY KEY (session_id, position)
+) WITHOUT ROWID;
+"""
+
+HISTORY_COLUMNS = "session_id, title, message_count, created_at, updated_at"
+
+
+def _now() -> str:
+    """Fixed-width ISO timestamp, so string order equals time order."""
+    return datetime.now().isoformat(timespec="microseconds")
+
+
+def _dump(message: Dict) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_cursor(updated_at: str, session_id: str) -> str:
+    """Opaque cursor pointing just after a listed history."""
+    return base64.urlsafe_b64encode(json.dumps([updated_at, session_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        updated_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(updated_at), str(session_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class ChatHistoryStore:
+    """Chat histories and their messages in SQLite (data/chat_histories.db by default)."""
+
+    def __init__(self, db_path: str = None, pool_size: int = 5):
+        """
+        Initialize the store and create its tables if needed.
+
+        Args:
+            db_path: SQLite database file (default: RAGConfig.CHAT_HISTORY_DB_PATH)
+            pool_size: Connections in the DatabaseManager pool
+        """
+        self.db = DatabaseManager(db_path or RAGConfig.CHAT_HISTORY_DB_PATH, pool_size)
+        with self.db.transaction() as conn:
+            conn.executescript(CHAT_HISTORY_SCHEMA)
+        logger.info(f"💬 Chat history store ready: {self.db.database_path}")
+
+    @contextmanager
+    def _write(self) -> Iterator:
+        """Write transaction that takes the write lock up front (read-then-write is safe across workers)."""
+        with self.db.transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    @staticmethod
+    def _history(row, messages: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        history = {
+            "session_id": row["session_id"],
+            "title": row["title"],
+            "message_count": row["message_count"],
+            "created_at": datetime.fromisoformat(row["created_at"]),
+            "updated_at": datetime.fromisoformat(row["updated_at"]),
+        }
+        if messages is not None:
+            history["messages"] = messages
+        return history
+
+    @staticmethod
+    def _insert_messages(conn, session_id: str, start: int, messages: List[Dict]):
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, position, message) VALUES (?, ?, ?)",
+            [(session_id, start + i, _dump(message)) for i, message in enumerate(messages)]
+        )
+
+    @staticmethod
+    def _load_messages(conn, session_id: str) -> List[Dict]:
+        rows = conn.execute(
+            "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY position", (session_id,)
+        ).fetchall()
+        return [json.loads(row["message"]) for row in rows]
+
+    def _replace_messages(self, conn, session_id: str, stored_count: int, messages: List[Dict]):
+        """
+        Store `messages` as the full conversation, writing only what changed.
+
+        The frontend re-sends the whole conversation on every save; when the stored
+        messages are a prefix of it (the last stored message is unchanged) only the
+        new tail is inserted, otherwise the conversation is rewritten.
+        """
+        start = 0
+        if 0 < stored_count <= len(messages):
+            last = conn.execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? AND position = ?",
+                (session_id, stored_count - 1)
+            ).fetchone()
+            if last is not None and last["message"] == _dump(messages[stored_count - 1]):
+                start = stored_count
+        if start < stored_count:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ? AND position >= ?", (session_id, start))
+        self._insert_messages(conn, session_id, start, messages[start:])
+
+    # === READS ===
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """A chat history with its messages, or None."""
+        with self.db.get_connection() as conn:
+            row = conn.execute(
+                f"SELECT {HISTORY_COLUMNS} FROM chat_histories WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._history(row, self._load_messages(conn, session_id))
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None, offset: int = 0,
+             include_messages: bool = True) -> Dict[str, Any]:
+        """
+        Chat histories, most recently updated first.
+
+        Args:
+            limit: Maximum histories to return
+            cursor: next_cursor of the previous page (keyset pagination; takes precedence over offset)
+            offset: Histories to skip (kept for older clients; cost grows with the offset)
+            include_messages: Whether to load the messages of the listed histories
+
+        Returns:
+            Dict with histories, total and next_cursor (None on the last page)
+        """
+        query = f"SELECT {HISTORY_COLUMNS} FROM chat_histories"
+        parameters: List[Any] = []
+        if cursor:
+            updated_at, session_id = decode_cursor(cursor)
+            query += " WHERE (updated_at, session_id) < (?, ?)"
+            parameters += [updated_at, session_id]
+        query += " ORDER BY updated_at DESC, session_id DESC LIMIT ?"
+        parameters.append(limit + 1)  # One extra row tells whether there is a next page
+        if offset and not cursor:
+            query += " OFFSET ?"
+            parameters.append(offset)
+
+        with self.db.get_connection() as conn:
+            rows = conn.execute(query, parameters).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            messages: Dict[str, List[Dict]] = {}
+            if include_messages and rows:
+                session_ids = [row["session_id"] for row in rows]
+                placeholders = ",".join("?" * len(session_ids))
+                for message_row in conn.execute(
+                    f"SELECT session_id, message FROM chat_messages WHERE session_id IN ({placeholders}) "
+                    f"ORDER BY session_id, position", session_ids
+                ):
+                    messages.setdefault(message_row["session_id"], []).append(json.loads(message_row["message"]))
+            total = conn.execute("SELECT COUNT(*) FROM chat_histories").fetchone()[0]
+
+        histories = [self._history(row, messages.get(row["session_id"], []) if include_messages else None)
+                     for row in rows]
+        next_cursor = encode_cursor(rows[-1]["updated_at"], rows[-1]["session_id"]) if has_more else None
+        return {"histories": histories, "total": total, "next_cursor": next_cursor}
+
+    # === WRITES ===
+
+    def save(self, session_id: str, messages: List[Dict], title: Optional[str] = None) -> Dict[str, Any]:
+        """Create or update a chat history with the full list of its messages."""
+        now = _now()
+        with self._write() as conn:
+            row = conn.execute(
+                f"SELECT {HISTORY_COLUMNS} FROM chat_histories WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    f"INSERT INTO chat_histories ({HISTORY_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, title or "New Chat", len(messages), now, now)
+                )
+                self._insert_messages(conn, session_id, 0, messages)
+                created_at = now
+            else:
+                self._replace_messages(conn, session_id, row["message_count"], messages)
+                conn.execute(
+                    "UPDATE chat_histories SET title = ?, message_count = ?, updated_at = ? WHERE session_id = ?",
+                    (title or row["title"], len(messages), now, session_id)
+                )
+                created_at = row["created_at"]
+                title = title or row["title"]
+
+        return {
+            "session_id": session_id,
+            "title": title or "New Chat",
+            "message_count": len(messages),
+            "messages": messages,
+            "created_at": datetime.fromisoformat(created_at),
+            "updated_at": datetime.fromisoformat(now),
+        }
+
+    def append_messages(self, session_id: str, messages: List[Dict], title: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Append messages to a chat history (created if missing) without touching stored ones.
+
+        Returns:
+            The updated history without its messages
+        """
+        now = _now()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT title, message_count, created_at FROM chat_histories WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    f"INSERT INTO chat_histories ({HISTORY_COLUMNS}) VALUES (?, ?, 0, ?, ?)",
+                    (session_id, title or "New Chat", now, now)
+                )
+                stored_count, created_at, title = 0, now, title or "New Chat"
+            else:
+                stored_count, created_at, title = row["message_count"], row["created_at"], title or row["title"]
+            self._insert_messages(conn, session_id, stored_count, messages)
+            conn.execute(
+                "UPDATE chat_histories SET title = ?, message_count = ?, updated_at = ? WHERE session_id = ?",
+                (title, stored_count + len(messages), now, session_id)
+            )
+
+        return {
+            "session_id": session_id,
+            "title": title,
+            "message_count": stored_count + len(messages),
+            "created_at": datetime.fromisoformat(created_at),
+            "updated_at": datetime.fromisoformat(now),
+        }
+
+    def update(self, session_id: str, title: Optional[str] = None,
+               messages: Optional[List[Dict]] = None) -> Optional[Dict[str, Any]]:
+        """Update the title and/or messages of an existing history; None if it doesn't exist."""
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT message_count FROM chat_histories WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            message_count = row["message_count"]
+            if messages is not None:
+                self._replace_messages(conn, session_id, message_count, messages)
+                message_count = len(messages)
+            conn.execute(
+                "UPDATE chat_histories SET title = COALESCE(?, title), message_count = ?, updated_at = ? "
+                "WHERE session_id = ?",
+                (title, message_count, _now(), session_id)
+            )
+        return self.get(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        """Delete a history and its messages; False if it doesn't exist."""
+        with self._write() as conn:
+            return conn.execute("DELETE FROM chat_histories WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def close(self):
+        self.db.close()
+
+
+# Global chat history store instance
+_global_chat_history_store: Optional[ChatHistoryStore] = None
+_global_chat_history_store_lock = threading.Lock()
+
+
+def get_chat_history_store() -> ChatHistoryStore:
+    """Get or create the process-wide chat history store."""
+    global _global_chat_history_store
+
+    with _global_chat_history_store_lock:
+        if _global_chat_history_store is None:
+            _global_chat_history_store = ChatHistoryStore()
+
+    return _global_chat_history_store
@@ -20,11 +20,30 @@ class RAGConfig:
     DEFAULT_K = int(os.getenv("DEFAULT_K", "20"))
     MAX_SEARCH_K = int(os.getenv("MAX_SEARCH_K", "50"))
     MIN_SEARCH_K = int(os.getenv("MIN_SEARCH_K", "5"))
+    RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "8"))  # Parallel Chroma searches per question
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "200"))  # Deepest result reachable by /search paging
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "multi_query")  # "multi_query" or "hybrid" (BM25 + vector, RRF)
+    RRF_K = int(os.getenv("RRF_K", "60"))  # Reciprocal rank fusion smoothing constant
+    ENABLE_LEXICAL_INDEX = os.getenv("ENABLE_LEXICAL_INDEX", "true").lower() == "true"
+    LEXICAL_INDEX_PATH = os.getenv(
+        "LEXICAL_INDEX_PATH", str(Path(__file__).parent.parent / "data" / "lexical_index.db")
+    )
     
     # === CACHE SETTINGS ===
-    CACHE_SIZE = int(os.getenv("CACHE_SIZE", "100"))
+    CACHE_SIZE = int(os.getenv("CACHE_SIZE", "10000"))
     CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # 1 hour in seconds
     ENABLE_CACHE = os.getenv("ENABLE_CACHE", "true").lower() == "true"
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+    RESPONSE_CACHE_DB_PATH = os.getenv(
+        "RESPONSE_CACHE_DB_PATH", str(Path(__file__).parent.parent / "data" / "response_cache.db")
+    )
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "5000"))
+    ENABLE_EMBEDDING_CACHE = os.getenv("ENABLE_EMBEDDING_CACHE", "true").lower() == "true"
+    PREWARM_EMBEDDING_CACHE = os.getenv("PREWARM_EMBEDDING_CACHE", "true").lower() == "true"
+    ENABLE_SEMANTIC_CACHE = os.getenv("ENABLE_SEMANTIC_CACHE", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+    ENABLE_REQUEST_COALESCING = os.getenv("ENABLE_REQUEST_COALESCING", "true").lower() == "true"
     
     # === CONTEXT MANAGEMENT ===
     MAX_CONTEXT_LENGTH = int(os.getenv("MAX_CONTEXT_LENGTH", "8000"))
@@ -35,14 +54,55 @@ class RAGConfig:
     
     # === MEMORY SETTINGS ===
     CONVERSATION_MEMORY_K = int(os.getenv("CONVERSATION_MEMORY_K", "5"))
+    CONVERSATION_MEMORY_MODE = os.getenv("CONVERSATION_MEMORY_MODE", "window")  # "window" (last k turns) or "summary"
+    SUMMARY_MEMORY_MAX_TOKENS = int(os.getenv("SUMMARY_MEMORY_MAX_TOKENS", "300"))  # Budget for the summary of older turns
     
     # === DATABASE SETTINGS ===
     CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "gu_courses_programs")
+    CHAT_HISTORY_DB_PATH = os.getenv(
+        "CHAT_HISTORY_DB_PATH", str(Path(__file__).parent.parent / "data" / "chat_histories.db")
+    )
     
     # === RATE LIMITING ===
     RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "10"))  # requests per minute
     RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory"/"gcra" (per worker) or "sqlite" (shared)
+    RATE_LIMIT_DB_PATH = os.getenv(
+        "RATE_LIMIT_DB_PATH", str(Path(__file__).parent.parent / "data" / "rate_limits.db")
+    )
+    RATE_LIMIT_LOCK_STRIPES = int(os.getenv("RATE_LIMIT_LOCK_STRIPES", "64"))  # gcra backend lock shards
+    RATE_LIMIT_ADAPTIVE = os.getenv("RATE_LIMIT_ADAPTIVE", "true").lower() == "true"  # Tighten limits under load
+    RATE_LIMIT_LOAD_THRESHOLD = float(os.getenv("RATE_LIMIT_LOAD_THRESHOLD", "0.8"))  # Load factor where limits start shrinking
+    RATE_LIMIT_CLEANUP_INTERVAL = float(os.getenv("RATE_LIMIT_CLEANUP_INTERVAL", "60"))  # seconds between purges of expired clients
+    
+    # === SESSION MEMORY ===
+    ENABLE_SESSION_MEMORY = os.getenv("ENABLE_SESSION_MEMORY", "true").lower() == "true"  # Server-side memory per session_id
+    SESSION_MEMORY_TTL = int(os.getenv("SESSION_MEMORY_TTL", "3600"))  # seconds since last message
+    SESSION_MEMORY_MAX_SESSIONS = int(os.getenv("SESSION_MEMORY_MAX_SESSIONS", "5000"))  # Least recently used evicted first
+    SESSION_MEMORY_MAX_COURSES = int(os.getenv("SESSION_MEMORY_MAX_COURSES", "10"))  # Recent course codes kept per session
+    
+    # === BATCH QUERIES ===
+    CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "100"))  # Questions per /chat/batch request
+    CHAT_BATCH_QUESTIONS_PER_REQUEST = int(os.getenv("CHAT_BATCH_QUESTIONS_PER_REQUEST", "10"))  # Distinct batch questions charged as one rate-limited request
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))  # Concurrent LLM calls per batch
+    
+    # === LLM ADMISSION CONTROL ===
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # Concurrent LLM calls per process (0 = unlimited)
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))  # Requests waiting for a slot before new ones are shed
+    LLM_QUEUE_MAX_WAIT = float(os.getenv("LLM_QUEUE_MAX_WAIT", "10.0"))  # seconds
+    LLM_OVERLOAD_FALLBACK = os.getenv("LLM_OVERLOAD_FALLBACK", "error")  # "error" (503) or "extractive" (document excerpts)
+    EXTRACTIVE_FALLBACK_DOCUMENTS = int(os.getenv("EXTRACTIVE_FALLBACK_DOCUMENTS", "3"))  # Excerpts in an extractive answer
+    
+    # === LOAD MONITORING ===
+    # Each signal at its capacity/target counts as full load (1.0)
+    LOAD_LLM_CAPACITY = int(os.getenv("LOAD_LLM_CAPACITY", "0"))  # LLM calls in flight + queued (0 = LLM_MAX_CONCURRENCY)
+    LOAD_QUEUE_TIME_TARGET = float(os.getenv("LOAD_QUEUE_TIME_TARGET", "2.0"))  # seconds
+    LOAD_LOOP_LAG_TARGET = float(os.getenv("LOAD_LOOP_LAG_TARGET", "0.25"))  # seconds
+    LOAD_MONITOR_INTERVAL = float(os.getenv("LOAD_MONITOR_INTERVAL", "1.0"))  # seconds between samples
+    
+    # === OBSERVABILITY ===
+    ENABLE_METRICS = os.getenv("ENABLE_METRICS", "true").lower() == "true"  # Serve GET /metrics
     
     # === TOKEN COST ESTIMATION ===
     # Rough cost per token for different models (in USD)
@@ -65,6 +125,50 @@ class RAGConfig:
         'algoritm': 'algorithm'
     }
     
+    # === QUERY VOCABULARY ===
+    # Map user terminology to likely JSON section names (used for query variations)
+    SECTION_QUERY_MAPPINGS = {
+        # Prerequisites/Requirements
+        'prerequisite': ['entry requirements', 'prerequisites', 'required courses'],
+        'requirement': ['entry requirements', 'prerequisites'],
+        'need': ['entry requirements', 'prerequisites'],
+        
+        # Assessment/Grading
+        'assessment': ['examination', 'grading', 'assessment methods'],
+        'exam': ['examination', 'assessment', 'grading'],
+        'grade': ['grading', 'examination', 'assessment'],
+        'test': ['examination', 'assessment'],
+        
+        # Course content
+        'about': ['course content', 'learning outcomes', 'course overview'],
+        'content': ['course content', 'learning outcomes'],
+        'topic': ['course content', 'learning outcomes'],
+        'cover': ['course content', 'learning outcomes'],
+        'syllabus': ['course content', 'learning outcomes'],
+        
+        # Teaching format
+        'teaching': ['form of teaching', 'teaching methods'],
+        'lecture': ['form of teaching', 'teaching methods'],
+        'format': ['form of teaching', 'teaching methods'],
+    }
+    
+    # Map common program queries to program codes/names
+    PROGRAM_QUERY_MAPPINGS = {
+        'computer science master': ['N2COS', 'Computer Science Master'],
+        'cs master': ['N2COS', 'Computer Science Master'],
+        'master in computer science': ['N2COS', 'Computer Science Master'],
+        'software engineering master': ['N2SOF', 'Software Engineering and Management Master'],
+        'software master': ['N2SOF', 'Software Engineering and Management Master'],
+        'software engineering bachelor': ['N1SOF', 'Software Engineering and Management Bachelor'],
+        'software bachelor': ['N1SOF', 'Software Engineering and Management Bachelor'],
+        'game design': ['N2GDT', 'Game Design Technology Master'],
+        'game design master': ['N2GDT', 'Game Design Technology Master'],
+    }
+    
+    # Fixed query variants added per content type
+    PROGRAM_QUERY_VARIANTS = ["programme", "degree program", "master program", "bachelor program"]
+    CREDIT_QUERY_VARIANTS = ["credits", "hp", "credit points"]
+    
     # === VALIDATION SETTINGS ===
     SUSPICIOUS_PATTERNS = [
         r'<script',
@@ -99,7 +203,7 @@ class RAGConfig:
             validations[f"env_{var}"] = bool(os.getenv(var))
         
         # Check numeric ranges
-        validations["cache_size_valid"] = 1 <= cls.CACHE_SIZE <= 1000
+        validations["cache_size_valid"] = 1 <= cls.CACHE_SIZE <= 100000
         validations["max_tokens_valid"] = 100 <= cls.MAX_TOKENS <= 8000
         validations["temperature_valid"] = 0.0 <= cls.TEMPERATURE <= 2.0
         
@@ -119,15 +223,51 @@ class RAGConfig:
             },
             "search_settings": {
                 "default_k": cls.DEFAULT_K,
-                "max_search_k": cls.MAX_SEARCH_K
+                "max_search_k": cls.MAX_SEARCH_K,
+                "retrieval_max_workers": cls.RETRIEVAL_MAX_WORKERS,
+                "search_max_results": cls.SEARCH_MAX_RESULTS,
+                "retrieval_mode": cls.RETRIEVAL_MODE,
+                "lexical_index_enabled": cls.ENABLE_LEXICAL_INDEX
             },
             "cache_settings": {
                 "enabled": cls.ENABLE_CACHE,
+                "backend": cls.RESPONSE_CACHE_BACKEND,
                 "size": cls.CACHE_SIZE,
-                "ttl": cls.CACHE_TTL
+                "ttl": cls.CACHE_TTL,
+                "embedding_cache_enabled": cls.ENABLE_EMBEDDING_CACHE,
+                "embedding_cache_size": cls.EMBEDDING_CACHE_SIZE,
+                "semantic_cache_enabled": cls.ENABLE_SEMANTIC_CACHE,
+                "semantic_cache_threshold": cls.SEMANTIC_CACHE_THRESHOLD,
+                "request_coalescing_enabled": cls.ENABLE_REQUEST_COALESCING
             },
             "rate_limiting": {
                 "requests_per_minute": cls.RATE_LIMIT_REQUESTS,
-                "window_seconds": cls.RATE_LIMIT_WINDOW
+                "window_seconds": cls.RATE_LIMIT_WINDOW,
+                "backend": cls.RATE_LIMIT_BACKEND,
+                "adaptive": cls.RATE_LIMIT_ADAPTIVE
+            },
+            "conversation_memory": {
+                "mode": cls.CONVERSATION_MEMORY_MODE,
+                "k": cls.CONVERSATION_MEMORY_K,
+                "summary_max_tokens": cls.SUMMARY_MEMORY_MAX_TOKENS
+            },
+            "session_memory": {
+                "enabled": cls.ENABLE_SESSION_MEMORY,
+                "ttl": cls.SESSION_MEMORY_TTL,
+                "max_sessions": cls.SESSION_MEMORY_MAX_SESSIONS
+            },
+            "batch": {
+                "max_questions": cls.CHAT_BATCH_MAX_QUESTIONS,
+                "questions_per_request": cls.CHAT_BATCH_QUESTIONS_PER_REQUEST,
+                "llm_concurrency": cls.BATCH_LLM_CONCURRENCY
+            },
+            "llm_admission": {
+                "max_concurrency": cls.LLM_MAX_CONCURRENCY,
+                "max_queue": cls.LLM_MAX_QUEUE,
+                "max_wait": cls.LLM_QUEUE_MAX_WAIT,
+                "overload_fallback": cls.LLM_OVERLOAD_FALLBACK
+            },
+            "observability": {
+                "metrics_enabled": cls.ENABLE_METRICS
             }
         } 
\ No newline at end of file
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Course Catalog Index
+
+In-memory index of current courses and programs, built once from the CSExpert
+database (courses, programs, course_program_mapping, course_details) at startup
+and on reload. Serves the /courses, /departments and /courses/by-* endpoints with
+dictionary lookups instead of Chroma scans or similarity searches.
+"""
+
+import logging
+import os
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COURSE_DOC_TYPES = ('course_overview', 'course_section', 'course_details')
+
+
+@dataclass
+class CatalogCourse:
+    """Catalog entry for one current course."""
+    code: str
+    title: str = ""
+    department: str = ""
+    credits: str = ""
+    cycle: str = ""
+    study_form: str = ""
+    term: str = ""
+    language: str = ""
+    programs: List[str] = field(default_factory=list)
+    tuition_fee: Optional[str] = None
+
+    def summary(self, *fields: str) -> Dict:
+        """The subset of fields returned by an endpoint, in the given order."""
+        data = asdict(self)
+        return {name: data[name] for name in fields}
+
+
+@dataclass
+class CatalogProgram:
+    """Catalog entry for one program."""
+    code: str
+    name: str = ""
+    program_type: str = ""
+    department: str = ""
+
+
+class CourseCatalog:
+    """Exact-match indexes over current courses by code, department, program, cycle and tuition."""
+
+    def __init__(self, courses: Iterable[CatalogCourse], programs: Iterable[CatalogProgram] = (),
+                 source: str = "database"):
+        """
+        Build the indexes.
+
+        Args:
+            courses: Current courses
+            programs: Known programs
+            source: Where the catalog was built from (for logging/status)
+        """
+        self.source = source
+        self.courses: Dict[str, CatalogCourse] = {course.code: course for course in courses}
+        self.programs: Dict[str, CatalogProgram] = {program.code: program for program in programs}
+
+        # Secondary indexes hold course codes in sorted order
+        self.sorted_codes: List[str] = sorted(self.courses)
+        by_department = defaultdict(list)
+        by_program = defaultdict(list)
+        by_cycle = defaultdict(list)
+        with_tuition = []
+        for code in self.sorted_codes:
+            course = self.courses[code]
+            if course.department:
+                by_department[self._department_key(course.department)].append(code)
+            for program_code in course.programs:
+                by_program[program_code.upper()].append(code)
+            if course.cycle:
+                by_cycle[course.cycle.lower()].append(code)
+            if course.tuition_fee:
+                with_tuition.append(code)
+
+        self.by_department: Dict[str, List[str]] = dict(by_department)
+        self.by_program: Dict[str, List[str]] = dict(by_program)
+        self.by_cycle: Dict[str, List[str]] = dict(by_cycle)
+        self.with_tuition: List[str] = with_tuition
+        self.department_names: Dict[str, str] = {
+            self._department_key(course.department): course.department
+            for course in self.courses.values() if course.department
+        }
+        self.departments: List[str] = sorted(self.department_names.values())
+
+        logger.info(f"📇 Course catalog built from {source}: {len(self.courses)} courses, "
+                    f"{len(self.departments)} departments, {len(self.by_program)} programs with courses")
+
+    @staticmethod
+    def _department_key(department: str) -> str:
+        """Normalize a department name or URL slug ("computer-science-and-engineering")."""
+        key = department.lower().replace("-", " ").strip()
+        if key.startswith("department of "):
+            key = key[len("department of "):]
+        return " ".join(key.split())
+
+    # === BUILDERS ===
+
+    @classmethod
+    def from_database(cls, db_path: str = None) -> "CourseCatalog":
+        """
+        Build the catalog from the CSExpert database (current, non-replaced courses only).
+
+        Args:
+            db_path: Path to the SQLite database (default: data/csexpert.db)
+        """
+        db_path = db_path or str(Path(__file__).parent.parent / "data" / "csexpert.db")
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database not found at {db_path}")
+
+        query = """
+        SELECT
+            c.course_code,
+            c.course_title,
+            c.department,
+            c.credits,
+            c.cycle,
+            c.study_form,
+            c.term,
+            ls.display_name as language_name,
+            cd.tuition_fee,
+            GROUP_CONCAT(DISTINCT p.program_code) as program_codes
+        FROM courses c
+        LEFT JOIN language_standards ls ON c.language_of_instruction_id = ls.id
+        LEFT JOIN course_details cd ON cd.course_id = c.id
+        LEFT JOIN course_program_mapping cpm ON c.id = cpm.course_id
+        LEFT JOIN programs p ON cpm.program_id = p.id
+        WHERE c.is_current = 1 AND c.is_replaced = 0
+        GROUP BY c.id
+        """
+
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            courses = [
+                CatalogCourse(
+                    code=row['course_code'],
+                    title=row['course_title'] or "",
+                    department=row['department'] or "",
+                    credits=str(row['credits']) if row['credits'] is not None else "",
+                    cycle=row['cycle'] or "",
+                    study_form=row['study_form'] or "",
+                    term=row['term'] or "",
+                    language=row['language_name'] or "",
+                    programs=sorted(row['program_codes'].split(',')) if row['program_codes'] else [],
+                    tuition_fee=str(row['tuition_fee']) if row['tuition_fee'] is not None else None
+                )
+                for row in conn.execute(query)
+            ]
+            programs = [
+                CatalogProgram(
+                    code=row['program_code'],
+                    name=row['program_name'] or "",
+                    program_type=row['program_type'] or "",
+                    department=row['department'] or ""
+                )
+                for row in conn.execute(
+                    "SELECT program_code, program_name, program_type, department FROM programs "
+                    "WHERE program_type != 'invalid'"
+                )
+            ]
+        finally:
+            conn.close()
+
+        return cls(courses, programs, source=db_path)
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[Dict]) -> "CourseCatalog":
+        """
+        Build the catalog from vector store document metadata (used when the database is unavailable).
+
+        Args:
+            metadatas: Metadata dicts of all indexed documents
+        """
+        courses: Dict[str, CatalogCourse] = {}
+        for metadata in metadatas:
+            if not metadata or metadata.get('doc_type') not in COURSE_DOC_TYPES or not metadata.get('course_code'):
+                continue
+
+            course = courses.setdefault(metadata['course_code'], CatalogCourse(code=metadata['course_code']))
+            for name, key in [('title', 'course_title'), ('department', 'department'), ('credits', 'credits'),
+                              ('cycle', 'cycle'), ('study_form', 'study_form'), ('term', 'term'),
+                              ('language', 'language')]:
+                if not getattr(course, name) and metadata.get(key):
+                    setattr(course, name, str(metadata[key]))
+            if metadata.get('programs') and not course.programs:
+                course.programs = sorted(p.strip() for p in str(metadata['programs']).split(',') if p.strip())
+            if metadata.get('has_tuition') and metadata.get('tuition_fee'):
+                course.tuition_fee = str(metadata['tuition_fee'])
+
+        return cls(courses.values(), source="vector store metadata")
+
+    # === LOOKUPS ===
+
+    def get_course(self, course_code: str) -> Optional[CatalogCourse]:
+        """Look up a course by code."""
+        return self.courses.get(course_code.upper())
+
+    def list_courses(self) -> List[CatalogCourse]:
+        """All current courses sorted by code."""
+        return [self.courses[code] for code in self.sorted_codes]
+
+    def courses_by_department(self, department: str) -> List[CatalogCourse]:
+        """Courses of a department, matched case-insensitively with or without the "Department of" prefix."""
+        return [self.courses[code] for code in self.by_department.get(self._department_key(department), [])]
+
+    def department_name(self, department: str) -> Optional[str]:
+        """Canonical name of a department, if known."""
+        return self.department_names.get(self._department_key(department))
+
+    def courses_by_program(self, program_code: str) -> List[CatalogCourse]:
+        """Courses mapped to a program."""
+        return [self.courses[code] for code in self.by_program.get(program_code.upper(), [])]
+
+    def courses_by_cycle(self, cycle: str) -> List[CatalogCourse]:
+        """Courses of an academic cycle ("First cycle", "Second cycle", ...)."""
+        return [self.courses[code] for code in self.by_cycle.get(cycle.lower(), [])]
+
+    def courses_with_tuition(self) -> List[CatalogCourse]:
+        """Courses with a tuition fee."""
+        return [self.courses[code] for code in self.with_tuition]
+
+    def get_stats(self) -> Dict:
+        """Catalog size summary."""
+        return {
+            "source": self.source,
+            "courses": len(self.courses),
+            "programs": len(self.programs),
+            "departments": len(self.departments),
+            "courses_with_tuition": len(self.with_tuition)
+        }
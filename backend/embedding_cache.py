@@ -0,0 +1,82 @@
+"""
+Query embedding cache for the RAG system.
+Avoids re-embedding the same search strings (fixed query variants, course code
+queries, popular questions) on every request.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of query embeddings keyed by embedding model and normalized text."""
+
+    def __init__(self, model_name: str, max_size: int = 5000):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            model_name: Embedding model the cached vectors belong to
+            max_size: Maximum number of embeddings kept before evicting the least recently used
+        """
+        self.model_name = model_name
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text so trivially different strings share an entry."""
+        return re.sub(r"\s+", " ", text.strip().lower())
+
+    def _key(self, text: str) -> Tuple[str, str]:
+        return (self.model_name, self.normalize(text))
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for a text, or None on a miss."""
+        key = self._key(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: List[float]):
+        """Store an embedding, evicting the least recently used entry if the cache is full."""
+        key = self._key(text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def contains(self, text: str) -> bool:
+        """Check for an entry without touching LRU order or hit/miss counters."""
+        with self._lock:
+            return self._key(text) in self._entries
+
+    def clear(self):
+        """Remove all cached embeddings and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -0,0 +1,187 @@
+"""
+Lexical (BM25) index for the RAG system.
+An SQLite FTS5 table over the indexed document text (course sections and the
+generated overview/program documents), so exact terms like course codes, section
+names and program names can be matched without an embedding call.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, TypeVar
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Question words that match nearly every document and only slow the BM25 query down
+STOPWORDS = frozenset({
+    "a", "about", "an", "and", "any", "are", "as", "at", "be", "can", "course", "courses", "do", "does",
+    "for", "from", "give", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "tell", "that",
+    "the", "there", "this", "to", "what", "when", "where", "which", "who", "with", "you"
+})
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Columns that can be used in a search filter ({"course_code": "DIT005"})
+FILTER_COLUMNS = ("course_code", "doc_type")
+
+
+class LexicalIndex:
+    """FTS5 full-text index of the vector store documents, ranked by BM25.
+
+    The index is rebuilt from the full document list whenever the loader runs, so it
+    always mirrors what was last indexed in Chroma. Course codes and section names
+    are indexed in their own columns and weighted above the body text.
+    """
+
+    # bm25() column weights: content, course_code, title, section_name
+    COLUMN_WEIGHTS = (1.0, 10.0, 3.0, 2.0)
+
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the index.
+
+        Args:
+            db_path: Path to the index database file (created if missing)
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()  # One connection per thread (searches run on the retrieval pool)
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS document_fts USING fts5(
+                    content,
+                    course_code,
+                    title,
+                    section_name,
+                    doc_type UNINDEXED,
+                    metadata UNINDEXED,
+                    tokenize = 'porter unicode61'
+                )
+            """)
+        logger.info(f"🔤 Lexical index at {self.db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")  # Searches don't block a rebuild
+            self._local.conn = conn
+        return conn
+
+    def rebuild(self, documents: Sequence[Document]) -> int:
+        """
+        Replace the index contents with the given documents in one transaction.
+
+        Args:
+            documents: Every document currently indexed in the vector store
+
+        Returns:
+            Number of indexed documents
+        """
+        rows = [
+            (
+                doc.page_content,
+                doc.metadata.get("course_code") or doc.metadata.get("program_code") or "",
+                doc.metadata.get("course_title") or doc.metadata.get("program_name") or "",
+                doc.metadata.get("section_name") or "",
+                doc.metadata.get("doc_type") or "",
+                json.dumps(doc.metadata, default=str)
+            )
+            for doc in documents
+        ]
+        with self._connection() as conn:
+            conn.execute("DELETE FROM document_fts")
+            conn.executemany(
+                "INSERT INTO document_fts (content, course_code, title, section_name, doc_type, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("INSERT INTO document_fts (document_fts) VALUES ('optimize')")
+        logger.info(f"🔤 Lexical index rebuilt with {len(rows)} documents")
+        return len(rows)
+
+    def count(self) -> int:
+        """Number of indexed documents."""
+        return self._connection().execute("SELECT COUNT(*) FROM document_fts").fetchone()[0]
+
+    @staticmethod
+    def build_match_query(text: str) -> Optional[str]:
+        """
+        Turn free text into an FTS5 MATCH expression (quoted terms joined with OR).
+
+        User input is never passed to FTS5 as query syntax, so quotes, colons and
+        operators in a question can't cause a syntax error.
+        """
+        terms = [
+            token for token in dict.fromkeys(TOKEN_PATTERN.findall(text.lower()))
+            if (len(token) > 1 or token.isdigit()) and token not in STOPWORDS
+        ]
+        if not terms:
+            return None
+        return " OR ".join(f'"{term}"' for term in terms)
+
+    def search(self, text: str, k: int, filter: Optional[Dict] = None) -> List[Document]:
+        """
+        BM25 search over the indexed documents.
+
+        Args:
+            text: Free-text query (e.g. the user's question)
+            k: Maximum number of documents
+            filter: Optional equality filter on course_code and/or doc_type
+
+        Returns:
+            Matching documents, best match first
+        """
+        match_query = self.build_match_query(text)
+        if match_query is None:
+            return []
+
+        conditions = ["document_fts MATCH ?"]
+        params: List = [match_query]
+        for column, value in (filter or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported lexical filter column: {column}")
+            conditions.append(f"{column} = ?")
+            params.append(value)
+
+        weights = ", ".join(str(weight) for weight in self.COLUMN_WEIGHTS)
+        rows = self._connection().execute(
+            f"SELECT content, metadata FROM document_fts WHERE {' AND '.join(conditions)} "
+            f"ORDER BY bm25(document_fts, {weights}) LIMIT ?",
+            (*params, k)
+        ).fetchall()
+        return [Document(page_content=content, metadata=json.loads(metadata)) for content, metadata in rows]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[T]], key: Callable[[T], Hashable],
+                           k: int = 60) -> List[T]:
+    """
+    Fuse several ranked lists with reciprocal rank fusion.
+
+    Each item scores sum(1 / (k + rank)) over the lists it appears in, so items
+    ranked well by both the lexical and the vector search rise to the top without
+    having to calibrate BM25 scores against cosine similarities.
+
+    Args:
+        rankings: Ranked lists, best first
+        key: Identity of an item across lists
+        k: RRF smoothing constant (60 in the original paper)
+
+    Returns:
+        Unique items ordered by fused score
+    """
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, T] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item_key, item)
+    return [items[item_key] for item_key in sorted(scores, key=scores.get, reverse=True)]
@@ -0,0 +1,211 @@
+"""
+Admission control for LLM calls.
+Caps how many Gemini calls run at once and how long (and how many) requests may
+queue for a slot, so a burst of questions is shed quickly instead of turning into
+hundreds of parallel upstream calls, quota errors and long tails.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional
+
+from config import RAGConfig
+from metrics import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+class LLMOverloadedError(Exception):
+    """An LLM call was refused because every slot is busy and the queue is full or too slow."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued request; woken by a thread event (sync) or a future on its event loop (async)."""
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.granted = False
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMAdmissionController:
+    """
+    Bounded concurrency with a bounded FIFO queue, shared by threads and asyncio tasks.
+
+    A finished call hands its slot directly to the oldest waiter. Requests are
+    rejected with LLMOverloadedError when the queue is already full, or when they
+    waited longer than max_wait without getting a slot.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_wait: float):
+        """
+        Initialize admission control.
+
+        Args:
+            max_concurrency: LLM calls allowed to run at once
+            max_queue: Requests allowed to wait for a slot (beyond that they are rejected at once)
+            max_wait: Seconds a request may wait for a slot before it is rejected
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        logger.info(f"🚪 LLM admission control: {max_concurrency} concurrent calls, "
+                    f"queue {max_queue}, max wait {max_wait}s")
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _retry_after(self) -> float:
+        """Suggested client back-off for a rejected request."""
+        return max(1, math.ceil(self.max_wait))
+
+    def _reject(self, reason: str) -> LLMOverloadedError:
+        self.rejected += 1
+        LLM_REJECTED.inc(reason=reason)
+        logger.warning(f"🚧 LLM overloaded ({reason}): {self.active} in flight, {len(self._waiters)} queued")
+        return LLMOverloadedError(
+            "The assistant is handling too many questions right now. Please try again shortly.",
+            self._retry_after()
+        )
+
+    def _enter(self, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or join the queue (False); raises when the queue is full."""
+        with self._lock:
+            if self.active < self.max_concurrency and not self._waiters:
+                self.active += 1
+                self._update_gauges()
+                return True
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("queue_full")
+            self._waiters.append(waiter)
+            self._update_gauges()
+            return False
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout or cancellation; False if a slot was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self._update_gauges()
+            return True
+
+    def _admitted(self, wait: float):
+        self.admitted += 1
+        LLM_QUEUE_WAIT.observe(wait)
+
+    def release(self):
+        """Free a slot, handing it to the oldest waiter if there is one."""
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True  # The slot moves to the waiter; active stays the same
+                waiter.wake()
+            else:
+                self.active -= 1
+            self._update_gauges()
+
+    def _update_gauges(self):
+        LLM_IN_FLIGHT.set(self.active)
+        LLM_QUEUE_DEPTH.set(len(self._waiters))
+
+    @contextmanager
+    def slot(self) -> Iterator[float]:
+        """
+        Hold an LLM slot for the duration of a with-block (blocking threads).
+
+        Yields:
+            Seconds spent waiting for the slot
+        """
+        start = time.perf_counter()
+        waiter = _Waiter()
+        if not self._enter(waiter):
+            if not waiter.event.wait(self.max_wait) and self._abandon(waiter):
+                raise self._reject("timeout")
+        wait = time.perf_counter() - start
+        self._admitted(wait)
+        try:
+            yield wait
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[float]:
+        """Async version of slot(); waiting doesn't block the event loop."""
+        start = time.perf_counter()
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._enter(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+            except asyncio.TimeoutError:
+                if self._abandon(waiter):
+                    raise self._reject("timeout")
+            except asyncio.CancelledError:
+                if not self._abandon(waiter):
+                    self.release()  # Granted just as we were cancelled; pass the slot on
+                raise
+        wait = time.perf_counter() - start
+        self._admitted(wait)
+        try:
+            yield wait
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict:
+        """Admission control statistics."""
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.active,
+                "queue_depth": len(self._waiters),
+                "max_queue": self.max_queue,
+                "max_wait_seconds": self.max_wait,
+                "admitted": self.admitted,
+                "rejected": self.rejected
+            }
+
+
+# Global admission controller instance
+_global_llm_admission: Optional[LLMAdmissionController] = None
+_global_llm_admission_lock = threading.Lock()
+
+
+def get_llm_admission() -> Optional[LLMAdmissionController]:
+    """Get or create the process-wide LLM admission controller (None if LLM_MAX_CONCURRENCY is 0)."""
+    global _global_llm_admission
+
+    if RAGConfig.LLM_MAX_CONCURRENCY <= 0:
+        return None
+    with _global_llm_admission_lock:
+        if _global_llm_admission is None:
+            _global_llm_admission = LLMAdmissionController(
+                RAGConfig.LLM_MAX_CONCURRENCY, RAGConfig.LLM_MAX_QUEUE, RAGConfig.LLM_QUEUE_MAX_WAIT
+            )
+
+    return _global_llm_admission
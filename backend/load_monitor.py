@@ -0,0 +1,188 @@
+"""
+System load monitoring for the RAG system.
+Turns real saturation signals - in-flight LLM calls, queueing time in the chat
+path and event-loop lag - into one load factor (0.0-1.0) that drives the
+AdaptiveRateLimiter, so per-client limits tighten when the dyno is saturated and
+relax when it is idle. The same background task purges expired clients from the
+rate limiter, so its per-client state doesn't grow with every client ever seen.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Iterator, List, Optional
+
+from config import RAGConfig
+from metrics import LLM_QUEUE_DEPTH
+from rate_limiter import AdaptiveRateLimiter, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class LoadMonitor:
+    """
+    Tracks load signals and periodically feeds the load factor to a rate limiter.
+
+    Each signal is normalized by its capacity/target and the load factor is the
+    highest of them: LLM calls in flight or waiting for an admission slot / LLM
+    capacity, smoothed queue time / queue time target, smoothed event-loop lag /
+    lag target.
+    """
+
+    # LLM capacity when neither LOAD_LLM_CAPACITY nor admission control sets one
+    DEFAULT_LLM_CAPACITY = 16
+
+    def __init__(self, llm_capacity: int = None, queue_time_target: float = None,
+                 loop_lag_target: float = None, interval: float = None, smoothing: float = 0.3,
+                 cleanup_interval: float = None):
+        """
+        Initialize the load monitor.
+
+        Args:
+            llm_capacity: In-flight plus queued LLM calls that count as full load (default:
+                          RAGConfig.LOAD_LLM_CAPACITY, else the admission limit LLM_MAX_CONCURRENCY,
+                          so the signal reaches 1.0 when every slot is busy)
+            queue_time_target: Queue time in seconds that counts as full load (default: RAGConfig.LOAD_QUEUE_TIME_TARGET)
+            loop_lag_target: Event-loop lag in seconds that counts as full load (default: RAGConfig.LOAD_LOOP_LAG_TARGET)
+            interval: Seconds between samples (default: RAGConfig.LOAD_MONITOR_INTERVAL)
+            smoothing: Weight of the newest sample in the moving averages
+            cleanup_interval: Seconds between purges of expired rate limiter clients
+                              (default: RAGConfig.RATE_LIMIT_CLEANUP_INTERVAL)
+        """
+        self.llm_capacity = (llm_capacity or RAGConfig.LOAD_LLM_CAPACITY
+                             or max(0, RAGConfig.LLM_MAX_CONCURRENCY) or self.DEFAULT_LLM_CAPACITY)
+        self.queue_time_target = queue_time_target or RAGConfig.LOAD_QUEUE_TIME_TARGET
+        self.loop_lag_target = loop_lag_target or RAGConfig.LOAD_LOOP_LAG_TARGET
+        self.interval = interval or RAGConfig.LOAD_MONITOR_INTERVAL
+        self.smoothing = smoothing
+        self.cleanup_interval = cleanup_interval or RAGConfig.RATE_LIMIT_CLEANUP_INTERVAL
+
+        self._lock = Lock()
+        self.llm_in_flight = 0
+        self._queue_samples: List[float] = []
+        self.queue_time = 0.0  # Smoothed seconds
+        self.loop_lag = 0.0  # Smoothed seconds
+        self.load = 0.0
+        self.limiter: Optional[RateLimiter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # === SIGNALS ===
+
+    @contextmanager
+    def track_llm_call(self) -> Iterator[None]:
+        """Count an LLM call as in flight for the duration of a with-block."""
+        with self._lock:
+            self.llm_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.llm_in_flight -= 1
+
+    def record_queue_time(self, seconds: float):
+        """Record how long a request waited before its work started."""
+        with self._lock:
+            self._queue_samples.append(seconds)
+
+    def sample(self, loop_lag: float = None) -> float:
+        """
+        Fold the signals collected since the last sample into the load factor.
+
+        Args:
+            loop_lag: Measured event-loop lag in seconds (None keeps the previous average)
+
+        Returns:
+            The new load factor
+        """
+        alpha = self.smoothing
+        with self._lock:
+            samples, self._queue_samples = self._queue_samples, []
+            llm_in_flight = self.llm_in_flight
+        llm_queued = LLM_QUEUE_DEPTH.value()
+        # Without new requests the queue time decays towards zero
+        latest_queue_time = max(samples) if samples else 0.0
+        self.queue_time = alpha * latest_queue_time + (1 - alpha) * self.queue_time
+        if loop_lag is not None:
+            self.loop_lag = alpha * loop_lag + (1 - alpha) * self.loop_lag
+
+        self.load = min(1.0, max(
+            (llm_in_flight + llm_queued) / self.llm_capacity,
+            self.queue_time / self.queue_time_target,
+            self.loop_lag / self.loop_lag_target
+        ))
+        if isinstance(self.limiter, AdaptiveRateLimiter):
+            self.limiter.update_system_load(self.load)
+        return self.load
+
+    # === BACKGROUND SAMPLING ===
+
+    def start(self, limiter: Optional[RateLimiter] = None):
+        """Start sampling on the running event loop, feeding the load factor to `limiter`."""
+        self.limiter = limiter
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"📈 Load monitor started (LLM capacity {self.llm_capacity}, interval {self.interval}s)")
+
+    async def stop(self):
+        """Stop background sampling."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Measure event-loop lag as the oversleep of a periodic sleep, then sample; purge the limiter now and then."""
+        last_cleanup = time.perf_counter()
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            loop_lag = max(0.0, time.perf_counter() - start - self.interval)
+            try:
+                self.sample(loop_lag)
+            except Exception as e:
+                logger.warning(f"Load sampling failed: {e}")
+            if self.limiter is not None and time.perf_counter() - last_cleanup >= self.cleanup_interval:
+                last_cleanup = time.perf_counter()
+                try:
+                    # Off the event loop: the SQLite backend deletes rows, the others scan every client
+                    await asyncio.to_thread(self.limiter.cleanup_expired)
+                except Exception as e:
+                    logger.warning(f"Rate limiter cleanup failed: {e}")
+
+    def get_stats(self) -> Dict:
+        """Load signals, load factor and (for an adaptive limiter) the effective rate limit."""
+        stats = {
+            "load_factor": round(self.load, 3),
+            "llm_in_flight": self.llm_in_flight,
+            "llm_queued": int(LLM_QUEUE_DEPTH.value()),
+            "llm_capacity": self.llm_capacity,
+            "queue_time_ms": round(self.queue_time * 1000, 1),
+            "event_loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "monitoring": self._task is not None and not self._task.done()
+        }
+        if isinstance(self.limiter, AdaptiveRateLimiter):
+            stats["rate_limit"] = self.limiter.get_load_stats()
+        elif self.limiter is not None:
+            stats["rate_limit"] = {"effective_limit": self.limiter.max_requests,
+                                   "window_seconds": self.limiter.window_seconds}
+        return stats
+
+
+# Global load monitor instance
+_global_load_monitor: Optional[LoadMonitor] = None
+_global_load_monitor_lock = Lock()
+
+
+def get_load_monitor() -> LoadMonitor:
+    """Get or create the process-wide load monitor."""
+    global _global_load_monitor
+
+    with _global_load_monitor_lock:
+        if _global_load_monitor is None:
+            _global_load_monitor = LoadMonitor()
+
+    return _global_load_monitor
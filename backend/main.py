@@ -1,25 +1,35 @@
 import os
+import json
+import base64
+import asyncio
+import hashlib
+import math
+import time
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 from dotenv import load_dotenv
-import uuid
 from datetime import datetime
 
 # Load environment variables from parent directory
 load_dotenv()
 
-from rag_system import GothenburgUniversityRAG
+from rag_system import GothenburgUniversityRAG, ConversationContext
 from config import RAGConfig
-from rate_limiter import RateLimitInfo
+from rate_limiter import get_rate_limiter
+from metrics import REGISTRY as METRICS_REGISTRY, RATE_LIMITED
+from load_monitor import get_load_monitor
+from llm_admission import LLMOverloadedError
+from chat_history_store import get_chat_history_store
+from session_memory import get_session_memory
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -28,14 +38,14 @@ logger = logging.getLogger(__name__)
 # Global RAG instance
 rag_system: Optional[GothenburgUniversityRAG] = None
 
-# In-memory chat history storage (for demo purposes)
-# In production, this should be stored in a database
-chat_histories: Dict[str, 'ChatHistory'] = {}
-
 class ChatMessage(BaseModel):
     message: str
     session_id: Optional[str] = None
-    chat_history: Optional[List[Dict]] = None  # Previous messages in the conversation
+    chat_history: Optional[List[Dict]] = None  # Previous messages; optional with a session_id (kept server-side)
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    session_id: Optional[str] = None  # Used for rate limiting only; questions are answered without history
 
 class ChatResponse(BaseModel):
     answer: str
@@ -51,6 +61,13 @@ class ChatHistory(BaseModel):
     messages: List[Dict]
     created_at: datetime
     updated_at: datetime
+
+class ChatHistorySummary(BaseModel):
+    session_id: str
+    title: str
+    message_count: int
+    created_at: datetime
+    updated_at: datetime
     
 class ChatHistoryRequest(BaseModel):
     title: Optional[str] = None
@@ -65,9 +82,13 @@ class SystemStatus(BaseModel):
     total_documents: Optional[int] = None
     course_documents: Optional[int] = None
     program_documents: Optional[int] = None
+    document_types: Optional[Dict[str, int]] = None
     embedding_model: Optional[str] = None
     llm_model: Optional[str] = None
     collection_name: Optional[str] = None
+    cache_stats: Optional[Dict[str, Any]] = None
+    load: Optional[Dict[str, Any]] = None  # Load factor, its signals and the effective rate limit
+    session_memory: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
 async def initialize_rag_system():
@@ -84,12 +105,27 @@ async def initialize_rag_system():
         json_dirs = RAGConfig.DEFAULT_JSON_DIRS
         
         # Initialize with default client ID for startup and use database by default
-        rag_system = GothenburgUniversityRAG(json_dirs=json_dirs, client_id="system", use_database=True)
+        # Share the process-wide rate limiter with the API's rate limit dependency
+        rag_system = GothenburgUniversityRAG(json_dirs=json_dirs, client_id="system", use_database=True,
+                                             rate_limiter=get_rate_limiter())
         
         # Initialize vector store
         num_docs = rag_system.initialize_vector_store()
         logger.info(f"✅ RAG system initialized successfully with {num_docs} documents")
         
+        # Build the course catalog used by the /courses and /departments endpoints
+        try:
+            rag_system.load_catalog()
+        except Exception as e:
+            logger.warning(f"⚠️ Course catalog could not be built: {e}")
+        
+        # Pre-embed the static query vocabulary so the first requests hit the embedding cache
+        if RAGConfig.PREWARM_EMBEDDING_CACHE:
+            try:
+                rag_system.warm_embedding_cache()
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding cache pre-warming failed: {e}")
+        
         # Validate configuration
         config_validation = RAGConfig.validate_config()
         failed_checks = [check for check, passed in config_validation.items() if not passed]
@@ -105,9 +141,14 @@ async def lifespan(app: FastAPI):
     """Manage application lifespan."""
     # Startup
     await initialize_rag_system()
+    # Feed in-flight LLM calls, queue time and event-loop lag to the adaptive rate limiter,
+    # and purge its expired clients regularly
+    load_monitor = get_load_monitor()
+    load_monitor.start(get_rate_limiter())
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await load_monitor.stop()
 
 # Create FastAPI app
 # Hide docs in production if ENVIRONMENT is set to "production"
@@ -123,6 +164,25 @@ app = FastAPI(
     openapi_url=None if is_production else "/openapi.json"
 )
 
+class ArrivalTimeMiddleware:
+    """Stamp each HTTP request with its arrival time (request.state.received_at) for queue time measurement."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
+
+def record_queue_time(request: Request):
+    """Report how long a request waited (event loop, threadpool, rate limit check) before its work started."""
+    received_at = getattr(request.state, "received_at", None)
+    if received_at is not None:
+        get_load_monitor().record_queue_time(time.perf_counter() - received_at)
+
+app.add_middleware(ArrivalTimeMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -173,11 +233,23 @@ async def get_system_status():
     
     try:
         info = rag_system.get_system_info()
-        return SystemStatus(**info)
+        load = get_load_monitor().get_stats()
+        if rag_system.llm_admission is not None:
+            load["llm_admission"] = rag_system.llm_admission.get_stats()
+        sessions = get_session_memory()
+        return SystemStatus(**info, load=load,
+                            session_memory=sessions.get_stats() if sessions else {"enabled": False})
     except Exception as e:
         logger.error(f"Error getting system status: {e}")
         return SystemStatus(status="error", error=str(e))
 
+@app.get("/metrics", response_class=PlainTextResponse, tags=["System"])
+async def get_metrics():
+    """Pipeline latency histograms and counters in the Prometheus text format."""
+    if not RAGConfig.ENABLE_METRICS:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(METRICS_REGISTRY.render(), media_type=METRICS_REGISTRY.CONTENT_TYPE)
+
 @app.post("/system/reload", tags=["System"])
 async def reload_system(background_tasks: BackgroundTasks):
     """Reload the RAG system with fresh data."""
@@ -198,17 +270,118 @@ async def reload_rag_system():
     try:
         if rag_system:
             rag_system.initialize_vector_store(force_reload=True)
+            rag_system.load_catalog()
+            # Answers cached from the old corpus (shared and persistent with the SQLite backend) are stale now
+            rag_system.clear_cache()
             logger.info("RAG system reloaded successfully")
     except Exception as e:
         logger.error(f"Error reloading RAG system: {e}")
 
+def enforce_rate_limit(message: ChatMessage, request: Request) -> str:
+    """
+    Apply the process-wide rate limit before any RAG work is done.
+    
+    Clients are identified by session ID, falling back to their IP. Runs in the
+    threadpool (sync dependency), so a SQLite-backed limiter doesn't block the event loop.
+    
+    Returns:
+        The client ID of the admitted request
+    """
+    client_ip = request.client.host if request.client else "unknown"
+    client_id = message.session_id or client_ip
+    check_rate_limit(client_id)
+    return client_id
+
+def enforce_batch_rate_limit(batch: BatchChatRequest, request: Request) -> Tuple[str, Tuple]:
+    """
+    Rate limit dependency for /chat/batch: every CHAT_BATCH_QUESTIONS_PER_REQUEST
+    distinct questions (started) count as one request.
+    
+    Distinct means a distinct cache key (see GothenburgUniversityRAG.dedupe_batch),
+    as duplicates are answered once. The batch is admitted as a whole or rejected;
+    a batch costing more than the configured limit could never be admitted, so it
+    is rejected with 413 instead of a 429 the client would retry forever. One that
+    only exceeds the limit the adaptive limiter lowered under load gets a 429.
+    
+    Returns:
+        The client ID and the dedupe_batch result, so the batch is analyzed once
+    """
+    if not batch.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(batch.questions) > RAGConfig.CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {RAGConfig.CHAT_BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    if rag_system is None or not rag_system.is_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="RAG system not initialized. Please check system status."
+        )
+    
+    client_ip = request.client.host if request.client else "unknown"
+    client_id = batch.session_id or client_ip
+    deduped = rag_system.dedupe_batch(batch.questions, client_id)
+    analyses = deduped[0]
+    questions_per_request = max(1, RAGConfig.CHAT_BATCH_QUESTIONS_PER_REQUEST)
+    cost = max(1, math.ceil(len(analyses) / questions_per_request))
+    if cost > RAGConfig.RATE_LIMIT_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"The batch has {len(analyses)} distinct questions; at most "
+                   f"{RAGConfig.RATE_LIMIT_REQUESTS * questions_per_request} are accepted per batch. "
+                   f"Split it into smaller batches"
+        )
+    
+    # Over a limit lowered under load, the limiter answers with a retryable 429
+    check_rate_limit(client_id, cost=cost)
+    return client_id, deduped
+
+def check_rate_limit(client_id: str, cost: int = 1):
+    """Count a request (cost requests) against the process-wide rate limiter; 429 with Retry-After when exceeded."""
+    rate_info = get_rate_limiter().is_allowed(client_id, cost)
+    if not rate_info.allowed:
+        logger.warning(f"🚦 Rate limit exceeded for client {client_id}")
+        RATE_LIMITED.inc()
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. Please wait {rate_info.retry_after:.0f} seconds before trying again.",
+            headers={"Retry-After": str(math.ceil(rate_info.retry_after))}
+        )
+
+def get_conversation(message: ChatMessage, client_id: str) -> ConversationContext:
+    """
+    Conversation state for a chat request.
+    
+    With a session_id the request gets a copy of the session's server-side memory,
+    so the client only needs to send the new message; a chat_history sent anyway
+    (older clients, edited conversations) replaces what the server remembered.
+    Without a session_id a one-off context is built from chat_history.
+    """
+    sessions = get_session_memory()
+    if message.session_id and sessions is not None:
+        conversation = sessions.get(message.session_id)
+        if message.chat_history:
+            conversation.load_chat_history(message.chat_history)
+    else:
+        conversation = ConversationContext(client_id=client_id)
+        conversation.load_chat_history(message.chat_history)
+    conversation.rate_limit_checked = True  # Counted by enforce_rate_limit
+    return conversation
+
+def remember_turn(message: ChatMessage, response: Dict):
+    """Merge a finished turn into the session's server-side memory (if the request has a session)."""
+    sessions = get_session_memory()
+    if message.session_id and sessions is not None:
+        sessions.remember(message.session_id, message.message.strip(), response, message.chat_history)
+
 @app.post("/chat", response_model=ChatResponse, tags=["Chat"])
-async def chat(message: ChatMessage, request: Request):
+async def chat(message: ChatMessage, request: Request, client_id: str = Depends(enforce_rate_limit)):
     """
     Send a message to the chatbot and get a response.
     
     This endpoint processes user questions about Gothenburg University courses and programs.
-    Includes rate limiting per client IP.
+    Includes rate limiting per session or client IP (429 with Retry-After when exceeded).
     """
     if rag_system is None or not rag_system.is_initialized:
         raise HTTPException(
@@ -219,9 +392,7 @@ async def chat(message: ChatMessage, request: Request):
     if not message.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
-    # Get client identifier for rate limiting
-    client_ip = request.client.host if request.client else "unknown"
-    client_id = message.session_id or client_ip
+    record_queue_time(request)
     
     # Log the incoming request
     logger.info(f"=== CHAT REQUEST ===")
@@ -231,49 +402,14 @@ async def chat(message: ChatMessage, request: Request):
     logger.info(f"Message length: {len(message.message)} characters")
     
     try:
-        # Create client-specific RAG instance for rate limiting
-        # (In production, you might want to cache these instances)
-        client_rag = GothenburgUniversityRAG(
-            json_dirs=rag_system.json_dirs,
-            client_id=client_id,
-            use_database=rag_system.use_database
-        )
+        # Per-request (or per-session) conversation state; the shared engine
+        # (clients, cache, rate limiter, vector store) is reused across all requests
+        conversation = get_conversation(message, client_id)
         
-        # Share the vector store from the global instance
-        client_rag.vector_store = rag_system.vector_store
-        client_rag.is_initialized = rag_system.is_initialized
-        
-        # Add chat history to the RAG system's memory if provided
-        if message.chat_history:
-            # Clear existing memory and add the conversation history
-            client_rag.memory.clear()
-            
-            # Also store sources and top courses for course code extraction
-            client_rag.chat_history_sources = []
-            client_rag.chat_history_top_courses = []
-            
-            for i, msg in enumerate(message.chat_history):
-                if msg.get('role') == 'user' or msg.get('sender') == 'user':
-                    client_rag.memory.chat_memory.add_user_message(msg.get('content', ''))
-                elif msg.get('role') == 'assistant' or msg.get('sender') == 'ai':
-                    client_rag.memory.chat_memory.add_ai_message(msg.get('content', ''))
-                    # Store sources from AI messages
-                    if msg.get('sources'):
-                        sources = msg.get('sources', [])
-                        client_rag.chat_history_sources.extend(sources)
-                    # Store top courses from AI messages
-                    if msg.get('top_courses'):
-                        top_courses = msg.get('top_courses', [])
-                        # Add unique course codes to the list
-                        for course in top_courses:
-                            if course and course not in client_rag.chat_history_top_courses:
-                                client_rag.chat_history_top_courses.append(course)
-        else:
-            client_rag.chat_history_sources = []
-            client_rag.chat_history_top_courses = []
-        
-        # Process the query with client-specific rate limiting
-        result = client_rag.query(message.message.strip())
+        # Process the query (async path keeps the event loop free while
+        # embeddings, Chroma and Gemini are working)
+        result = await rag_system.aquery(message.message.strip(), conversation=conversation)
+        remember_turn(message, result)
         
         # Log the response details
         logger.info(f"=== CHAT RESPONSE ===")
@@ -307,6 +443,13 @@ async def chat(message: ChatMessage, request: Request):
         
         return response
         
+    except LLMOverloadedError as e:
+        # Shed by LLM admission control: tell the client when to come back
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         logger.error(f"=== CHAT ERROR ===")
         logger.error(f"Error processing chat message: {e}")
@@ -328,46 +471,125 @@ async def chat(message: ChatMessage, request: Request):
         return fallback_response
 
 @app.post("/chat/stream", tags=["Chat"])
-async def chat_stream(message: ChatMessage):
+async def chat_stream(message: ChatMessage, request: Request, client_id: str = Depends(enforce_rate_limit)):
     """
-    Stream chat response (placeholder for future implementation).
-    Currently returns the same as regular chat.
+    Stream the chat response as Server-Sent Events.
+    
+    Events, in order:
+    - `metadata`: sources, response_stats and top_courses (sent as soon as retrieval finishes)
+    - `token`: answer text chunks as they arrive from Gemini
+    - `done`: timing information, including time to first token
+    - `error`: the message was rejected (e.g. validation, or the LLM is overloaded - with `retry_after`)
+    
+    Rate-limited requests are answered with 429 and Retry-After before streaming starts.
     """
-    return await chat(message)
+    if rag_system is None or not rag_system.is_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="RAG system not initialized. Please check system status."
+        )
+    
+    if not message.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    record_queue_time(request)
+    
+    logger.info(f"=== CHAT STREAM REQUEST ===")
+    logger.info(f"Message: {message.message}")
+    logger.info(f"Session ID: {message.session_id}")
+    logger.info(f"Client ID: {client_id}")
+    
+    conversation = get_conversation(message, client_id)
+    
+    async def event_stream():
+        # Reassembled from the events, to remember the turn in the session
+        streamed = {"answer": "", "response_stats": {}}
+        try:
+            async for event in rag_system.astream_query(message.message.strip(), conversation=conversation):
+                if event["event"] == "metadata":
+                    event["data"]["session_id"] = message.session_id
+                    streamed["response_stats"] = event["data"]["response_stats"]
+                elif event["event"] == "token":
+                    streamed["answer"] += event["data"]["content"]
+                elif event["event"] == "done":
+                    streamed["error"] = event["data"].get("error")
+                    remember_turn(message, streamed)
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': 'Failed to generate a response'})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/chat/batch", tags=["Chat"])
+async def chat_batch(batch: BatchChatRequest, request: Request,
+                     admission: Tuple[str, Tuple] = Depends(enforce_batch_rate_limit)):
+    """
+    Answer many independent questions in one request (e.g. FAQ generation, regression checks).
+    
+    Identical questions are answered once, embeddings are batched, retrieval runs
+    in parallel and LLM calls run with bounded concurrency. Results are streamed
+    as NDJSON, one line per question in completion order, each carrying the
+    question's `index` in the request. Distinct questions are charged to the
+    rate limit in groups (see enforce_batch_rate_limit).
+    """
+    if rag_system is None or not rag_system.is_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="RAG system not initialized. Please check system status."
+        )
+    
+    client_id, deduped = admission
+    record_queue_time(request)
+    logger.info(f"=== CHAT BATCH REQUEST: {len(batch.questions)} questions (client {client_id}) ===")
+    
+    async def lines():
+        try:
+            async for result in rag_system.aquery_batch(batch.questions, client_id=client_id, deduped=deduped):
+                item = {"index": result["index"], "question": result["question"]}
+                if "answer" in result:
+                    item.update({
+                        "answer": result["answer"],
+                        "content_type": result["content_type"],
+                        "sources": result["sources"],
+                        "num_documents_retrieved": result["num_documents_retrieved"],
+                        "top_courses": result.get("response_stats", {}).get("top_courses", []),
+                        "cache_hit": result.get("cache_hit", False)
+                    })
+                for key in ("error", "retry_after", "overloaded"):
+                    if key in result:
+                        item[key] = result[key]
+                yield json.dumps(item) + "\n"
+        except Exception as e:
+            logger.error(f"Error answering chat batch: {e}")
+            yield json.dumps({"error": "Failed to answer the batch"}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-@app.get("/courses", tags=["Data"])
-async def get_courses():
-    """Get list of available current courses only."""
+def get_catalog():
+    """Return the course catalog, building it on first use if startup could not."""
     if rag_system is None or not rag_system.is_initialized:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
     
-    try:
-        # Get all documents and extract course information
-        collection = rag_system.vector_store.get()
-        courses = {}
-        
-        for metadata in collection['metadatas']:
-            # Only include current courses (all documents in our new system are from current courses)
-            if metadata.get('course_code') and metadata.get('course_code') not in courses:
-                # Check if it's a course-related document
-                if metadata.get('doc_type') in ['course_overview', 'course_section', 'course_details']:
-                    courses[metadata['course_code']] = {
-                        'code': metadata.get('course_code'),
-                        'title': metadata.get('course_title', ''),
-                        'department': metadata.get('department', ''),
-                        'credits': metadata.get('credits', ''),
-                        'cycle': metadata.get('cycle', '')
-                    }
-        
-        # Convert to list and sort
-        course_list = list(courses.values())
-        course_list.sort(key=lambda x: x.get('code', ''))
-        
-        return {"courses": course_list, "total": len(course_list), "note": "Only current courses are included"}
-        
-    except Exception as e:
-        logger.error(f"Error getting courses: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get courses: {str(e)}")
+    if rag_system.catalog is None:
+        try:
+            rag_system.load_catalog()
+        except Exception as e:
+            logger.error(f"Error building course catalog: {e}")
+            raise HTTPException(status_code=503, detail="Course catalog not available")
+    return rag_system.catalog
+
+@app.get("/courses", tags=["Data"])
+async def get_courses():
+    """Get list of available current courses only."""
+    catalog = get_catalog()
+    course_list = [course.summary('code', 'title', 'department', 'credits', 'cycle')
+                   for course in catalog.list_courses()]
+    return {"courses": course_list, "total": len(course_list), "note": "Only current courses are included"}
 
 @app.get("/programs", tags=["Data"])
 async def get_programs():
@@ -390,269 +612,235 @@ async def get_programs():
         logger.error(f"Error getting programs: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get programs: {str(e)}")
 
+def _search_fingerprint(q: str, doc_type: Optional[str]) -> str:
+    """Ties a search cursor to its query, so it can't be replayed against another search."""
+    return hashlib.md5(f"{q}\n{doc_type or ''}".encode()).hexdigest()[:12]
+
+def encode_search_cursor(offset: int, q: str, doc_type: Optional[str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps([offset, _search_fingerprint(q, doc_type)]).encode()).decode()
+
+def decode_search_cursor(cursor: str, q: str, doc_type: Optional[str]) -> int:
+    """Offset encoded in a search cursor; raises ValueError for malformed or foreign cursors."""
+    try:
+        offset, fingerprint = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(offset)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if fingerprint != _search_fingerprint(q, doc_type) or offset < 0:
+        raise ValueError("Cursor does not belong to this search")
+    return offset
+
+def format_search_result(doc, score: Optional[float] = None) -> Dict[str, Any]:
+    result = {
+        "content": doc.page_content[:500] + "..." if len(doc.page_content) > 500 else doc.page_content,
+        "metadata": {
+            "course_code": doc.metadata.get("course_code", ""),
+            "course_title": doc.metadata.get("course_title", ""),
+            "section": doc.metadata.get("section", ""),
+            "doc_type": doc.metadata.get("doc_type", ""),
+            "department": doc.metadata.get("department", ""),
+        }
+    }
+    if score is not None:
+        result["score"] = round(score, 4)
+    return result
+
 @app.get("/search", tags=["Search"])
-async def search_documents(q: str, doc_type: Optional[str] = None, limit: int = 10):
+async def search_documents(q: str, doc_type: Optional[str] = None, limit: int = 10,
+                           cursor: Optional[str] = None, mode: Literal["fast", "full"] = "fast"):
     """
     Search through documents.
     
     Args:
         q: Search query
-        doc_type: Filter by document type ("course" or "program")
+        doc_type: Filter by document type ("course", "program" or an exact type such as "course_section")
         limit: Maximum number of results to return
+        cursor: `next_cursor` of the previous page (fast mode)
+        mode: "fast" (default) - one embedding and one similarity search with the document
+              type filter, top-`limit` results with relevance scores and cursor paging, for
+              type-ahead and browsing; "full" - the chat retrieval pipeline (query variations,
+              MMR, keyword search), cut to `limit`
     """
     if rag_system is None or not rag_system.is_initialized:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
     
     if not q.strip():
         raise HTTPException(status_code=400, detail="Search query cannot be empty")
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="Limit must be at least 1")
+    query = q.strip()
     
-    try:
-        # Use the RAG system's retrieval method
-        content_type = doc_type if doc_type in ["course", "program"] else "both"
-        documents = rag_system.retrieve_documents(q.strip(), content_type, k=limit)
-        
-        # Format results
-        results = []
-        for doc in documents:
-            result = {
-                "content": doc.page_content[:500] + "..." if len(doc.page_content) > 500 else doc.page_content,
-                "metadata": {
-                    "course_code": doc.metadata.get("course_code", ""),
-                    "course_title": doc.metadata.get("course_title", ""),
-                    "section": doc.metadata.get("section", ""),
-                    "doc_type": doc.metadata.get("doc_type", ""),
-                    "department": doc.metadata.get("department", ""),
-                }
-            }
-            results.append(result)
-        
+    if mode == "full":
+        try:
+            content_type = doc_type if doc_type in ["course", "program"] else "both"
+            documents = await rag_system.aretrieve_documents(query, content_type, k=limit)
+        except Exception as e:
+            logger.error(f"Error searching documents: {e}")
+            raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        results = [format_search_result(doc) for doc in documents[:limit]]
         return {
             "query": q,
             "results": results,
             "total": len(results),
             "doc_type_filter": doc_type
         }
-        
+    
+    try:
+        offset = decode_search_cursor(cursor, query, doc_type) if cursor else 0
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = min(limit, max(0, RAGConfig.SEARCH_MAX_RESULTS - offset))
+    if limit == 0:
+        return {"query": q, "results": [], "total": 0, "doc_type_filter": doc_type, "next_cursor": None}
+    
+    try:
+        page, has_more = await asyncio.to_thread(rag_system.search_documents, query, doc_type, limit, offset)
     except Exception as e:
         logger.error(f"Error searching documents: {e}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+    
+    results = [format_search_result(doc, score) for doc, score in page]
+    has_more = has_more and offset + limit < RAGConfig.SEARCH_MAX_RESULTS
+    return {
+        "query": q,
+        "results": results,
+        "total": len(results),
+        "doc_type_filter": doc_type,
+        "next_cursor": encode_search_cursor(offset + limit, query, doc_type) if has_more else None
+    }
 
 @app.get("/courses/by-department/{department}", tags=["Data"])
 async def get_courses_by_department(department: str):
     """Get courses by department (current courses only)."""
-    if rag_system is None or not rag_system.is_initialized:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    catalog = get_catalog()
     
-    try:
-        # Clean up department name
+    # Clean up department name
+    dept_clean = catalog.department_name(department)
+    if dept_clean is None:
         dept_clean = department.replace("-", " ").title()
         if "Department of" not in dept_clean:
             dept_clean = f"Department of {dept_clean}"
-        
-        docs = rag_system.find_courses_by_department(dept_clean)
-        
-        # Extract unique courses from documents
-        courses = {}
-        for doc in docs:
-            course_code = doc.metadata.get('course_code')
-            if course_code and course_code not in courses:
-                courses[course_code] = {
-                    'code': course_code,
-                    'title': doc.metadata.get('course_title', ''),
-                    'credits': doc.metadata.get('credits', ''),
-                    'cycle': doc.metadata.get('cycle', '')
-                }
-        
-        course_list = list(courses.values())
-        course_list.sort(key=lambda x: x['code'])
-        
-        return {
-            "department": dept_clean,
-            "courses": course_list,
-            "total": len(course_list)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error getting courses by department: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get courses: {str(e)}")
+    
+    course_list = [course.summary('code', 'title', 'credits', 'cycle')
+                   for course in catalog.courses_by_department(department)]
+    return {
+        "department": dept_clean,
+        "courses": course_list,
+        "total": len(course_list)
+    }
 
 @app.get("/courses/by-program/{program_code}", tags=["Data"])
 async def get_courses_by_program(program_code: str):
     """Get courses by program (current courses only)."""
-    if rag_system is None or not rag_system.is_initialized:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
-    
-    try:
-        docs = rag_system.find_courses_by_program(program_code.upper())
-        
-        # Extract unique courses from documents
-        courses = {}
-        for doc in docs:
-            course_code = doc.metadata.get('course_code')
-            if course_code and course_code not in courses:
-                courses[course_code] = {
-                    'code': course_code,
-                    'title': doc.metadata.get('course_title', ''),
-                    'credits': doc.metadata.get('credits', ''),
-                    'cycle': doc.metadata.get('cycle', ''),
-                    'department': doc.metadata.get('department', '')
-                }
-        
-        course_list = list(courses.values())
-        course_list.sort(key=lambda x: x['code'])
-        
-        return {
-            "program_code": program_code.upper(),
-            "courses": course_list,
-            "total": len(course_list)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error getting courses by program: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get courses: {str(e)}")
+    catalog = get_catalog()
+    course_list = [course.summary('code', 'title', 'credits', 'cycle', 'department')
+                   for course in catalog.courses_by_program(program_code)]
+    return {
+        "program_code": program_code.upper(),
+        "courses": course_list,
+        "total": len(course_list)
+    }
 
 @app.get("/courses/with-tuition", tags=["Data"])
 async def get_courses_with_tuition():
     """Get courses that have tuition fees (current courses only)."""
-    if rag_system is None or not rag_system.is_initialized:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
-    
-    try:
-        docs = rag_system.find_courses_with_tuition()
-        
-        # Extract unique courses with tuition information
-        courses = {}
-        for doc in docs:
-            if doc.metadata.get('doc_type') == 'course_details' or doc.metadata.get('has_tuition'):
-                course_code = doc.metadata.get('course_code')
-                if course_code and course_code not in courses:
-                    courses[course_code] = {
-                        'code': course_code,
-                        'title': doc.metadata.get('course_title', ''),
-                        'credits': doc.metadata.get('credits', ''),
-                        'cycle': doc.metadata.get('cycle', ''),
-                        'department': doc.metadata.get('department', ''),
-                        'tuition_fee': doc.metadata.get('tuition_fee', 'Information available')
-                    }
-        
-        course_list = list(courses.values())
-        course_list.sort(key=lambda x: x['code'])
-        
-        return {
-            "courses": course_list,
-            "total": len(course_list)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error getting courses with tuition: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get courses: {str(e)}")
+    catalog = get_catalog()
+    course_list = [course.summary('code', 'title', 'credits', 'cycle', 'department', 'tuition_fee')
+                   for course in catalog.courses_with_tuition()]
+    return {
+        "courses": course_list,
+        "total": len(course_list)
+    }
 
 @app.get("/departments", tags=["Data"])
 async def get_departments():
     """Get list of all departments."""
-    if rag_system is None or not rag_system.is_initialized:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
-    
-    try:
-        metadata_summary = rag_system.get_metadata_summary()
-        departments = metadata_summary.get('departments', [])
-        
-        return {
-            "departments": departments,
-            "total": len(departments)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error getting departments: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get departments: {str(e)}")
+    departments = get_catalog().departments
+    return {
+        "departments": departments,
+        "total": len(departments)
+    }
 
 # Chat History Endpoints (Optional)
+# Stored in SQLite (RAGConfig.CHAT_HISTORY_DB_PATH). The endpoints are sync, so
+# FastAPI runs them in its threadpool and database I/O never blocks the event loop.
 @app.post("/chat/history/{session_id}", response_model=ChatHistory, tags=["Chat History"])
-async def save_chat_history(session_id: str, request: ChatHistoryRequest):
+def save_chat_history(session_id: str, request: ChatHistoryRequest):
     """
     Save or update chat history for a session.
     This is optional - chats are primarily stored in browser localStorage.
+    
+    Only messages that aren't stored yet are written when the conversation grew.
     """
     try:
-        if session_id in chat_histories:
-            # Update existing history
-            history = chat_histories[session_id]
-            if request.title:
-                history.title = request.title
-            history.messages = request.messages
-            history.updated_at = datetime.now()
-        else:
-            # Create new history
-            history = ChatHistory(
-                session_id=session_id,
-                title=request.title or "New Chat",
-                messages=request.messages,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            chat_histories[session_id] = history
-        
-        return history
+        return get_chat_history_store().save(session_id, request.messages, title=request.title)
     except Exception as e:
         logger.error(f"Error saving chat history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to save chat history: {str(e)}")
 
+@app.post("/chat/history/{session_id}/messages", response_model=ChatHistorySummary, tags=["Chat History"])
+def append_chat_messages(session_id: str, request: ChatHistoryRequest):
+    """Append new messages to a session's history (created if missing) without re-sending the rest."""
+    try:
+        return get_chat_history_store().append_messages(session_id, request.messages, title=request.title)
+    except Exception as e:
+        logger.error(f"Error appending chat messages: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to append chat messages: {str(e)}")
+
 @app.get("/chat/history/{session_id}", response_model=ChatHistory, tags=["Chat History"])
-async def get_chat_history(session_id: str):
+def get_chat_history(session_id: str):
     """Get chat history for a specific session."""
-    if session_id not in chat_histories:
+    history = get_chat_history_store().get(session_id)
+    if history is None:
         raise HTTPException(status_code=404, detail="Chat history not found")
     
-    return chat_histories[session_id]
+    return history
 
 @app.get("/chat/histories", tags=["Chat History"])
-async def get_all_chat_histories(limit: int = 50, offset: int = 0):
-    """Get all chat histories (paginated)."""
+def get_all_chat_histories(limit: int = 50, offset: int = 0, cursor: Optional[str] = None,
+                           include_messages: bool = True):
+    """
+    Get all chat histories, most recently updated first (paginated).
+    
+    Pass the returned `next_cursor` as `cursor` to get the next page; it stays
+    fast on deep pages, unlike `offset`.
+    """
     try:
-        # Sort by updated_at descending
-        sorted_histories = sorted(
-            chat_histories.values(),
-            key=lambda x: x.updated_at,
-            reverse=True
+        page = get_chat_history_store().list(
+            limit=limit, cursor=cursor, offset=offset, include_messages=include_messages
         )
-        
-        # Apply pagination
-        paginated = sorted_histories[offset:offset + limit]
-        
-        return {
-            "histories": paginated,
-            "total": len(chat_histories),
-            "limit": limit,
-            "offset": offset
-        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting chat histories: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get chat histories: {str(e)}")
+    
+    return {
+        "histories": page["histories"],
+        "total": page["total"],
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": page["next_cursor"]
+    }
 
 @app.delete("/chat/history/{session_id}", tags=["Chat History"])
-async def delete_chat_history(session_id: str):
+def delete_chat_history(session_id: str):
     """Delete chat history for a specific session."""
-    if session_id not in chat_histories:
+    sessions = get_session_memory()
+    if sessions is not None:
+        sessions.discard(session_id)
+    if not get_chat_history_store().delete(session_id):
         raise HTTPException(status_code=404, detail="Chat history not found")
     
-    del chat_histories[session_id]
     return {"message": "Chat history deleted successfully"}
 
 @app.patch("/chat/history/{session_id}", response_model=ChatHistory, tags=["Chat History"])
-async def update_chat_history(session_id: str, update: ChatHistoryUpdate):
+def update_chat_history(session_id: str, update: ChatHistoryUpdate):
     """Update specific fields of a chat history."""
-    if session_id not in chat_histories:
+    history = get_chat_history_store().update(session_id, title=update.title, messages=update.messages)
+    if history is None:
         raise HTTPException(status_code=404, detail="Chat history not found")
     
-    history = chat_histories[session_id]
-    
-    if update.title is not None:
-        history.title = update.title
-    if update.messages is not None:
-        history.messages = update.messages
-    
-    history.updated_at = datetime.now()
-    
     return history
 
 # Frontend serving (defined last to avoid conflicts)
@@ -0,0 +1,279 @@
+"""
+Prometheus-style metrics for the RAG system.
+Dependency-free counters, gauges and histograms rendered in the Prometheus text
+exposition format (served by GET /metrics), so we can see where the time of a
+chat request goes instead of reading emoji log lines.
+
+Metrics are per process; with several uvicorn workers each worker exposes its own.
+"""
+import asyncio
+import functools
+import math
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets (seconds) from sub-millisecond routing up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value (integers without a trailing .0, infinities as +Inf)."""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Base class: a named metric with a fixed set of label names."""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Label values in label-name order (all label names are required)."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_string(self, key: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of every label set."""
+
+    def render(self) -> List[str]:
+        """HELP/TYPE header and sample lines."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}", *self._samples()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Unlabelled counters are exported as 0 before the first increment
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        """Increase the counter (amount must not be negative)."""
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for a label set (0 if never incremented)."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._label_string(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down per label set (e.g. queue depth)."""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._label_string(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets, plus their sum and count."""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record one observation."""
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of a with-block in seconds (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels: str) -> Callable:
+        """Decorator observing the duration of every call of a sync or async function."""
+        self._key(labels)  # Fail at decoration time on wrong labels
+
+        def decorator(func: Callable) -> Callable:
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.time(**labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, **labels: str) -> int:
+        """Number of observations for a label set."""
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], [0.0]))
+            return sum(counts)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = {"le": _format_value(bound) if bound == math.inf else repr(float(bound))}
+                lines.append(f"{self.name}_bucket{self._label_string(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_string(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_string(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# === PIPELINE METRICS ===
+REGISTRY = MetricsRegistry()
+
+QUERY_DURATION = REGISTRY.histogram(
+    "csexpert_query_duration_seconds", "End-to-end duration of a question (including cache hits)", ["method"]
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "csexpert_stage_duration_seconds",
+    "Duration of a query pipeline stage (validation, cache_lookup, semantic_cache_lookup, routing, embedding, "
+    "retrieval, context_assembly, llm, response_assembly)",
+    ["stage"]
+)
+SEARCH_DURATION = REGISTRY.histogram(
+    "csexpert_retrieval_search_duration_seconds", "Duration of a single planned retrieval search",
+    ["bucket", "search_type"]
+)
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "csexpert_time_to_first_token_seconds", "Time from request to the first streamed answer token"
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "csexpert_cache_requests_total", "Cache lookups by cache (response, semantic, embedding) and result", ["cache", "result"]
+)
+RATE_LIMITED = REGISTRY.counter(
+    "csexpert_rate_limited_total", "Requests rejected by the rate limiter"
+)
+QUERY_ERRORS = REGISTRY.counter(
+    "csexpert_query_errors_total", "Questions answered with the error response", ["error_type"]
+)
+LLM_ERRORS = REGISTRY.counter(
+    "csexpert_llm_errors_total", "Failed LLM calls answered with the fallback text", ["error_type"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "csexpert_llm_estimated_tokens_total", "Estimated LLM tokens (1 token ~ 4 characters)", ["direction"]
+)
+LLM_COST = REGISTRY.counter(
+    "csexpert_llm_estimated_cost_usd_total", "Estimated LLM cost from RAGConfig.get_token_cost"
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "csexpert_llm_in_flight", "LLM calls currently holding an admission slot"
+)
+LLM_QUEUE_DEPTH = REGISTRY.gauge(
+    "csexpert_llm_queue_depth", "Requests waiting for an LLM admission slot"
+)
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "csexpert_llm_queue_wait_seconds", "Time spent waiting for an LLM admission slot (admitted requests)"
+)
+LLM_REJECTED = REGISTRY.counter(
+    "csexpert_llm_admission_rejected_total", "Requests shed by LLM admission control", ["reason"]
+)
@@ -0,0 +1,241 @@
+"""
+Single-pass query analysis for the RAG system.
+Scans a question once with precompiled patterns and records everything the
+pipeline stages (validation, routing, query expansion, retrieval planning and
+history enhancement) used to look up with their own regexes and keyword scans.
+"""
+import re
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from config import RAGConfig
+
+# === INTENT VOCABULARY ===
+# Substring phrases checked by the pipeline stages (matched anywhere in the lowercased question)
+
+# route_query
+ROUTE_PROGRAM_KEYWORDS = ('program', 'programme', 'bachelor', 'master', 'degree')
+ROUTE_PROGRAM_NAMES = ('computer science', 'software engineering', 'game design')
+COURSES_IN_PROGRAM_PHRASES = ('courses in', 'courses included', 'what courses', 'course list', 'which courses')
+COURSE_SECTION_KEYWORDS = (
+    'prerequisites', 'entry requirements', 'learning outcomes', 'course content',
+    'assessment', 'grading', 'credits', 'teaching', 'exam', 'assignment'
+)
+
+# Retrieval planning
+PROGRAM_PHRASES = ('program', 'programme', 'master', 'bachelor')
+CREDIT_PHRASES = ('credit', 'hp', '7.5', '15', '30')
+DEPARTMENT_PHRASES = ('department', 'department of', 'courses in department')
+DEPARTMENT_NAMES = (
+    (('computer science',), 'Department of Computer Science and Engineering'),
+    (('applied information', 'information technology'), 'Department of Applied Information Technology'),
+    (('mathematical', 'mathematics'), 'Department of Mathematical Sciences'),
+)
+CYCLE_MAPPING = {
+    'bachelor': 'First cycle',
+    'master': 'Second cycle',
+    'phd': 'Third cycle',
+    'first cycle': 'First cycle',
+    'second cycle': 'Second cycle',
+    'third cycle': 'Third cycle'
+}
+SECTION_PHRASES = (
+    'entry requirements', 'prerequisites', 'learning outcomes', 'assessment', 'course content',
+    'grading', 'evaluation', 'teaching', 'sub-courses', 'position', 'confirmation'
+)
+
+# History enhancement of follow-up questions
+REFERENTIAL_PHRASES = ('the course', 'that course', 'this course', 'the same', 'mentioned above', 'previous', 'above')
+IMPLICIT_PHRASES = (
+    'what are the', 'what is the', 'how many', 'when is', 'who teaches', 'learning outcomes',
+    'prerequisites', 'grading', 'assessment', 'credits', 'exam', 'examination'
+)
+
+COURSE_CODE_PATTERN = r'(?:[a-z]{2,4}\d{3}|lt\d{4})'
+CONTEXT_MARKER = re.compile(r'\s*\(context: (' + COURSE_CODE_PATTERN + r')\)', re.IGNORECASE)
+CREDIT_VALUE = re.compile(r'(\d+\.?\d*)')
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Compile phrases into one regex alternation shaped like a trie (shared prefixes factored out).
+
+    Optional continuations are greedy, so the pattern matches the longest phrase
+    starting at a position.
+    """
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}  # End of phrase
+
+    def build(node: Dict) -> str:
+        ends = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if ends:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """Everything the pipeline needs to know about one question, computed once."""
+    original: str  # Question as received
+    text: str  # Stripped and typo-corrected question (what the pipeline answers)
+    lower: str  # Lowercased text
+    course_codes: Tuple[str, ...] = ()  # Course codes mentioned in the question, in order
+    phrases: FrozenSet[str] = frozenset()  # Vocabulary phrases occurring in the question
+    credits: Optional[str] = None  # First number in a credit question ("7.5")
+    suspicious_pattern: Optional[str] = None  # Matched unsafe input pattern, if any
+    context_course_code: Optional[str] = None  # Course code carried over from chat history
+
+    def has(self, *phrases: str) -> bool:
+        """True if any of the phrases occurs in the question."""
+        return not self.phrases.isdisjoint(phrases)
+
+    def first(self, phrases: Iterable[str]) -> Optional[str]:
+        """The first of the phrases (in the given order) that occurs in the question."""
+        return next((phrase for phrase in phrases if phrase in self.phrases), None)
+
+    @property
+    def course_code(self) -> Optional[str]:
+        """The course the question is about: history context first, then the first mentioned code."""
+        return self.context_course_code or (self.course_codes[0] if self.course_codes else None)
+
+    @property
+    def enhanced_text(self) -> str:
+        """Question text with the history context marker used for retrieval and cache scoping."""
+        if self.context_course_code:
+            return f"{self.text} (context: {self.context_course_code})"
+        return self.text
+
+    @property
+    def course_scope(self) -> str:
+        """Sorted course codes of the question including history context (semantic cache scope)."""
+        codes = set(self.course_codes)
+        if self.context_course_code:
+            codes.add(self.context_course_code)
+        return ",".join(sorted(codes))
+
+    def with_context(self, course_code: Optional[str]) -> "QueryAnalysis":
+        """Copy of the analysis carrying a course code from chat history."""
+        return replace(self, context_course_code=course_code)
+
+
+class QueryAnalyzer:
+    """Precompiled single-pass analyzer producing a QueryAnalysis per question.
+
+    Typo corrections and unsafe-input checks are one combined regex each. Course
+    codes and all intent phrases are found by a single scan of the lowercased text
+    with a zero-width alternation (course code | phrase trie); each phrase hit also
+    yields the shorter vocabulary phrases that are prefixes of it, so every phrase
+    occurrence is found, as with separate substring checks.
+    """
+
+    def __init__(self, vocabulary: Iterable[str] = None,
+                 typo_corrections: Dict[str, str] = None,
+                 suspicious_patterns: List[str] = None):
+        """
+        Compile the analyzer.
+
+        Args:
+            vocabulary: Phrases to detect (default: every phrase the pipeline checks)
+            typo_corrections: Whole-word typo -> correction mapping (default: RAGConfig.TYPO_CORRECTIONS)
+            suspicious_patterns: Regexes of unsafe input (default: RAGConfig.SUSPICIOUS_PATTERNS)
+        """
+        vocabulary = set(vocabulary if vocabulary is not None else self.default_vocabulary())
+        typo_corrections = typo_corrections if typo_corrections is not None else RAGConfig.TYPO_CORRECTIONS
+        suspicious_patterns = suspicious_patterns if suspicious_patterns is not None else RAGConfig.SUSPICIOUS_PATTERNS
+
+        self._typos = {typo.lower(): correction for typo, correction in typo_corrections.items()}
+        # Longest first, so "programme" is not cut short by "programm"
+        typo_alternation = '|'.join(re.escape(typo) for typo in sorted(self._typos, key=len, reverse=True))
+        self._typo_pattern = re.compile(r'\b(?:' + typo_alternation + r')\b', re.IGNORECASE) if self._typos else None
+        self._suspicious_pattern = re.compile(
+            '|'.join(f'(?:{pattern})' for pattern in suspicious_patterns), re.IGNORECASE
+        ) if suspicious_patterns else None
+
+        # Phrases that are prefixes of a longer match are reported along with it
+        self._prefixes = {
+            phrase: tuple(other for other in vocabulary if phrase.startswith(other))
+            for phrase in vocabulary
+        }
+        # Zero-width, so overlapping occurrences are all visited; a phrase starting where
+        # a course code starts ("hp" in "HP101") is captured by the nested lookahead
+        trie = _trie_pattern(vocabulary)
+        self._scan_pattern = re.compile(
+            r'(?=\b(?P<code>' + COURSE_CODE_PATTERN + r')\b)(?:(?=(?P<code_phrase>' + trie + r'))|)'
+            r'|(?=(?P<phrase>' + trie + r'))'
+        )
+
+    @staticmethod
+    def default_vocabulary() -> List[str]:
+        """Every phrase the routing, expansion, retrieval and history stages check for."""
+        vocabulary = [
+            *ROUTE_PROGRAM_KEYWORDS, *ROUTE_PROGRAM_NAMES, *COURSES_IN_PROGRAM_PHRASES, *COURSE_SECTION_KEYWORDS,
+            *PROGRAM_PHRASES, *CREDIT_PHRASES, *DEPARTMENT_PHRASES, *CYCLE_MAPPING, *SECTION_PHRASES,
+            *REFERENTIAL_PHRASES, *IMPLICIT_PHRASES,
+            *RAGConfig.SECTION_QUERY_MAPPINGS, *RAGConfig.PROGRAM_QUERY_MAPPINGS
+        ]
+        for names, _ in DEPARTMENT_NAMES:
+            vocabulary.extend(names)
+        return vocabulary
+
+    def correct_typos(self, text: str) -> str:
+        """Apply all whole-word typo corrections in one substitution."""
+        if not self._typo_pattern:
+            return text
+        return self._typo_pattern.sub(lambda match: self._typos[match.group(0).lower()], text)
+
+    def analyze(self, question: Union[str, QueryAnalysis]) -> QueryAnalysis:
+        """
+        Analyze a question (an existing analysis is returned unchanged).
+
+        A trailing "(context: CODE)" marker, as produced by QueryAnalysis.enhanced_text,
+        is parsed back into context_course_code.
+        """
+        if isinstance(question, QueryAnalysis):
+            return question
+
+        suspicious = self._suspicious_pattern.search(question) if self._suspicious_pattern else None
+        text = self.correct_typos(question.strip())
+
+        context_course_code = None
+        marker = CONTEXT_MARKER.search(text)
+        if marker:
+            context_course_code = marker.group(1).upper()
+            text = (text[:marker.start()] + text[marker.end():]).strip()
+
+        lower = text.lower()
+        course_codes = []
+        phrases = set()
+        for match in self._scan_pattern.finditer(lower):
+            code = match.group('code')
+            if code:
+                code = code.upper()
+                if code not in course_codes:
+                    course_codes.append(code)
+            phrase = match.group('phrase') or match.group('code_phrase')
+            if phrase:
+                phrases.update(self._prefixes[phrase])
+
+        credits = None
+        if not phrases.isdisjoint(CREDIT_PHRASES):
+            credit_match = CREDIT_VALUE.search(lower)
+            credits = credit_match.group(1) if credit_match else None
+
+        return QueryAnalysis(
+            original=question,
+            text=text,
+            lower=lower,
+            course_codes=tuple(course_codes),
+            phrases=frozenset(phrases),
+            credits=credits,
+            suspicious_pattern=suspicious.group(0) if suspicious else None,
+            context_course_code=context_course_code
+        )
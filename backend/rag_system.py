@@ -2,11 +2,19 @@ import os
 import json
 import logging
 import hashlib
+import math
 import re
-from typing import List, Dict, Optional
+import asyncio
+import time
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple, Union
 from pathlib import Path
 from datetime import datetime, timedelta
 from functools import lru_cache
+from collections import Counter
+from dataclasses import dataclass, field
 
 import numpy as np
 from tqdm import tqdm
@@ -14,9 +22,26 @@ from dotenv import load_dotenv
 
 # Import our configuration and rate limiting
 from config import RAGConfig
-from rate_limiter import RateLimiter, RateLimitInfo
+from rate_limiter import RateLimiter
+from load_monitor import get_load_monitor
+from llm_admission import LLMOverloadedError, get_llm_admission
+from embedding_cache import EmbeddingCache
+from semantic_cache import SemanticResponseCache
+from response_cache import InMemoryResponseCache, ResponseCache, create_response_cache
+from single_flight import SingleFlight
+from metrics import (
+    QUERY_DURATION, STAGE_DURATION, SEARCH_DURATION, TIME_TO_FIRST_TOKEN, CACHE_REQUESTS, RATE_LIMITED,
+    QUERY_ERRORS, LLM_ERRORS, LLM_TOKENS, LLM_COST
+)
 # Import database document loader
 from database_document_loader import DatabaseDocumentLoader
+from course_catalog import CourseCatalog
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from query_analysis import (
+    QueryAnalysis, QueryAnalyzer, ROUTE_PROGRAM_KEYWORDS, ROUTE_PROGRAM_NAMES, COURSES_IN_PROGRAM_PHRASES,
+    COURSE_SECTION_KEYWORDS, PROGRAM_PHRASES, CREDIT_PHRASES, DEPARTMENT_PHRASES, DEPARTMENT_NAMES,
+    CYCLE_MAPPING, SECTION_PHRASES, REFERENTIAL_PHRASES, IMPLICIT_PHRASES, COURSE_CODE_PATTERN
+)
 # LangChain imports
 from langchain_community.document_loaders import JSONLoader
 from langchain_community.vectorstores.utils import filter_complex_metadata
@@ -26,6 +51,8 @@ from langchain_chroma import Chroma
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 
 # Load environment variables
@@ -36,6 +63,214 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class RetrievalSearch:
+    """A single vector search planned by retrieve_documents."""
+    bucket: str  # course, targeted, semantic or keyword (merge priority)
+    label: str  # Human-readable name used in log messages
+    query: str
+    k: int
+    filter: Optional[Dict] = None
+    # similarity, mmr, metadata (filter-only get, ranked by the query embedding) or lexical (BM25, no embedding)
+    search_type: str = "similarity"
+    fetch_k: Optional[int] = None
+
+
+@dataclass
+class RetrievalPlan:
+    """All searches retrieve_documents will run for one question."""
+    question: str
+    found_course_code: Optional[str]
+    search_k: int
+    metadata_filter: Optional[Dict] = None
+    searches: List[RetrievalSearch] = field(default_factory=list)
+    fuse_semantic: bool = False  # Hybrid mode: merge the semantic bucket by reciprocal rank fusion
+
+
+# doc_type values behind the "course" and "program" shortcuts of search_documents
+SEARCH_DOC_TYPES = {
+    "course": ["course_overview", "course_section", "course_details"],
+    "program": ["program_overview", "program_section", "program_course_list"],
+}
+
+# Chroma distance -> 0-1 relevance (higher is closer) per "hnsw:space" of the collection
+DISTANCE_RELEVANCE = {
+    "l2": lambda distance: 1.0 - distance / math.sqrt(2),  # Unit-length embeddings
+    "cosine": lambda distance: 1.0 - distance,
+    "ip": lambda distance: 1.0 - distance if distance > 0 else -distance,
+}
+
+_COURSE_CODE_REGEX = re.compile(r'\b(' + COURSE_CODE_PATTERN + r')\b', re.IGNORECASE)
+_MARKDOWN_CHARS = re.compile(r'[*#`>|_]+')
+
+
+def _plain_excerpt(text: str, width: int) -> str:
+    """Text without markdown markup, whitespace collapsed and shortened to `width` characters."""
+    return textwrap.shorten(_MARKDOWN_CHARS.sub(' ', text or ''), width=width, placeholder="...")
+
+
+class ConversationContext:
+    """
+    Lightweight per-request (or per-session) conversation state.
+    
+    Holds only what differs between users: the conversation memory, the client
+    identifier used for rate limiting and the course codes seen in earlier turns.
+    Everything expensive (LLM/embedding clients, cache, rate limiter, vector store)
+    lives on the shared GothenburgUniversityRAG engine.
+    """
+    
+    # Course codes listed in the summary of older turns (summary mode)
+    MAX_SUMMARY_COURSE_CODES = 20
+    
+    def __init__(self, client_id: str = "default", memory_k: int = None, memory_mode: str = None):
+        """
+        Initialize an empty conversation context.
+        
+        Args:
+            client_id: Unique identifier for rate limiting (IP, session ID, etc.)
+            memory_k: Number of conversation turns to keep (default: RAGConfig.CONVERSATION_MEMORY_K)
+            memory_mode: "window" passes the last k turns to the prompt; "summary" passes the last
+                         turn verbatim plus a bounded summary of older turns (default: RAGConfig.CONVERSATION_MEMORY_MODE)
+        """
+        self.client_id = client_id
+        self.memory_mode = memory_mode or RAGConfig.CONVERSATION_MEMORY_MODE
+        self.summary_lines: List[str] = []
+        self.summary_course_codes: List[str] = []
+        self.memory = ConversationBufferWindowMemory(
+            memory_key="chat_history",
+            output_key="answer",
+            return_messages=True,
+            k=memory_k or RAGConfig.CONVERSATION_MEMORY_K
+        )
+        self.chat_history_sources: List[Dict] = []
+        self.chat_history_top_courses: List[str] = []
+        # Set when the caller (e.g. the API's rate limit dependency) already counted this request
+        self.rate_limit_checked = False
+    
+    def load_chat_history(self, chat_history: Optional[List[Dict]]):
+        """Replay a client-provided chat history into memory and collect referenced courses."""
+        self.memory.clear()
+        self.chat_history_sources = []
+        self.chat_history_top_courses = []
+        self.summary_lines = []
+        self.summary_course_codes = []
+        
+        for msg in chat_history or []:
+            if msg.get('role') == 'user' or msg.get('sender') == 'user':
+                self.memory.chat_memory.add_user_message(msg.get('content', ''))
+            elif msg.get('role') == 'assistant' or msg.get('sender') == 'ai':
+                self.memory.chat_memory.add_ai_message(msg.get('content', ''))
+                # Store sources from AI messages
+                if msg.get('sources'):
+                    self.chat_history_sources.extend(msg.get('sources', []))
+                # Store unique top courses from AI messages
+                for course in msg.get('top_courses') or []:
+                    if course and course not in self.chat_history_top_courses:
+                        self.chat_history_top_courses.append(course)
+    
+    def copy(self) -> "ConversationContext":
+        """An independent copy, so one request can use (and mutate) it without touching the original."""
+        context = ConversationContext(self.client_id, memory_k=self.memory.k, memory_mode=self.memory_mode)
+        context.memory.chat_memory.messages = list(self.memory.chat_memory.messages)
+        context.summary_lines = list(self.summary_lines)
+        context.summary_course_codes = list(self.summary_course_codes)
+        context.chat_history_sources = list(self.chat_history_sources)
+        context.chat_history_top_courses = list(self.chat_history_top_courses)
+        return context
+    
+    def remember_response(self, question: str, response: Dict, max_courses: int = None):
+        """
+        Record a finished turn in a long-lived (server-side session) context.
+        
+        Adds the turn to memory (requests generate on a copy, so the stored context
+        never has it yet), puts the answer's top courses in front of the remembered
+        ones and drops turns beyond the memory window.
+        
+        Args:
+            question: The user's question
+            response: The response dict returned by query()/aquery() (or assembled from a stream)
+            max_courses: Course codes to remember (default: RAGConfig.SESSION_MEMORY_MAX_COURSES)
+        """
+        if response.get("error"):
+            return
+        answer = response.get("answer", "")
+        self.memory.save_context({"question": question}, {"answer": answer})
+        messages = self.memory.chat_memory.messages
+        
+        top_courses = (response.get("response_stats") or {}).get("top_courses") or []
+        remembered = [course for course in top_courses if course]
+        remembered += [course for course in self.chat_history_top_courses if course not in remembered]
+        self.chat_history_top_courses = remembered[:max_courses or RAGConfig.SESSION_MEMORY_MAX_COURSES]
+        
+        # Only the last k turns (or the summary) reach the prompt; don't keep the rest around
+        max_messages = 2 * self.memory.k
+        if self.memory_mode == "summary":
+            self._fold_older_turns()
+        elif len(messages) > max_messages:
+            del messages[:-max_messages]
+    
+    def prompt_history(self) -> Union[List, str]:
+        """
+        Chat history as passed to the prompt.
+        
+        In window mode these are the memory messages. In summary mode older turns
+        are first folded into the summary, and the result is the summary, the course
+        codes discussed earlier and the last turn verbatim, as text.
+        """
+        if self.memory_mode != "summary":
+            return self.memory.chat_memory.messages
+        
+        self._fold_older_turns()
+        parts = []
+        if self.summary_lines:
+            parts.append("Summary of earlier turns:\n" + "\n".join(self.summary_lines))
+        if self.summary_course_codes:
+            parts.append("Courses discussed earlier: " + ", ".join(self.summary_course_codes))
+        for message in self.memory.chat_memory.messages:
+            parts.append(f"{'Student' if message.type == 'human' else 'Assistant'}: {message.content}")
+        return "\n\n".join(parts)
+    
+    def _fold_older_turns(self):
+        """Move every message but the last turn into the summary (each message is folded once)."""
+        messages = self.memory.chat_memory.messages
+        if len(messages) <= 2:
+            return
+        older = messages[:-2]
+        del messages[:-2]
+        
+        question = None
+        for message in older:
+            if message.type == "human":
+                if question is not None:
+                    self._add_summary_line(question, "")
+                question = message.content
+            else:
+                self._add_summary_line(question or "", message.content)
+                question = None
+        if question is not None:
+            self._add_summary_line(question, "")
+    
+    def _add_summary_line(self, question: str, answer: str):
+        """Summarize one turn extractively (no LLM call) and keep the summary within its token budget."""
+        codes = []
+        for code in _COURSE_CODE_REGEX.findall(f"{question} {answer}"):
+            if code.upper() not in codes:
+                codes.append(code.upper())
+        # Most recently discussed first
+        remembered = codes + [code for code in self.summary_course_codes if code not in codes]
+        self.summary_course_codes = remembered[:self.MAX_SUMMARY_COURSE_CODES]
+        
+        line = f"- Student asked: {_plain_excerpt(question, 150)}"
+        if answer:
+            line += f" | Assistant: {_plain_excerpt(answer, 200)}"
+        self.summary_lines.append(line)
+        
+        # Estimate tokens (1 token ≈ 4 characters); drop the oldest lines beyond the budget
+        budget_chars = RAGConfig.SUMMARY_MEMORY_MAX_TOKENS * 4
+        while len(self.summary_lines) > 1 and sum(len(line) + 1 for line in self.summary_lines) > budget_chars:
+            self.summary_lines.pop(0)
+
+
 class GothenburgUniversityRAG:
     """
     RAG system for Gothenburg University course and program information.
@@ -50,19 +285,28 @@ class GothenburgUniversityRAG:
     - Response caching to avoid repeat LLM calls
     - Token usage tracking for cost monitoring
     - Input validation for robustness
-    
-    TODO: Add async support for better FastAPI integration
+    - Shared engine: clients, cache and rate limiter are created once and reused;
+      per-request state lives in a ConversationContext passed to query()
+    - Async query path (aquery) for non-blocking FastAPI integration
+    - Token streaming (astream_query) with sources sent before the first token
     """
     
-    def __init__(self, json_dirs: Dict[str, str] = None, client_id: str = "default", use_database: bool = True):
+    def __init__(self, json_dirs: Dict[str, str] = None, client_id: str = "default", use_database: bool = True,
+                 embeddings: Optional[Embeddings] = None, llm: Optional[BaseChatModel] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """
         Initialize the RAG system with configuration and rate limiting.
         
         Args:
             json_dirs: Dictionary with paths to JSON directories
                       {"courses_syllabus": "path", "course_webpages": "path", "programs": "path"}
-            client_id: Unique identifier for rate limiting (IP, user ID, etc.)
+            client_id: Client ID of the default conversation context (used when
+                       query() is called without an explicit context)
             use_database: Whether to use database loader (True) or JSON files (False)
+            embeddings: Optional embedding model to use instead of Google's (e.g. for benchmarks)
+            llm: Optional chat model to use instead of Gemini (e.g. for benchmarks)
+            rate_limiter: Optional shared rate limiter (e.g. the API's process-wide one from
+                          get_rate_limiter()); defaults to a limiter private to this engine
         """
         # Store client ID for rate limiting
         self.client_id = client_id
@@ -70,7 +314,8 @@ class GothenburgUniversityRAG:
         
         # Validate configuration
         config_validation = RAGConfig.validate_config()
-        if not config_validation.get("env_GEMINI_API_KEY", False):
+        uses_google_models = embeddings is None or llm is None
+        if uses_google_models and not config_validation.get("env_GEMINI_API_KEY", False):
             raise ValueError("GEMINI_API_KEY environment variable is required")
         
         # Log configuration warnings
@@ -90,23 +335,27 @@ class GothenburgUniversityRAG:
         self.collection_name = RAGConfig.COLLECTION_NAME
         
         # Initialize rate limiter
-        self.rate_limiter = RateLimiter(
+        self.rate_limiter = rate_limiter or RateLimiter(
             requests_per_minute=RAGConfig.RATE_LIMIT_REQUESTS,
             window_seconds=RAGConfig.RATE_LIMIT_WINDOW
         )
+        # Process-wide: counts this engine's LLM calls towards the system load
+        self.load_monitor = get_load_monitor()
+        # Process-wide cap on concurrent LLM calls (None when disabled)
+        self.llm_admission = get_llm_admission()
         
-        self._initialize_components()
+        self._initialize_components(embeddings, llm)
         self._setup_prompts()
         
-    def _initialize_components(self):
+    def _initialize_components(self, embeddings: Optional[Embeddings] = None, llm: Optional[BaseChatModel] = None):
         """Initialize all necessary components."""
-        # Initialize Google AI models
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+        # Initialize Google AI models (unless injected)
+        self.embeddings = embeddings or GoogleGenerativeAIEmbeddings(
             model=self.embedding_model,
             google_api_key=self.google_api_key
         )
         
-        self.llm = ChatGoogleGenerativeAI(
+        self.llm = llm or ChatGoogleGenerativeAI(
             model=self.llm_model,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
@@ -116,26 +365,75 @@ class GothenburgUniversityRAG:
         # No text splitter needed - using natural section-based chunking
         # The JSON structure already provides optimal semantic chunks
         
-        # Initialize memory with configurable size
-        self.memory = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            output_key="answer",
-            return_messages=True,
-            k=RAGConfig.CONVERSATION_MEMORY_K
-        )
+        # Precompiled single-pass analysis shared by validation, routing, expansion and retrieval
+        self.query_analyzer = QueryAnalyzer()
+        
+        # Default conversation context for direct (non-API) usage.
+        # The API creates a ConversationContext per request instead.
+        self.default_context = ConversationContext(client_id=self.client_id)
         
         # Initialize vector store
         self.vector_store = None
         self.is_initialized = False
         
+        # Documents per doc_type, tallied when the vector store is (re)indexed or loaded
+        self.doc_type_counts: Dict[str, int] = {}
+        
+        # In-memory course/program catalog for exact metadata lookups (see load_catalog)
+        self.catalog: Optional[CourseCatalog] = None
+        
+        # === QUERY EMBEDDING CACHE ===
+        # LRU cache of query embeddings, shared by all requests
+        self.embedding_cache = EmbeddingCache(
+            model_name=self.embedding_model,
+            max_size=RAGConfig.EMBEDDING_CACHE_SIZE
+        ) if RAGConfig.ENABLE_EMBEDDING_CACHE else None
+        
+        # === LEXICAL INDEX ===
+        # BM25 index over the same documents as the vector store, used by hybrid retrieval
+        self.retrieval_mode = RAGConfig.RETRIEVAL_MODE
+        self.lexical_index: Optional[LexicalIndex] = None
+        if RAGConfig.ENABLE_LEXICAL_INDEX:
+            try:
+                self.lexical_index = LexicalIndex(RAGConfig.LEXICAL_INDEX_PATH)
+            except Exception as e:
+                logger.warning(f"Could not open lexical index at {RAGConfig.LEXICAL_INDEX_PATH}: {e}. "
+                               f"Hybrid retrieval will use vector search only.")
+        
+        # Worker pool for running the planned Chroma searches of a question in parallel
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=RAGConfig.RETRIEVAL_MAX_WORKERS,
+            thread_name_prefix="retrieval"
+        )
+        
         # === RESPONSE CACHING ===
-        # Simple in-memory cache for recent queries with TTL
-        self.response_cache = {}
-        self.cache_timestamps = {}  # Track when items were cached
+        # Cache for recent queries with TTL (in-memory or shared SQLite, see RESPONSE_CACHE_BACKEND)
         self.max_cache_size = RAGConfig.CACHE_SIZE
         self.cache_ttl = RAGConfig.CACHE_TTL
         self.cache_enabled = RAGConfig.ENABLE_CACHE
-        logger.info(f"🗄️ Response cache initialized (max size: {self.max_cache_size}, TTL: {self.cache_ttl}s, enabled: {self.cache_enabled})")
+        self.response_cache: ResponseCache = create_response_cache(
+            RAGConfig.RESPONSE_CACHE_BACKEND,
+            max_size=self.max_cache_size,
+            ttl=self.cache_ttl,
+            db_path=RAGConfig.RESPONSE_CACHE_DB_PATH
+        )
+        logger.info(f"🗄️ Response cache initialized ({type(self.response_cache).__name__}, max size: {self.max_cache_size}, TTL: {self.cache_ttl}s, enabled: {self.cache_enabled})")
+        
+        # Optional semantic layer in front of the exact cache (matches paraphrased questions)
+        self.semantic_cache = SemanticResponseCache(
+            threshold=RAGConfig.SEMANTIC_CACHE_THRESHOLD,
+            max_size=RAGConfig.SEMANTIC_CACHE_SIZE
+        ) if RAGConfig.ENABLE_SEMANTIC_CACHE else None
+        
+        # Concurrent identical questions share one in-flight computation
+        self.single_flight = SingleFlight() if RAGConfig.ENABLE_REQUEST_COALESCING else None
+        if self.semantic_cache:
+            logger.info(f"🧠 Semantic response cache enabled (threshold: {self.semantic_cache.threshold})")
+    
+    @property
+    def memory(self) -> ConversationBufferWindowMemory:
+        """Conversation memory of the default context (kept for backwards compatibility)."""
+        return self.default_context.memory
         
     def _setup_prompts(self):
         """Set up all prompt templates."""
@@ -314,30 +612,24 @@ Before sending any response:
         # Note: Removed LLM-based query generation prompts
         # Using simplified pattern-based query variations instead
 
-    def route_query(self, question: str) -> str:
+    def analyze_query(self, question: Union[str, QueryAnalysis]) -> QueryAnalysis:
+        """Analyze a question once (course codes, intents, typo corrections); analyses pass through."""
+        return self.query_analyzer.analyze(question)
+
+    @STAGE_DURATION.timed(stage="routing")
+    def route_query(self, question: Union[str, QueryAnalysis]) -> str:
         """Route the query based on detected patterns and keywords - no LLM needed."""
-        import re
-        
-        query_lower = question.lower()
+        analysis = self.analyze_query(question)
         
         # 🎯 Detect course-specific queries (course codes like DIT042, TIA320, etc.)
-        course_code_match = re.search(r'\b([A-Z]{2,4}\d{3})\b', question.upper())
-        if course_code_match:
-            logger.info(f"🎯 Detected course-specific query for: {course_code_match.group(1)}")
+        if analysis.course_codes:
+            logger.info(f"🎯 Detected course-specific query for: {analysis.course_codes[0]}")
             return "course"
         
-        # 🎓 Detect program-specific queries  
-        program_keywords = ['program', 'programme', 'bachelor', 'master', 'degree']
-        program_names = ['computer science', 'software engineering', 'game design']
-        
-        # Check for program names or keywords
-        has_program_keyword = any(keyword in query_lower for keyword in program_keywords)
-        has_program_name = any(name in query_lower for name in program_names)
-        
-        if has_program_keyword or has_program_name:
+        # 🎓 Detect program-specific queries (program keywords or names)
+        if analysis.has(*ROUTE_PROGRAM_KEYWORDS, *ROUTE_PROGRAM_NAMES):
             # Check if it's asking about courses within a program
-            course_in_program_keywords = ['courses in', 'courses included', 'what courses', 'course list', 'which courses']
-            if any(phrase in query_lower for phrase in course_in_program_keywords):
+            if analysis.has(*COURSES_IN_PROGRAM_PHRASES):
                 logger.info(f"🔄 Detected program-course relationship query")
                 return "both"
             else:
@@ -345,11 +637,7 @@ Before sending any response:
                 return "program"
         
         # 📚 Detect course-related queries by section keywords
-        course_section_keywords = [
-            'prerequisites', 'entry requirements', 'learning outcomes', 'course content',
-            'assessment', 'grading', 'credits', 'teaching', 'exam', 'assignment'
-        ]
-        if any(keyword in query_lower for keyword in course_section_keywords):
+        if analysis.has(*COURSE_SECTION_KEYWORDS):
             logger.info(f"📚 Detected course section-specific query")
             return "course"
             
@@ -357,15 +645,12 @@ Before sending any response:
         logger.info(f"🔄 General query - searching both courses and programs")
         return "both"
 
-    def generate_query_variations(self, question: str, content_type: str) -> List[str]:
+    def generate_query_variations(self, question: Union[str, QueryAnalysis], content_type: str) -> List[str]:
         """Generate focused query variations optimized for section-based chunking."""
-        import re
+        analysis = self.analyze_query(question)
+        found_course_code = analysis.course_code
         
-        # Extract course code if present
-        course_code_match = re.search(r'\b([A-Z]{2,4}\d{3})\b', question.upper())
-        found_course_code = course_code_match.group(1) if course_code_match else None
-        
-        queries = [question]  # Always start with original question
+        queries = [analysis.enhanced_text]  # Always start with original question
         
         # === SIMPLIFIED APPROACH FOR SECTION-BASED CHUNKING ===
         # Since each section is a focused document, we need fewer but more targeted variations
@@ -378,52 +663,24 @@ Before sending any response:
             ])
         
         # Strategy 2: Section-specific terminology mapping
-        question_lower = question.lower()
-        
-        # Map user terminology to likely JSON section names
-        section_mappings = {
-            # Prerequisites/Requirements
-            'prerequisite': ['entry requirements', 'prerequisites', 'required courses'],
-            'requirement': ['entry requirements', 'prerequisites'], 
-            'need': ['entry requirements', 'prerequisites'],
-            
-            # Assessment/Grading
-            'assessment': ['examination', 'grading', 'assessment methods'],
-            'exam': ['examination', 'assessment', 'grading'],
-            'grade': ['grading', 'examination', 'assessment'],
-            'test': ['examination', 'assessment'],
-            
-            # Course content
-            'about': ['course content', 'learning outcomes', 'course overview'],
-            'content': ['course content', 'learning outcomes'],
-            'topic': ['course content', 'learning outcomes'],
-            'cover': ['course content', 'learning outcomes'],
-            'syllabus': ['course content', 'learning outcomes'],
-            
-            # Teaching format
-            'teaching': ['form of teaching', 'teaching methods'],
-            'lecture': ['form of teaching', 'teaching methods'],
-            'format': ['form of teaching', 'teaching methods'],
-        }
-        
-        # Add terminology variations (limit to 2-3 most relevant)
-        for user_term, json_terms in section_mappings.items():
-            if user_term in question_lower:
-                if found_course_code:
-                    # Add course-specific section queries
-                    queries.extend([f"{found_course_code} {term}" for term in json_terms[:2]])
-                else:
-                    # Add general section queries
-                    queries.extend(json_terms[:2])
-                break  # Only apply first matching mapping
+        # Map user terminology to likely JSON section names (only the first matching mapping)
+        user_term = analysis.first(RAGConfig.SECTION_QUERY_MAPPINGS)
+        if user_term:
+            json_terms = RAGConfig.SECTION_QUERY_MAPPINGS[user_term]
+            if found_course_code:
+                # Add course-specific section queries
+                queries.extend([f"{found_course_code} {term}" for term in json_terms[:2]])
+            else:
+                # Add general section queries
+                queries.extend(json_terms[:2])
         
         # Strategy 3: Content type specific variations (simplified)
         if content_type == "program" and not found_course_code:
             # For program queries, add program-specific terms
-            queries.extend(["programme", "degree program", "master program", "bachelor program"])
-        elif content_type == "course" and "credit" in question_lower:
+            queries.extend(RAGConfig.PROGRAM_QUERY_VARIANTS)
+        elif content_type == "course" and analysis.has("credit"):
             # For credit queries, add credit variations
-            queries.extend(["credits", "hp", "credit points"])
+            queries.extend(RAGConfig.CREDIT_QUERY_VARIANTS)
         
         # === REMOVE DUPLICATES AND LIMIT ===
         seen = set()
@@ -613,7 +870,9 @@ Section: {section_name}
                     embedding_function=self.embeddings,
                     collection_name=self.collection_name
                 )
-                collection_size = len(self.vector_store.get()['ids'])
+                collection_size = self.document_count()
+                self._load_doc_type_counts(collection_size)
+                self._ensure_lexical_index(collection_size)
                 logger.info(f"Loaded existing vector store with {collection_size} documents")
                 self.is_initialized = True
                 return collection_size
@@ -636,6 +895,10 @@ Section: {section_name}
         logger.info(f"📑 Using {len(documents)} section-based documents (no artificial chunking)")
         logger.info("🎯 Each section = focused document for precise retrieval")
         
+        # The loaded documents are the complete current set, so the lexical index
+        # is rebuilt from them even when only some are new to the vector store
+        self._rebuild_lexical_index(documents)
+        
         # === SMART INCREMENTAL LOADING ===
         if not force_reload and os.path.exists(self.chroma_persist_dir):
             try:
@@ -646,7 +909,7 @@ Section: {section_name}
                     collection_name=self.collection_name
                 )
                 
-                existing_count = len(self.vector_store.get()['ids'])
+                existing_count = self.document_count()
                 logger.info(f"📊 Found existing vector store with {existing_count} documents")
                 
                 if existing_count > 0:
@@ -666,7 +929,7 @@ Section: {section_name}
                     
                     # Check which documents already exist
                     try:
-                        existing_docs_result = self.vector_store.get(ids=new_doc_ids)
+                        existing_docs_result = self.vector_store.get(ids=new_doc_ids, include=[])
                         existing_ids_in_db = set(existing_docs_result['ids'])
                         logger.info(f"Found {len(existing_ids_in_db)} documents that are already embedded")
                         
@@ -685,6 +948,7 @@ Section: {section_name}
                         if skipped_count > 0:
                             logger.info(f"⏭️  Skipping {skipped_count} already embedded documents")
                         
+                        self._load_doc_type_counts(existing_count)
                         if not documents_to_add:
                             logger.info("✅ All documents are already embedded! No new embeddings needed.")
                             logger.info(f"📊 Database status: {existing_count} total documents in collection")
@@ -695,7 +959,9 @@ Section: {section_name}
                         
                         # Add only new documents (metadata already ChromaDB-compatible)
                         self.vector_store.add_documents(documents_to_add)
-                        final_count = len(self.vector_store.get()['ids'])
+                        self._tally_doc_types(documents_to_add)
+                        self._save_doc_type_counts()
+                        final_count = self.document_count()
                         
                         logger.info(f"✅ Successfully added {len(documents_to_add)} new documents!")
                         logger.info(f"📊 Database now contains {final_count} total documents")
@@ -720,15 +986,345 @@ Section: {section_name}
             collection_name=self.collection_name
         )
         
+        self.doc_type_counts = {}
+        if self.document_count() == len(documents):
+            self._tally_doc_types(documents)
+            self._save_doc_type_counts()
+        else:
+            # The persisted collection already held documents before this load
+            self._refresh_doc_type_counts()
+        
         self.is_initialized = True
         logger.info(f"✅ Created vector store with {len(documents)} naturally chunked sections")
         return len(documents)
+    
+    def _rebuild_lexical_index(self, documents: List[Document]):
+        """Replace the lexical index contents with the documents the loader produced."""
+        if not self.lexical_index:
+            return
+        try:
+            self.lexical_index.rebuild(documents)
+        except Exception as e:
+            logger.warning(f"Could not rebuild lexical index: {e}")
+    
+    def _ensure_lexical_index(self, collection_size: int):
+        """Build the lexical index from the vector store contents if it is missing or out of date."""
+        if not self.lexical_index:
+            return
+        try:
+            if self.lexical_index.count() == collection_size:
+                return
+            result = self.vector_store.get(include=["documents", "metadatas"])
+            self.lexical_index.rebuild([
+                Document(page_content=content, metadata=metadata or {})
+                for content, metadata in zip(result['documents'], result['metadatas'])
+            ])
+        except Exception as e:
+            logger.warning(f"Could not build lexical index from the vector store: {e}")
+    
+    def document_count(self) -> int:
+        """Number of documents in the vector store (a count query, no documents are fetched)."""
+        return self.vector_store._collection.count()
+    
+    def _tally_doc_types(self, documents: List[Document]):
+        """Add newly indexed documents to the per-doc_type counts."""
+        tally = Counter(doc.metadata.get('doc_type', 'unknown') for doc in documents)
+        for doc_type, count in tally.items():
+            self.doc_type_counts[doc_type] = self.doc_type_counts.get(doc_type, 0) + count
+    
+    def _refresh_doc_type_counts(self):
+        """Recount documents per doc_type from stored metadata and persist the counts (fetches every metadata record)."""
+        metadatas = self.vector_store.get(include=["metadatas"])['metadatas']
+        self.doc_type_counts = dict(Counter((metadata or {}).get('doc_type', 'unknown') for metadata in metadatas))
+        self._save_doc_type_counts()
+    
+    def _doc_type_counts_path(self) -> Path:
+        return Path(self.chroma_persist_dir) / f"{self.collection_name}_doc_type_counts.json"
+    
+    def _save_doc_type_counts(self):
+        """Persist the per-doc_type counts next to the vector store, so a restart doesn't recount them."""
+        try:
+            self._doc_type_counts_path().write_text(json.dumps(self.doc_type_counts))
+        except OSError as e:
+            logger.warning(f"Could not save document type counts: {e}")
+    
+    def _load_doc_type_counts(self, collection_size: int):
+        """Load the counts tallied at index time; recount only if they are missing or don't add up to the collection."""
+        try:
+            counts = json.loads(self._doc_type_counts_path().read_text())
+        except (OSError, ValueError):
+            counts = None
+        if (isinstance(counts, dict) and all(isinstance(count, int) for count in counts.values())
+                and sum(counts.values()) == collection_size):
+            self.doc_type_counts = counts
+        else:
+            logger.info("Recounting document types from the vector store")
+            self._refresh_doc_type_counts()
 
-    def retrieve_documents(self, question: str, content_type: str, k: int = None) -> List[Document]:
-        """Retrieve relevant documents using intelligent pattern detection and multi-query approach."""
+    def load_catalog(self) -> CourseCatalog:
+        """Build the in-memory course catalog from the database, or from vector store metadata as a fallback."""
+        catalog = None
+        if self.use_database:
+            try:
+                catalog = CourseCatalog.from_database()
+            except Exception as e:
+                logger.warning(f"Could not build course catalog from database: {e}. Using vector store metadata.")
+        
+        if catalog is None:
+            if not self.is_initialized:
+                raise ValueError("Vector store not initialized. Call initialize_vector_store() first.")
+            catalog = CourseCatalog.from_metadatas(self.vector_store.get(include=["metadatas"])['metadatas'])
+        
+        self.catalog = catalog
+        return catalog
+
+    @STAGE_DURATION.timed(stage="retrieval")
+    def retrieve_documents(self, question: Union[str, QueryAnalysis], content_type: str, k: int = None,
+                           mode: str = None) -> List[Document]:
+        """Retrieve relevant documents using intelligent pattern detection and multi-query approach.
+        
+        Every planned query string is embedded in one batched call, then the Chroma
+        searches run in parallel with the precomputed vectors.
+        
+        Args:
+            question: User question (possibly enhanced with conversation context) or its analysis
+            content_type: Routed content type (course, program or both)
+            k: Requested number of documents
+            mode: "multi_query" (query variations) or "hybrid" (one vector search fused
+                  with BM25 by reciprocal rank fusion); defaults to RETRIEVAL_MODE
+        """
+        plan = self._plan_retrieval(question, content_type, k, mode)
+        
+        # The fallback searches reuse the original question, so embed it up front as well
+        embeddings = self._embed_queries(self._embedding_queries(plan.searches) + [plan.question])
+        results = self._run_searches(plan.searches, embeddings)
+        
+        fallback_searches = self._plan_fallback_searches(plan, results)
+        if fallback_searches:
+            embeddings.update(self._embed_queries(
+                [query for query in self._embedding_queries(fallback_searches) if query not in embeddings]
+            ))
+            results.update(self._run_searches(fallback_searches, embeddings))
+        
+        return self._merge_retrieval_results(plan, results)
+    
+    @STAGE_DURATION.timed(stage="retrieval")
+    async def aretrieve_documents(self, question: Union[str, QueryAnalysis], content_type: str, k: int = None,
+                                  mode: str = None) -> List[Document]:
+        """Async version of retrieve_documents; embeddings and Chroma searches run off the event loop."""
+        plan = self._plan_retrieval(question, content_type, k, mode)
+        
+        embeddings = await asyncio.to_thread(
+            self._embed_queries, self._embedding_queries(plan.searches) + [plan.question]
+        )
+        return await self._aexecute_plan(plan, embeddings)
+    
+    async def _aexecute_plan(self, plan: RetrievalPlan, embeddings: Dict[str, List[float]]) -> List[Document]:
+        """Run a retrieval plan whose queries are already embedded; fallback searches are embedded as needed."""
+        results = await self._arun_searches(plan.searches, embeddings)
+        
+        fallback_searches = self._plan_fallback_searches(plan, results)
+        if fallback_searches:
+            embeddings.update(await asyncio.to_thread(
+                self._embed_queries,
+                [query for query in self._embedding_queries(fallback_searches) if query not in embeddings]
+            ))
+            results.update(await self._arun_searches(fallback_searches, embeddings))
+        
+        return self._merge_retrieval_results(plan, results)
+    
+    def search_documents(self, query: str, doc_type: Optional[str] = None, limit: int = 10,
+                         offset: int = 0) -> Tuple[List[Tuple[Document, float]], bool]:
+        """
+        Lightweight similarity search for type-ahead and browsing.
+        
+        One (cached) query embedding and one Chroma similarity search with the
+        document type pushed down as a filter - no routing, query variations, MMR
+        or keyword fallbacks.
+        
+        Args:
+            query: Search text
+            doc_type: "course", "program" or an exact doc_type (e.g. "course_section"); None searches everything
+            limit: Results per page
+            offset: Results to skip (Chroma has no offset, so a page fetches offset + limit results)
+            
+        Returns:
+            (document, relevance score) pairs of the page, best first, and whether more results exist
+        """
+        embedding = self._embed_queries([query]).get(query)
+        if embedding is None:
+            raise RuntimeError("Failed to embed the search query")
+        
+        doc_types = SEARCH_DOC_TYPES.get(doc_type, [doc_type] if doc_type else None)
+        search_filter = {"doc_type": {"$in": doc_types}} if doc_types else None
+        with SEARCH_DURATION.time(bucket="search", search_type="similarity"):
+            # One extra result tells whether there is a next page; scores are distances (lower is closer)
+            scored = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+                embedding, k=offset + limit + 1, filter=search_filter
+            )
+        # Same 0-1 relevance scale as Chroma.similarity_search_with_relevance_scores
+        relevance = DISTANCE_RELEVANCE[self._distance_metric()]
+        page = [(doc, relevance(distance)) for doc, distance in scored[offset:offset + limit]]
+        return page, len(scored) > offset + limit
+    
+    def _distance_metric(self) -> str:
+        """Distance metric of the Chroma collection (Chroma's default is l2)."""
+        metadata = self.vector_store._collection.metadata or {}
+        space = metadata.get("hnsw:space", "l2")
+        if space not in DISTANCE_RELEVANCE:
+            raise ValueError(f"Unsupported distance metric of the vector store: {space}")
+        return space
+    
+    @staticmethod
+    def _embedding_queries(searches: List[RetrievalSearch]) -> List[str]:
+        """Query strings of the searches that need an embedding (lexical searches don't)."""
+        return [search.query for search in searches if search.search_type != "lexical"]
+    
+    def _embed_queries(self, queries: List[str]) -> Dict[str, List[float]]:
+        """Embed a set of search queries, using the embedding cache and one batched call for misses.
+        
+        Args:
+            queries: Query strings; duplicates are embedded once
+            
+        Returns:
+            Mapping of query string to embedding (queries that failed to embed are missing)
+        """
+        embeddings = {}
+        to_embed = []
+        for query in dict.fromkeys(queries):
+            cached = self.embedding_cache.get(query) if self.embedding_cache else None
+            if cached is not None:
+                embeddings[query] = cached
+            else:
+                to_embed.append(query)
+        
+        if self.embedding_cache:
+            CACHE_REQUESTS.inc(len(embeddings), cache="embedding", result="hit")
+            CACHE_REQUESTS.inc(len(to_embed), cache="embedding", result="miss")
+        
+        if to_embed:
+            cached_count = len(embeddings)
+            embeddings.update(self._embed_uncached_queries(to_embed))
+            logger.info(f"🧮 Embedded {len(to_embed)} search queries in one batch ({cached_count} from cache)")
+        return embeddings
+    
+    @STAGE_DURATION.timed(stage="embedding")
+    def _embed_uncached_queries(self, queries: List[str]) -> Dict[str, List[float]]:
+        """Embed queries with one batched API call and store the results in the embedding cache."""
+        try:
+            if isinstance(self.embeddings, GoogleGenerativeAIEmbeddings):
+                # embed_documents defaults to RETRIEVAL_DOCUMENT; match what embed_query would use
+                vectors = self.embeddings.embed_documents(queries, task_type="RETRIEVAL_QUERY")
+            else:
+                vectors = self.embeddings.embed_documents(queries)
+        except Exception as e:
+            logger.warning(f"Batch embedding of {len(queries)} queries failed: {e}")
+            return {}
+        
+        if self.embedding_cache:
+            for query, vector in zip(queries, vectors):
+                self.embedding_cache.put(query, vector)
+        return dict(zip(queries, vectors))
+    
+    def warm_embedding_cache(self) -> int:
+        """Pre-embed the static query vocabulary used by generate_query_variations and program routing.
+        
+        Returns:
+            Number of query strings newly embedded
+        """
+        if not self.embedding_cache:
+            return 0
+        
+        vocabulary = []
+        for json_terms in RAGConfig.SECTION_QUERY_MAPPINGS.values():
+            vocabulary.extend(json_terms)
+        vocabulary.extend(RAGConfig.PROGRAM_QUERY_VARIANTS)
+        vocabulary.extend(RAGConfig.CREDIT_QUERY_VARIANTS)
+        for program_code, program_name in RAGConfig.PROGRAM_QUERY_MAPPINGS.values():
+            vocabulary.append(f"{program_code} {program_name} program")
+        vocabulary.append("program overview")
+        
+        missing = [query for query in dict.fromkeys(vocabulary) if not self.embedding_cache.contains(query)]
+        if not missing:
+            return 0
+        
+        embedded = self._embed_uncached_queries(missing)
+        logger.info(f"🔥 Pre-warmed embedding cache with {len(embedded)} static queries")
+        return len(embedded)
+    
+    def _run_searches(self, searches: List[RetrievalSearch],
+                      embeddings: Dict[str, List[float]]) -> Dict[int, List[Document]]:
+        """Run planned searches in parallel on the retrieval worker pool."""
+        futures = {
+            id(search): self.retrieval_executor.submit(self._execute_search, search, embeddings.get(search.query))
+            for search in searches
+        }
+        return {search_id: future.result() for search_id, future in futures.items()}
+    
+    async def _arun_searches(self, searches: List[RetrievalSearch],
+                             embeddings: Dict[str, List[float]]) -> Dict[int, List[Document]]:
+        """Async version of _run_searches; awaits all searches without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        documents = await asyncio.gather(*(
+            loop.run_in_executor(self.retrieval_executor, self._execute_search, search, embeddings.get(search.query))
+            for search in searches
+        ))
+        return {id(search): docs for search, docs in zip(searches, documents)}
+    
+    def _execute_search(self, search: RetrievalSearch, embedding: Optional[List[float]]) -> List[Document]:
+        """Run a single planned vector search, returning no documents on failure."""
+        with SEARCH_DURATION.time(bucket=search.bucket, search_type=search.search_type):
+            try:
+                if search.search_type == "metadata":
+                    return self._fetch_by_metadata(search, embedding)
+                if search.search_type == "lexical":
+                    return self.lexical_index.search(search.query, k=search.k, filter=search.filter) if self.lexical_index else []
+                if embedding is None:
+                    return []
+                if search.search_type == "mmr":
+                    return self.vector_store.max_marginal_relevance_search_by_vector(
+                        embedding, k=search.k, fetch_k=search.fetch_k, filter=search.filter
+                    )
+                return self.vector_store.similarity_search_by_vector(embedding, k=search.k, filter=search.filter)
+            except Exception as e:
+                logger.warning(f"{search.label} failed for query '{search.query}': {e}")
+                return []
+
+    def _fetch_by_metadata(self, search: RetrievalSearch, embedding: Optional[List[float]]) -> List[Document]:
+        """Fetch every document matching the search filter (no embedding call) and rank by the query embedding.
+        
+        Args:
+            search: Planned search with a metadata filter (e.g. {"course_code": "DIT042"})
+            embedding: Precomputed query embedding used for ranking; documents keep storage order without it
+        """
+        result = self.vector_store.get(
+            where=search.filter,
+            include=["documents", "metadatas", "embeddings"] if embedding is not None else ["documents", "metadatas"]
+        )
+        documents = [
+            Document(page_content=content, metadata=metadata or {})
+            for content, metadata in zip(result['documents'], result['metadatas'])
+        ]
+        
+        if embedding is not None and documents:
+            doc_vectors = np.asarray(result['embeddings'], dtype=np.float32)
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            norms = np.linalg.norm(doc_vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+            similarities = doc_vectors @ query_vector / np.where(norms > 0, norms, 1.0)
+            documents = [documents[i] for i in np.argsort(-similarities)]
+        
+        return documents[:search.k]
+
+    def _plan_retrieval(self, question: Union[str, QueryAnalysis], content_type: str, k: int = None,
+                        mode: str = None) -> RetrievalPlan:
+        """Decide which vector searches retrieve_documents should run for a question."""
         if not self.is_initialized:
             raise ValueError("Vector store not initialized. Call initialize_vector_store() first.")
         
+        mode = mode or self.retrieval_mode
+        if mode not in ("multi_query", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        
         # Use configured default if k not specified
         if k is None:
             k = RAGConfig.DEFAULT_K
@@ -736,269 +1332,206 @@ Section: {section_name}
         # Enforce k limits
         k = max(RAGConfig.MIN_SEARCH_K, min(k, RAGConfig.MAX_SEARCH_K))
         
-        # Extract course code if present in question (e.g., DIT005, TIA560)
-        import re
-        course_code_match = re.search(r'\b([A-Z]{2,4}\d{3})\b', question.upper())
-        found_course_code = course_code_match.group(1) if course_code_match else None
-        
-        # Extract course codes from enhanced context (if present)
-        context_match = re.search(r'\(context: ([A-Z]{2,4}\d{3})\)', question)
-        context_course_code = context_match.group(1) if context_match else None
-        
-        # Prioritize context course code over found course code
-        if context_course_code:
-            found_course_code = context_course_code
+        # Course code from the enhanced context takes priority over one found in the question
+        analysis = self.analyze_query(question)
+        question = analysis.enhanced_text
+        found_course_code = analysis.course_code
+        if analysis.context_course_code:
             logger.info(f"🎯 Using course code from context: {found_course_code}")
         
-        query_lower = question.lower()
-        
         logger.info(f"🔍 Processing query: '{question}'")
         if found_course_code:
             logger.info(f"🎯 Detected course code: {found_course_code}")
 
+        searches = []
+
         # === INTELLIGENT PATTERN-BASED ROUTING ===
-        targeted_docs = []
-        
         # Pattern 1: Program-specific queries
-        if any(phrase in query_lower for phrase in ['program', 'programme', 'master', 'bachelor']):
-            try:
-                # Map common program queries to program codes/names
-                program_mappings = {
-                    'computer science master': ['N2COS', 'Computer Science Master'],
-                    'cs master': ['N2COS', 'Computer Science Master'],
-                    'master in computer science': ['N2COS', 'Computer Science Master'],
-                    'software engineering master': ['N2SOF', 'Software Engineering and Management Master'],
-                    'software master': ['N2SOF', 'Software Engineering and Management Master'],
-                    'software engineering bachelor': ['N1SOF', 'Software Engineering and Management Bachelor'],
-                    'software bachelor': ['N1SOF', 'Software Engineering and Management Bachelor'],
-                    'game design': ['N2GDT', 'Game Design Technology Master'],
-                    'game design master': ['N2GDT', 'Game Design Technology Master'],
-                }
-                
-                # Check for exact program mapping
-                matched_program = None
-                for key, values in program_mappings.items():
-                    if key in query_lower:
-                        matched_program = values
-                        logger.info(f"🎯 Matched program: {values[1]} ({values[0]})")
-                        break
-                
-                # Extract program keywords
-                program_keywords = []
-                for word in question.split():
-                    if len(word) > 3 and word.lower() not in ['program', 'programme', 'master', 'bachelor', 'course', 'courses', 'what', 'which', 'about']:
-                        program_keywords.append(word.lower())
-                
-                if matched_program:
-                    # Search with both program code and name
-                    program_query = f"{matched_program[0]} {matched_program[1]} program"
-                elif program_keywords:
-                    program_query = " ".join(program_keywords[:3])  # Use first 3 significant words
-                else:
-                    program_query = "program overview"
-                    
-                logger.info(f"🎓 Program search query: '{program_query}'")
+        if analysis.has(*PROGRAM_PHRASES):
+            # Check for exact program mapping (common program queries to program codes/names)
+            matched_program = None
+            program_key = analysis.first(RAGConfig.PROGRAM_QUERY_MAPPINGS)
+            if program_key:
+                matched_program = RAGConfig.PROGRAM_QUERY_MAPPINGS[program_key]
+                logger.info(f"🎯 Matched program: {matched_program[1]} ({matched_program[0]})")
+            
+            # Extract program keywords
+            program_keywords = []
+            for word in question.split():
+                if len(word) > 3 and word.lower() not in ['program', 'programme', 'master', 'bachelor', 'course', 'courses', 'what', 'which', 'about']:
+                    program_keywords.append(word.lower())
+            
+            if matched_program:
+                # Search with both program code and name
+                program_query = f"{matched_program[0]} {matched_program[1]} program"
+            elif program_keywords:
+                program_query = " ".join(program_keywords[:3])  # Use first 3 significant words
+            else:
+                program_query = "program overview"
                 
-                # Use metadata filter for program-related content
-                program_retriever = self.vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={
-                        "k": min(30, k * 2)
-                    }
-                )
-                targeted_docs.extend(program_retriever.invoke(program_query))
-            except Exception as e:
-                logger.warning(f"Program-specific search failed: {e}")
+            logger.info(f"🎓 Program search query: '{program_query}'")
+            searches.append(RetrievalSearch(
+                bucket="targeted", label="Program-specific search",
+                query=program_query, k=min(30, k * 2)
+            ))
         
         # Pattern 2: Credit-based queries
-        elif any(phrase in query_lower for phrase in ['credit', 'hp', '7.5', '15', '30']):
-            try:
-                credit_match = re.search(r'(\d+\.?\d*)', query_lower)
-                if credit_match:
-                    credits = credit_match.group(1)
-                    logger.info(f"💳 Detected credits query: {credits}")
-                    
-                    credit_retriever = self.vector_store.as_retriever(
-                        search_type="similarity", 
-                        search_kwargs={
-                            "k": min(25, k * 2),
-                            "filter": {"credits": credits}
-                        }
-                    )
-                    targeted_docs.extend(credit_retriever.invoke(f"{credits} credits course"))
-            except Exception as e:
-                logger.warning(f"Credit-based search failed: {e}")
+        elif analysis.has(*CREDIT_PHRASES):
+            if analysis.credits:
+                credits = analysis.credits
+                logger.info(f"💳 Detected credits query: {credits}")
+                searches.append(RetrievalSearch(
+                    bucket="targeted", label="Credit-based search",
+                    query=f"{credits} credits course", k=min(25, k * 2),
+                    filter={"credits": credits}
+                ))
         
         # Pattern 3: Department queries
-        elif any(phrase in query_lower for phrase in ['department', 'department of', 'courses in department']):
-            try:
-                # Extract department name
-                dept_keywords = []
-                if 'computer science' in query_lower:
-                    dept_keywords.append('Department of Computer Science and Engineering')
-                elif 'applied information' in query_lower or 'information technology' in query_lower:
-                    dept_keywords.append('Department of Applied Information Technology')
-                elif 'mathematical' in query_lower or 'mathematics' in query_lower:
-                    dept_keywords.append('Department of Mathematical Sciences')
-                
-                if dept_keywords:
-                    logger.info(f"🏢 Detected department query: {dept_keywords[0]}")
-                    dept_retriever = self.vector_store.as_retriever(
-                        search_type="similarity",
-                        search_kwargs={
-                            "k": min(30, k * 2),
-                            "filter": {"department": dept_keywords[0]}
-                        }
-                    )
-                    targeted_docs.extend(dept_retriever.invoke(question))
-            except Exception as e:
-                logger.warning(f"Department-specific search failed: {e}")
+        elif analysis.has(*DEPARTMENT_PHRASES):
+            # Extract department name
+            dept_keywords = []
+            for names, department in DEPARTMENT_NAMES:
+                if analysis.has(*names):
+                    dept_keywords.append(department)
+                    break
+            
+            if dept_keywords:
+                logger.info(f"🏢 Detected department query: {dept_keywords[0]}")
+                searches.append(RetrievalSearch(
+                    bucket="targeted", label="Department-specific search",
+                    query=question, k=min(30, k * 2),
+                    filter={"department": dept_keywords[0]}
+                ))
         
         # Pattern 4: Academic cycle queries
-        elif any(phrase in query_lower for phrase in ['bachelor', 'master', 'phd', 'first cycle', 'second cycle', 'third cycle']):
-            try:
-                cycle_mapping = {
-                    'bachelor': 'First cycle',
-                    'master': 'Second cycle', 
-                    'phd': 'Third cycle',
-                    'first cycle': 'First cycle',
-                    'second cycle': 'Second cycle', 
-                    'third cycle': 'Third cycle'
-                }
-                
-                detected_cycle = None
-                for keyword, cycle in cycle_mapping.items():
-                    if keyword in query_lower:
-                        detected_cycle = cycle
-                        break
-                
-                if detected_cycle:
-                    logger.info(f"🎓 Detected cycle query: '{detected_cycle}'")
-                    cycle_retriever = self.vector_store.as_retriever(
-                        search_type="similarity",
-                        search_kwargs={
-                            "k": min(25, k * 2),
-                            "filter": {"cycle": detected_cycle}
-                        }
-                    )
-                    targeted_docs.extend(cycle_retriever.invoke(question))
-            except Exception as e:
-                logger.warning(f"Cycle-based search failed: {e}")
+        elif analysis.has(*CYCLE_MAPPING):
+            cycle_keyword = analysis.first(CYCLE_MAPPING)
+            detected_cycle = CYCLE_MAPPING[cycle_keyword] if cycle_keyword else None
+            
+            if detected_cycle:
+                logger.info(f"🎓 Detected cycle query: '{detected_cycle}'")
+                searches.append(RetrievalSearch(
+                    bucket="targeted", label="Cycle-based search",
+                    query=question, k=min(25, k * 2),
+                    filter={"cycle": detected_cycle}
+                ))
         
         # Pattern 4: Section-specific queries (prerequisites, assessment, etc.)
-        elif any(section_keyword in query_lower for section_keyword in [
-            'entry requirements', 'prerequisites', 'learning outcomes', 'assessment', 'course content',
-            'grading', 'evaluation', 'teaching', 'sub-courses', 'position', 'confirmation']):
+        elif analysis.has(*SECTION_PHRASES):
             logger.info(f"🎯 Detected section-specific query")
             # Get more documents for section-specific queries to capture relevant sections
             k = min(k * 2, 40)
         
         # Pattern 5: Course-specific queries with prioritization
+        # A course has only a dozen or so documents: fetch them all by metadata
+        # and rank them by the question embedding instead of a vector search
         if found_course_code:
-            try:
-                logger.info(f"🎯 Prioritizing results for course: {found_course_code}")
-                course_retriever = self.vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={
-                        "k": 20,
-                        "filter": {"course_code": found_course_code}
-                    }
-                )
-                course_specific_docs = course_retriever.invoke(question)
-                # Prioritize course-specific docs by adding them first
-                targeted_docs = course_specific_docs + targeted_docs
-                logger.info(f"Found {len(course_specific_docs)} course-specific sections")
-            except Exception as e:
-                logger.warning(f"Course-specific search failed: {e}")
+            logger.info(f"🎯 Prioritizing results for course: {found_course_code}")
+            searches.append(RetrievalSearch(
+                bucket="course", label="Course-specific lookup",
+                query=question, k=50,
+                filter={"course_code": found_course_code},
+                search_type="metadata"
+            ))
 
-        # === EXISTING MULTI-STRATEGY APPROACH ===
-        # Generate focused query variations (reduced from previous approach)
-        queries = self.generate_query_variations(question, content_type)
-        logger.info(f"🔍 Using {len(queries)} focused query variations (section-optimized)")
-        
-        # Strategy 1: Direct course code search if found (kept from original)
-        direct_match_docs = []
-        if found_course_code and not targeted_docs:  # Skip if we already got course-specific docs
-            try:
-                # Search with course code filter
-                direct_retriever = self.vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={
-                        "k": 50,  # Get more candidates
-                        "filter": {"course_code": found_course_code}
-                    }
-                )
-                direct_match_docs = direct_retriever.invoke(question)
-                logger.info(f"Direct course code search found {len(direct_match_docs)} documents")
-            except Exception as e:
-                logger.warning(f"Direct course code search failed: {e}")
-        
         # Strategy 2: Simplified multi-query semantic search
-        semantic_docs = []
         search_k = max(25, k * 2)  # Slightly reduced
         
         # === METADATA-BASED FILTERING ===
+        # Chroma 1.0.15 doesn't support $exists, so course/program routing is not
+        # pushed down as a filter; for "both", no filter - search everything
         metadata_filter = None
-        if content_type == "course":
-            # Filter for course documents (could add content_type: "course" to JSON in future)
-            # Chroma 1.0.15 doesn't support $exists, so we'll filter results later
-            metadata_filter = None
-        elif content_type == "program":
-            # Filter for program documents (could add content_type: "program" to JSON in future)  
-            # Chroma 1.0.15 doesn't support $exists, so we'll filter results later
-            metadata_filter = None
-        # For "both", no filter - search everything
+        
+        if mode == "hybrid":
+            # === HYBRID LEXICAL + VECTOR SEARCH ===
+            # One embedding of the question instead of a query per variation; BM25
+            # catches exact terms (codes, section and program names) the vector misses
+            logger.info("🔀 Using hybrid BM25 + vector search with reciprocal rank fusion")
+            searches.append(RetrievalSearch(
+                bucket="semantic", label="Similarity search",
+                query=question, k=search_k, filter=metadata_filter
+            ))
+            searches.append(RetrievalSearch(
+                bucket="semantic", label="Lexical search",
+                query=question, k=search_k, search_type="lexical"
+            ))
+            return RetrievalPlan(
+                question=question,
+                found_course_code=found_course_code,
+                search_k=search_k,
+                metadata_filter=metadata_filter,
+                searches=searches,
+                fuse_semantic=True
+            )
+        
+        # === EXISTING MULTI-STRATEGY APPROACH ===
+        # Generate focused query variations (reduced from previous approach)
+        queries = self.generate_query_variations(analysis, content_type)
+        logger.info(f"🔍 Using {len(queries)} focused query variations (section-optimized)")
         
         # === SIMPLIFIED SEARCH STRATEGY ===
         # Use only similarity search for most queries (MMR is expensive and often redundant)
         # Only use MMR for the original question to avoid redundancy
-        
-        search_kwargs = {
-            "k": search_k,
-            "filter": metadata_filter
-        }
-            
-        # Primary search: Use similarity for all query variations
-        similarity_retriever = self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs=search_kwargs
-        )
-            
         for query in queries:
-            try:
-                docs = similarity_retriever.invoke(query)
-                semantic_docs.extend(docs)
-            except Exception as e:
-                logger.warning(f"Failed to retrieve for query '{query}' with similarity search: {e}")
+            searches.append(RetrievalSearch(
+                bucket="semantic", label="Similarity search",
+                query=query, k=search_k, filter=metadata_filter
+            ))
+        
+        return RetrievalPlan(
+            question=question,
+            found_course_code=found_course_code,
+            search_k=search_k,
+            metadata_filter=metadata_filter,
+            searches=searches
+        )
+    
+    def _plan_fallback_searches(self, plan: RetrievalPlan, results: Dict[int, List[Document]]) -> List[RetrievalSearch]:
+        """Plan searches that depend on the primary search results and append them to the plan."""
+        fallback_searches = []
+        
+        # Keyword-based search for course titles, only if the course lookup found
+        # nothing under that code (e.g. a misspelled or retired code)
+        # Skip if we already got course-specific or pattern-based docs
+        targeted_count = sum(len(results[id(s)]) for s in plan.searches if s.bucket in ("targeted", "course"))
+        if plan.found_course_code and targeted_count == 0:
+            fallback_searches.append(RetrievalSearch(
+                bucket="keyword", label="Keyword search",
+                query=f"course title {plan.found_course_code}", k=20
+            ))
         
         # Secondary search: Use MMR only for original question if we have few results
-        if len(semantic_docs) < search_k:
-            try:
-                mmr_kwargs = search_kwargs.copy()
-                mmr_kwargs["fetch_k"] = search_k * 2
-                mmr_retriever = self.vector_store.as_retriever(
-                    search_type="mmr",
-                    search_kwargs=mmr_kwargs
-                )
-                mmr_docs = mmr_retriever.invoke(question)  # Only original question
-                semantic_docs.extend(mmr_docs)
+        semantic_count = sum(len(results[id(s)]) for s in plan.searches if s.bucket == "semantic")
+        if semantic_count < plan.search_k:
+            fallback_searches.append(RetrievalSearch(
+                bucket="semantic", label="MMR search",
+                query=plan.question, k=plan.search_k, filter=plan.metadata_filter,
+                search_type="mmr", fetch_k=plan.search_k * 2
+            ))
+        
+        plan.searches.extend(fallback_searches)
+        return fallback_searches
+    
+    def _merge_retrieval_results(self, plan: RetrievalPlan, results: Dict[int, List[Document]]) -> List[Document]:
+        """Combine the results of all planned searches with prioritization and de-duplication."""
+        buckets = {"course": [], "targeted": [], "semantic": [], "keyword": []}
+        for search in plan.searches:
+            buckets[search.bucket].extend(results.get(id(search), []))
+            if search.bucket == "course":
+                logger.info(f"Found {len(results.get(id(search), []))} course-specific sections")
+            elif search.search_type == "mmr":
                 logger.info(f"🔄 Added MMR search results for diversity")
-            except Exception as e:
-                logger.warning(f"MMR search failed: {e}")
         
-        # Strategy 3: Keyword-based search for course titles
-        keyword_docs = []
-        if found_course_code:
-            # Try searching for course title in content
-            try:
-                title_retriever = self.vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 20}
-                )
-                title_query = f"course title {found_course_code}"
-                keyword_docs = title_retriever.invoke(title_query)
-            except Exception as e:
-                logger.warning(f"Keyword search failed: {e}")
+        # Prioritize course-specific docs by adding them first
+        targeted_docs = buckets["course"] + buckets["targeted"]
+        if plan.fuse_semantic:
+            semantic_docs = reciprocal_rank_fusion(
+                [results.get(id(search), []) for search in plan.searches if search.bucket == "semantic"],
+                key=self._document_key, k=RAGConfig.RRF_K
+            )
+        else:
+            semantic_docs = buckets["semantic"]
+        keyword_docs = buckets["keyword"]
         
         # === COMBINE WITH PRIORITIZATION ===
         all_docs = []
@@ -1006,27 +1539,23 @@ Section: {section_name}
         # Priority 1: Targeted pattern-based results (NEW - highest priority)
         all_docs.extend(targeted_docs)
         
-        # Priority 2: Direct course code matches
-        all_docs.extend(direct_match_docs)
-        
-        # Priority 3: Semantic search results
+        # Priority 2: Semantic search results
         all_docs.extend(semantic_docs)
         
-        # Priority 4: Keyword search results
+        # Priority 3: Keyword search results
         all_docs.extend(keyword_docs)
         
         # Remove duplicates while preserving order (prioritized)
         seen = set()
         unique_docs = []
         for doc in all_docs:
-            # Create unique identifier
-            doc_id = f"{doc.page_content[:100]}_{doc.metadata.get('course_code', '')}_{doc.metadata.get('section', '')}"
+            doc_id = self._document_key(doc)
             if doc_id not in seen:
                 seen.add(doc_id)
                 unique_docs.append(doc)
         
         logger.info(f"📊 Retrieved {len(unique_docs)} unique documents (from {len(all_docs)} total)")
-        logger.info(f"   └─ Targeted: {len(targeted_docs)}, Direct: {len(direct_match_docs)}, Semantic: {len(semantic_docs)}, Keyword: {len(keyword_docs)}")
+        logger.info(f"   └─ Targeted: {len(targeted_docs)}, Semantic: {len(semantic_docs)}, Keyword: {len(keyword_docs)}")
         
         # Log some debug info about what was found
         course_codes_found = set()
@@ -1038,8 +1567,14 @@ Section: {section_name}
             logger.info(f"🎯 Top courses found: {', '.join(list(course_codes_found)[:5])}")
         
         # Return more documents but cap at reasonable limit
+        search_k = plan.search_k
         return unique_docs[:max(search_k * 3, 50)]  # Return up to 3x requested or 50, whichever is higher
 
+    @staticmethod
+    def _document_key(doc: Document) -> str:
+        """Identity of a document across search results (for de-duplication and rank fusion)."""
+        return f"{doc.page_content[:100]}_{doc.metadata.get('course_code', '')}_{doc.metadata.get('section', '')}"
+
     def _truncate_context(self, context: str, question: str) -> str:
         """Intelligently truncate context to fit within token limits."""
         # Rough estimation: 1 token ≈ 4 characters for English text
@@ -1069,8 +1604,136 @@ Section: {section_name}
         logger.info(f"✂️ Context truncated from {len(context)} to {len(truncated_context)} characters")
         return truncated_context.strip()
 
-    def generate_answer(self, question: str, documents: List[Document]) -> str:
-        """Generate answer using retrieved documents."""
+    def generate_answer(self, question: str, documents: List[Document],
+                        conversation: Optional[ConversationContext] = None) -> str:
+        """Generate answer using retrieved documents and the conversation context."""
+        conversation = conversation or self.default_context
+        chain, inputs, estimated_input_tokens = self._prepare_generation(question, documents, conversation)
+        
+        try:
+            logger.info("🔄 Calling LLM...")
+            with self._llm_slot(), STAGE_DURATION.time(stage="llm"):
+                answer = chain.invoke(inputs)
+            return self._finalize_answer(question, answer, estimated_input_tokens, conversation)
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._generation_error_answer(e)
+    
+    async def agenerate_answer(self, question: str, documents: List[Document],
+                               conversation: Optional[ConversationContext] = None) -> str:
+        """Async version of generate_answer using the LLM's native async API."""
+        conversation = conversation or self.default_context
+        chain, inputs, estimated_input_tokens = self._prepare_generation(question, documents, conversation)
+        
+        try:
+            logger.info("🔄 Calling LLM (async)...")
+            async with self._allm_slot():
+                with STAGE_DURATION.time(stage="llm"):
+                    answer = await chain.ainvoke(inputs)
+            return self._finalize_answer(question, answer, estimated_input_tokens, conversation)
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._generation_error_answer(e)
+    
+    async def astream_answer(self, question: str, documents: List[Document],
+                             conversation: Optional[ConversationContext] = None) -> AsyncIterator[str]:
+        """Stream the answer text chunk by chunk as it arrives from the LLM (chain.astream)."""
+        conversation = conversation or self.default_context
+        chain, inputs, estimated_input_tokens = self._prepare_generation(question, documents, conversation)
+        
+        answer_parts = []
+        # The LLM stream is read into a queue at Gemini's pace, so the admission slot is
+        # released when generation ends rather than when a slow client has read every token
+        chunks: asyncio.Queue = asyncio.Queue()
+        
+        async def read_llm_stream():
+            try:
+                async with self._allm_slot():
+                    llm_start = time.perf_counter()
+                    async for chunk in chain.astream(inputs):
+                        if chunk:
+                            chunks.put_nowait(chunk)
+                    STAGE_DURATION.observe(time.perf_counter() - llm_start, stage="llm")
+                chunks.put_nowait(None)
+            except Exception as e:
+                chunks.put_nowait(e)
+        
+        reader = asyncio.ensure_future(read_llm_stream())
+        try:
+            logger.info("🔄 Streaming from LLM...")
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                answer_parts.append(chunk)
+                yield chunk
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            fallback_answer = self._generation_error_answer(e)
+            # Keep whatever was already streamed; append the apology after it
+            chunk = f"\n\n{fallback_answer}" if answer_parts else fallback_answer
+            answer_parts.append(chunk)
+            yield chunk
+            return
+        finally:
+            # No-op once the stream ended; if the client went away, stop generating and free the slot
+            reader.cancel()
+        
+        answer = "".join(answer_parts)
+        final_answer = self._finalize_answer(question, answer, estimated_input_tokens, conversation)
+        if final_answer != answer:
+            # Empty LLM answer was replaced by the fallback text
+            yield final_answer
+    
+    @contextmanager
+    def _llm_slot(self) -> Iterator[None]:
+        """Hold an LLM admission slot (raises LLMOverloadedError when shed) and count the call as in flight."""
+        if self.llm_admission is None:
+            with self.load_monitor.track_llm_call():
+                yield
+            return
+        with self.llm_admission.slot() as wait:
+            self.load_monitor.record_queue_time(wait)
+            with self.load_monitor.track_llm_call():
+                yield
+    
+    @asynccontextmanager
+    async def _allm_slot(self) -> AsyncIterator[None]:
+        """Async version of _llm_slot; waiting for a slot doesn't block the event loop."""
+        if self.llm_admission is None:
+            with self.load_monitor.track_llm_call():
+                yield
+            return
+        async with self.llm_admission.aslot() as wait:
+            self.load_monitor.record_queue_time(wait)
+            with self.load_monitor.track_llm_call():
+                yield
+    
+    def _extractive_answer(self, documents: List[Document]) -> str:
+        """Answer without the LLM from excerpts of the top retrieved documents (overload fallback)."""
+        intro = "The assistant is handling a lot of questions right now"
+        if not documents:
+            return f"{intro} and couldn't answer yours. Please try again in a moment."
+        
+        parts = [f"{intro}, so here are the most relevant excerpts from the course information:"]
+        for doc in documents[:RAGConfig.EXTRACTIVE_FALLBACK_DOCUMENTS]:
+            heading = " - ".join(filter(None, [doc.metadata.get('course_code'),
+                                               doc.metadata.get('course_title') or doc.metadata.get('program_name')]))
+            section = doc.metadata.get('section_name') or doc.metadata.get('section')
+            if section:
+                heading = f"{heading} ({section})" if heading else str(section)
+            excerpt = textwrap.shorten(doc.page_content, width=400, placeholder="...")
+            parts.append(f"**{heading or 'Course information'}**\n{excerpt}")
+        return "\n\n".join(parts)
+    
+    @STAGE_DURATION.timed(stage="context_assembly")
+    def _prepare_generation(self, question: str, documents: List[Document], conversation: ConversationContext):
+        """Build the LLM chain and its inputs (context, chat history) for a question."""
         logger.info(f"🤖 === GENERATE ANSWER START ===")
         logger.info(f"❓ Question: {question}")
         logger.info(f"📄 Number of documents: {len(documents)}")
@@ -1093,159 +1756,142 @@ Section: {section_name}
         context = self._truncate_context(context, question)
         
         # Get chat history
-        chat_history = self.memory.chat_memory.messages
-        logger.info(f"💭 Chat history length: {len(chat_history)} messages")
+        chat_history = conversation.prompt_history()
+        if isinstance(chat_history, str):
+            logger.info(f"💭 Chat history: summary + last turn, {len(chat_history)} characters")
+        else:
+            logger.info(f"💭 Chat history length: {len(chat_history)} messages")
         
         # Generate answer with token tracking
         chain = self.system_prompt | self.llm | StrOutputParser()
         
-        try:
-            logger.info("🔄 Calling LLM...")
-            
-            # Estimate input tokens (rough approximation: 1 token ≈ 4 characters)
-            input_text = context + question + str(chat_history)
-            estimated_input_tokens = len(input_text) // 4
-            logger.info(f"📊 Estimated input tokens: {estimated_input_tokens}")
-            
-            answer = chain.invoke({
-                "context": context,
-                "question": question,
-                "chat_history": chat_history
-            })
-            
-            # Estimate output tokens
-            estimated_output_tokens = len(answer) // 4
-            total_estimated_tokens = estimated_input_tokens + estimated_output_tokens
-            
-            # Calculate cost using centralized configuration
-            token_cost = RAGConfig.get_token_cost(self.llm_model)
-            estimated_cost = total_estimated_tokens * token_cost
-            
-            logger.info(f"📊 Estimated output tokens: {estimated_output_tokens}")
-            logger.info(f"📊 Total estimated tokens: {total_estimated_tokens}")
-            logger.info(f"💰 Estimated cost: ${estimated_cost:.4f}")
-            
-            logger.info(f"✅ === LLM RESPONSE ===")
-            logger.info(f"📝 Answer length: {len(answer)} characters")
-            logger.info(f"👀 Answer preview: {answer[:300]}...")
-            
-            if not answer or len(answer.strip()) == 0:
-                logger.warning("⚠️ WARNING: LLM returned empty answer!")
-                logger.warning(f"🔍 Raw answer: '{answer}'")
-                # Return a fallback response instead of empty
-                answer = "I apologize, but I wasn't able to generate a response to your question. Please try rephrasing your question or visit the official Gothenburg University website at https://www.gu.se/en/study-in-gothenburg for more information."
-                logger.info(f"🔄 Using fallback answer: {answer}")
-            
-            # Update memory
-            self.memory.save_context({"question": question}, {"answer": answer})
-            
-            logger.info(f"🏁 === GENERATE ANSWER END ===")
-            return answer
-            
-        except Exception as e:
-            logger.error(f"❌ === LLM ERROR ===")
-            logger.error(f"💥 Error generating answer: {e}")
-            logger.error(f"🔧 Error type: {type(e).__name__}")
-            import traceback
-            logger.error(f"📚 Traceback: {traceback.format_exc()}")
-            
-            fallback_answer = f"I apologize, but I encountered an error while processing your question. For more information, please visit the official Gothenburg University website at https://www.gu.se/en/study-in-gothenburg"
-            logger.info(f"🔄 Returning fallback answer due to error")
-            return fallback_answer
-
-    def _get_cache_key(self, question: str) -> str:
-        """Generate a cache key for the question."""
-        # Normalize the question for consistent caching
-        normalized = question.strip().lower()
+        # Estimate input tokens (rough approximation: 1 token ≈ 4 characters)
+        input_text = context + question + str(chat_history)
+        estimated_input_tokens = len(input_text) // 4
+        logger.info(f"📊 Estimated input tokens: {estimated_input_tokens}")
+        
+        inputs = {
+            "context": context,
+            "question": question,
+            "chat_history": chat_history
+        }
+        return chain, inputs, estimated_input_tokens
+    
+    def _finalize_answer(self, question: str, answer: str, estimated_input_tokens: int,
+                         conversation: ConversationContext) -> str:
+        """Log token usage, apply the empty-answer fallback and update conversation memory."""
+        # Estimate output tokens
+        estimated_output_tokens = len(answer) // 4
+        total_estimated_tokens = estimated_input_tokens + estimated_output_tokens
+        
+        # Calculate cost using centralized configuration
+        token_cost = RAGConfig.get_token_cost(self.llm_model)
+        estimated_cost = total_estimated_tokens * token_cost
+        
+        logger.info(f"📊 Estimated output tokens: {estimated_output_tokens}")
+        logger.info(f"📊 Total estimated tokens: {total_estimated_tokens}")
+        logger.info(f"💰 Estimated cost: ${estimated_cost:.4f}")
+        LLM_TOKENS.inc(estimated_input_tokens, direction="input")
+        LLM_TOKENS.inc(estimated_output_tokens, direction="output")
+        LLM_COST.inc(estimated_cost)
+        
+        logger.info(f"✅ === LLM RESPONSE ===")
+        logger.info(f"📝 Answer length: {len(answer)} characters")
+        logger.info(f"👀 Answer preview: {answer[:300]}...")
+        
+        if not answer or len(answer.strip()) == 0:
+            logger.warning("⚠️ WARNING: LLM returned empty answer!")
+            logger.warning(f"🔍 Raw answer: '{answer}'")
+            # Return a fallback response instead of empty
+            answer = "I apologize, but I wasn't able to generate a response to your question. Please try rephrasing your question or visit the official Gothenburg University website at https://www.gu.se/en/study-in-gothenburg for more information."
+            logger.info(f"🔄 Using fallback answer: {answer}")
+        
+        # Update memory
+        conversation.memory.save_context({"question": question}, {"answer": answer})
+        
+        logger.info(f"🏁 === GENERATE ANSWER END ===")
+        return answer
+    
+    def _generation_error_answer(self, e: Exception) -> str:
+        """Log an LLM failure and return the user-facing fallback answer."""
+        LLM_ERRORS.inc(error_type=type(e).__name__)
+        logger.error(f"❌ === LLM ERROR ===")
+        logger.error(f"💥 Error generating answer: {e}")
+        logger.error(f"🔧 Error type: {type(e).__name__}")
+        import traceback
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        
+        fallback_answer = f"I apologize, but I encountered an error while processing your question. For more information, please visit the official Gothenburg University website at https://www.gu.se/en/study-in-gothenburg"
+        logger.info(f"🔄 Returning fallback answer due to error")
+        return fallback_answer
+
+    def _get_cache_key(self, analysis: QueryAnalysis) -> str:
+        """
+        Generate a cache key for the question.
+        
+        The key covers the course carried over from chat history (enhanced_text), so
+        a follow-up like "What are the prerequisites?" asked about different courses
+        in different conversations never shares a cache entry.
+        """
+        # Normalize the question (case and whitespace) for consistent caching
+        normalized = " ".join(analysis.enhanced_text.lower().split())
         return hashlib.md5(normalized.encode()).hexdigest()
     
     def _get_cached_response(self, cache_key: str) -> Optional[Dict]:
         """Get cached response if available and not expired."""
         if not self.cache_enabled:
             return None
-            
-        if cache_key not in self.response_cache:
-            return None
-        
-        # Check TTL
-        cache_time = self.cache_timestamps.get(cache_key, 0)
-        current_time = datetime.now().timestamp()
-        
-        if current_time - cache_time > self.cache_ttl:
-            # Expired, remove from cache
-            del self.response_cache[cache_key]
-            del self.cache_timestamps[cache_key]
-            logger.debug(f"🕐 Cache entry expired and removed: {cache_key[:8]}...")
-            return None
         
         return self.response_cache.get(cache_key)
     
     def _cache_response(self, cache_key: str, response: Dict):
-        """Cache a response with size limit and TTL."""
+        """Cache a response; the backend handles size limit and TTL."""
         if not self.cache_enabled:
             return
-            
-        current_time = datetime.now().timestamp()
-        
-        # Clean expired entries first
-        expired_keys = []
-        for key, timestamp in self.cache_timestamps.items():
-            if current_time - timestamp > self.cache_ttl:
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del self.response_cache[key]
-            del self.cache_timestamps[key]
-            
-        if expired_keys:
-            logger.debug(f"🧹 Cleaned {len(expired_keys)} expired cache entries")
-        
-        # Simple LRU: remove oldest if cache is full
-        if len(self.response_cache) >= self.max_cache_size:
-            # Remove the oldest item by timestamp
-            oldest_key = min(self.cache_timestamps.keys(), key=lambda k: self.cache_timestamps[k])
-            del self.response_cache[oldest_key]
-            del self.cache_timestamps[oldest_key]
-            logger.debug("🗑️ Removed oldest cache entry to make space")
         
-        # Add new response to cache
         response["cached_at"] = datetime.now().isoformat()
-        self.response_cache[cache_key] = response
-        self.cache_timestamps[cache_key] = current_time
-        logger.info(f"💾 Cached response (cache size: {len(self.response_cache)}/{self.max_cache_size})")
+        self.response_cache.set(cache_key, response)
+        logger.info(f"💾 Cached response (cache size: {self.response_cache.size()}/{self.max_cache_size})")
     
     def clear_cache(self):
         """Clear the response cache."""
         self.response_cache.clear()
+        if self.semantic_cache:
+            self.semantic_cache.clear()
         logger.info("🗑️ Response cache cleared")
     
     def get_cache_stats(self) -> Dict:
         """Get cache statistics."""
         return {
-            "cache_size": len(self.response_cache),
+            "cache_backend": type(self.response_cache).__name__,
+            "cache_size": self.response_cache.size(),
             "max_cache_size": self.max_cache_size,
-            "cache_keys": list(self.response_cache.keys())[:5]  # First 5 for debugging
+            "cache_keys": self.response_cache.keys(5),  # First 5 for debugging
+            "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else {"enabled": False},
+            "semantic_cache": self.semantic_cache.get_stats() if self.semantic_cache else {"enabled": False},
+            "coalescing": self.single_flight.get_stats() if self.single_flight else {"enabled": False}
         }
 
-    def extract_course_codes_from_history(self) -> List[str]:
+    def extract_course_codes_from_history(self, conversation: Optional[ConversationContext] = None) -> List[str]:
         """Extract course codes from chat history using top_courses list.
         
         Uses the top_courses list from previous AI responses which includes
         all relevant course codes found, not just those in the limited sources.
         Falls back to extracting from sources if top_courses not available.
         """
+        conversation = conversation or self.default_context
         try:
             # First try to use top_courses from chat history
-            if hasattr(self, 'chat_history_top_courses') and self.chat_history_top_courses:
-                logger.info(f"📚 Using top_courses from chat history: {self.chat_history_top_courses[:3]}")
-                return self.chat_history_top_courses[:3]
+            if conversation.chat_history_top_courses:
+                logger.info(f"📚 Using top_courses from chat history: {conversation.chat_history_top_courses[:3]}")
+                return conversation.chat_history_top_courses[:3]
             
             # Fallback to extracting from sources
-            if not hasattr(self, 'chat_history_sources'):
+            if not conversation.chat_history_sources:
                 return []
             
             course_codes = []
-            for source in self.chat_history_sources:
+            for source in conversation.chat_history_sources:
                 if isinstance(source, dict) and source.get('course_code'):
                     course_code = source['course_code']
                     if course_code and course_code not in course_codes:
@@ -1259,17 +1905,459 @@ Section: {section_name}
             logger.warning(f"Error extracting course codes from history: {e}")
             return []
     
-    def query(self, question: str) -> Dict:
-        """Main query method with response caching and rate limiting."""
+    @QUERY_DURATION.timed(method="query")
+    def query(self, question: str, conversation: Optional[ConversationContext] = None) -> Dict:
+        """
+        Main query method with response caching and rate limiting.
+        
+        Args:
+            question: The user's question
+            conversation: Per-request conversation context (memory, client ID).
+                          Defaults to the engine's own default context.
+        """
+        conversation = conversation or self.default_context
+        analysis = self._enhance_question_with_history(self._validate_question(question, conversation), conversation)
+        question = analysis.text
+        
+        # === RESPONSE CACHING ===
+        cache_key = self._get_cache_key(analysis)
+        cached_response = (self._lookup_cached_response(question, cache_key)
+                           or self._lookup_semantic_response(analysis))
+        if cached_response:
+            return cached_response
+        
+        # === REQUEST COALESCING ===
+        # Identical questions already being answered wait for that answer instead
+        if not self.single_flight:
+            return self._compute_response(analysis, cache_key, conversation)
+        # Keyed like the cache: the same question about the same course
+        response, coalesced = self.single_flight.do_sync(
+            cache_key, lambda: self._compute_response(analysis, cache_key, conversation)
+        )
+        return self._coalesced_response(question, cache_key, response) if coalesced else response
+    
+    def _compute_response(self, analysis: QueryAnalysis, cache_key: str, conversation: ConversationContext) -> Dict:
+        """Answer a question that missed the cache: route, retrieve, generate and cache the response."""
+        question = analysis.text
+        try:
+            logger.info(f"🚀 === NEW QUERY START ===")
+            logger.info(f"❓ Query: '{question}'")
+            
+            # Route the query
+            content_type = self.route_query(analysis)
+            logger.info(f"🧭 Routed query to: {content_type}")
+            
+            # Retrieve documents using enhanced question
+            documents = self.retrieve_documents(analysis, content_type)
+            
+            # Generate answer
+            answer = self.generate_answer(question, documents, conversation)
+            
+            response = self._build_response(question, answer, content_type, documents, cache_key)
+            
+            # === CACHE THE RESPONSE ===
+            self._cache_response(cache_key, response.copy())  # Cache a copy
+            self._index_semantic_response(analysis, cache_key)
+            
+            logger.info(f"✅ === QUERY COMPLETE ===")
+            return response
+            
+        except LLMOverloadedError as e:
+            return self._overloaded_response(question, content_type, documents, cache_key, e)
+        except Exception as e:
+            return self._error_response(question, e)
+    
+    @QUERY_DURATION.timed(method="aquery")
+    async def aquery(self, question: str, conversation: Optional[ConversationContext] = None) -> Dict:
+        """
+        Async version of query() for use inside the FastAPI event loop.
+        
+        LLM calls use LangChain's async API; the batched embedding call, Chroma
+        searches and SQLite cache I/O run in worker threads, so a slow Gemini call
+        no longer blocks other requests.
+        """
+        conversation = conversation or self.default_context
+        analysis = self._enhance_question_with_history(self._validate_question(question, conversation), conversation)
+        question = analysis.text
+        
+        # === RESPONSE CACHING ===
+        cache_key = self._get_cache_key(analysis)
+        cached_response = await self._run_cache_io(self._lookup_cached_response, question, cache_key)
+        if not cached_response and self.semantic_cache:
+            cached_response = await asyncio.to_thread(self._lookup_semantic_response, analysis)
+        if cached_response:
+            return cached_response
+        
+        # === REQUEST COALESCING ===
+        if not self.single_flight:
+            return await self._acompute_response(analysis, cache_key, conversation)
+        response, coalesced = await self.single_flight.do(
+            cache_key, lambda: self._acompute_response(analysis, cache_key, conversation)
+        )
+        return self._coalesced_response(question, cache_key, response) if coalesced else response
+    
+    async def _acompute_response(self, analysis: QueryAnalysis, cache_key: str,
+                                 conversation: ConversationContext) -> Dict:
+        """Async version of _compute_response."""
+        question = analysis.text
+        try:
+            logger.info(f"🚀 === NEW QUERY START (async) ===")
+            logger.info(f"❓ Query: '{question}'")
+            
+            # Route the query
+            content_type = self.route_query(analysis)
+            logger.info(f"🧭 Routed query to: {content_type}")
+            
+            # Retrieve documents using enhanced question
+            documents = await self.aretrieve_documents(analysis, content_type)
+            
+            # Generate answer
+            answer = await self.agenerate_answer(question, documents, conversation)
+            
+            response = self._build_response(question, answer, content_type, documents, cache_key)
+            
+            # === CACHE THE RESPONSE ===
+            await self._run_cache_io(self._cache_response, cache_key, response.copy())  # Cache a copy
+            if self.semantic_cache:
+                await asyncio.to_thread(self._index_semantic_response, analysis, cache_key)
+            
+            logger.info(f"✅ === QUERY COMPLETE ===")
+            return response
+            
+        except LLMOverloadedError as e:
+            return self._overloaded_response(question, content_type, documents, cache_key, e)
+        except Exception as e:
+            return self._error_response(question, e)
+    
+    def query_batch(self, questions: List[str], client_id: str = "batch",
+                    max_concurrency: int = None) -> List[Dict]:
+        """
+        Answer many independent questions at once (sync wrapper around aquery_batch).
+        
+        Must not be called from a running event loop; use aquery_batch there.
+        
+        Returns:
+            One result per question, in input order
+        """
+        async def collect() -> List[Dict]:
+            return [item async for item in self.aquery_batch(questions, client_id, max_concurrency)]
+        
+        return sorted(asyncio.run(collect()), key=lambda item: item["index"])
+    
+    def dedupe_batch(self, questions: List[str], client_id: str = "batch"
+                     ) -> Tuple[Dict[str, QueryAnalysis], Dict[str, List[int]], List[Tuple[int, str]]]:
+        """
+        Validate the questions of a batch and group them by cache key.
+        
+        Questions that only differ in case, whitespace or corrected typos share a
+        cache key and are answered once; the number of keys is what a batch costs.
+        
+        Args:
+            questions: Questions of the batch
+            client_id: Client ID of the per-question conversation contexts
+            
+        Returns:
+            (cache key -> analysis, cache key -> positions of its questions,
+            [(position, validation error)] of rejected questions)
+        """
+        analyses: Dict[str, QueryAnalysis] = {}
+        indexes: Dict[str, List[int]] = {}
+        errors: List[Tuple[int, str]] = []
+        for index, question in enumerate(questions):
+            conversation = ConversationContext(client_id=client_id)
+            conversation.rate_limit_checked = True  # The caller rate limits the batch as a whole
+            try:
+                analysis = self._validate_question(question, conversation)
+            except ValueError as e:
+                errors.append((index, str(e)))
+                continue
+            cache_key = self._get_cache_key(analysis)
+            indexes.setdefault(cache_key, []).append(index)
+            analyses.setdefault(cache_key, analysis)
+        return analyses, indexes, errors
+    
+    async def aquery_batch(self, questions: List[str], client_id: str = "batch",
+                           max_concurrency: int = None, deduped: Optional[Tuple] = None) -> AsyncIterator[Dict]:
+        """
+        Answer many independent questions concurrently, yielding each result as soon as it is ready.
+        
+        Identical questions (same cache key) are answered once. The questions, and
+        then the search queries of every retrieval plan, are embedded in batched
+        calls; retrieval runs in parallel and at most max_concurrency LLM calls of the
+        batch run at a time (within the process-wide LLM admission control).
+        Questions are answered without chat history, and the caller rate limits the
+        batch (see dedupe_batch for what counts as a distinct question).
+        
+        Args:
+            questions: Questions to answer
+            client_id: Client ID of the per-question conversation contexts
+            max_concurrency: Concurrent LLM calls for this batch (default: RAGConfig.BATCH_LLM_CONCURRENCY)
+            deduped: dedupe_batch(questions, client_id) if the caller already ran it (e.g. to rate limit)
+            
+        Yields:
+            The response of a question (as from aquery) plus its "index" and "question";
+            questions rejected by validation yield only "index", "question" and "error"
+        """
+        # === VALIDATION AND DEDUPLICATION ===
+        analyses, indexes, errors = deduped or self.dedupe_batch(questions, client_id)
+        for index, error in errors:
+            yield {"index": index, "question": questions[index], "error": error}
+        if not analyses:
+            return
+        logger.info(f"📦 === BATCH QUERY: {len(questions)} questions, {len(analyses)} unique ===")
+        
+        def results(cache_key: str, response: Dict) -> List[Dict]:
+            return [{**response, "index": index, "question": questions[index]} for index in indexes[cache_key]]
+        
+        # === RESPONSE CACHING ===
+        # Semantic lookups need every question embedded: one call for all of them, reused by retrieval
+        question_embeddings: Dict[str, List[float]] = {}
+        if self.semantic_cache:
+            question_embeddings = await asyncio.to_thread(
+                self._embed_queries, [analysis.text for analysis in analyses.values()]
+            )
+        misses: Dict[str, QueryAnalysis] = {}
+        for cache_key, analysis in analyses.items():
+            cached_response = await self._run_cache_io(self._lookup_cached_response, analysis.text, cache_key)
+            if not cached_response and self.semantic_cache:
+                cached_response = await asyncio.to_thread(
+                    self._lookup_semantic_response, analysis, question_embeddings.get(analysis.text)
+                )
+            if cached_response:
+                for result in results(cache_key, cached_response):
+                    yield result
+            else:
+                misses[cache_key] = analysis
+        if not misses:
+            return
+        
+        # === RETRIEVAL PLANS, EMBEDDED TOGETHER ===
+        content_types = {cache_key: self.route_query(analysis) for cache_key, analysis in misses.items()}
+        plans = {cache_key: self._plan_retrieval(analysis, content_types[cache_key])
+                 for cache_key, analysis in misses.items()}
+        embeddings = dict(question_embeddings)
+        embeddings.update(await asyncio.to_thread(self._embed_queries, [
+            query for plan in plans.values() for query in self._embedding_queries(plan.searches) + [plan.question]
+            if query not in embeddings
+        ]))
+        
+        llm_slots = asyncio.Semaphore(max_concurrency or RAGConfig.BATCH_LLM_CONCURRENCY)
+        
+        async def answer(cache_key: str):
+            analysis = misses[cache_key]
+            question = analysis.text
+            content_type = content_types[cache_key]
+            documents: List[Document] = []
+            try:
+                with STAGE_DURATION.time(stage="retrieval"):
+                    documents = await self._aexecute_plan(plans[cache_key], embeddings)
+                async with llm_slots:
+                    answer = await self.agenerate_answer(question, documents, ConversationContext(client_id=client_id))
+                response = self._build_response(question, answer, content_type, documents, cache_key)
+                await self._run_cache_io(self._cache_response, cache_key, response.copy())
+                if self.semantic_cache:
+                    await asyncio.to_thread(
+                        self._index_semantic_response, analysis, cache_key, question_embeddings.get(question)
+                    )
+            except LLMOverloadedError as e:
+                if RAGConfig.LLM_OVERLOAD_FALLBACK == "extractive":
+                    response = self._overloaded_response(question, content_type, documents, cache_key, e)
+                else:
+                    response = {**self._error_response(question, e), "retry_after": e.retry_after}
+            except Exception as e:
+                response = self._error_response(question, e)
+            return cache_key, response
+        
+        # === PARALLEL ANSWERS, STREAMED AS THEY COMPLETE ===
+        tasks = [asyncio.ensure_future(answer(cache_key)) for cache_key in misses]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                cache_key, response = await next_done
+                for result in results(cache_key, response):
+                    yield result
+        finally:
+            # The consumer went away (e.g. the client disconnected): stop the remaining work
+            for task in tasks:
+                task.cancel()
+        logger.info(f"✅ === BATCH QUERY COMPLETE ===")
+    
+    async def astream_query(self, question: str,
+                            conversation: Optional[ConversationContext] = None) -> AsyncIterator[Dict]:
+        """
+        Streaming version of aquery() yielding events as the answer is produced.
+        
+        Events are dicts with an "event" name and a "data" payload:
+        - metadata: sources and response_stats, sent as soon as retrieval finishes
+        - token: a chunk of answer text as it arrives from the LLM
+        - done: timing information (time to first token, total time)
+        - error: the question was rejected (validation / rate limiting / LLM overload)
+        """
+        start_time = time.perf_counter()
+        conversation = conversation or self.default_context
+        try:
+            analysis = self._validate_question(question, conversation)
+        except ValueError as e:
+            yield {"event": "error", "data": {"message": str(e)}}
+            return
+        analysis = self._enhance_question_with_history(analysis, conversation)
+        question = analysis.text
+        
+        # === RESPONSE CACHING ===
+        cache_key = self._get_cache_key(analysis)
+        cached_response = await self._run_cache_io(self._lookup_cached_response, question, cache_key)
+        if not cached_response and self.semantic_cache:
+            cached_response = await asyncio.to_thread(self._lookup_semantic_response, analysis)
+        if cached_response:
+            for event in self._replay_events(cached_response, start_time):
+                yield event
+            return
+        
+        # === REQUEST COALESCING ===
+        # Followers wait for the in-flight answer and replay it; the leader streams
+        # as usual and hands its final response to the followers
+        flight_key = cache_key if self.single_flight else None
+        flight = None
+        if flight_key:
+            future, is_leader = self.single_flight.claim(flight_key)
+            if is_leader:
+                flight = future
+            else:
+                try:
+                    shared_response = await asyncio.shield(future)
+                except LLMOverloadedError as e:
+                    # The leader was shed: don't pile another LLM call onto the overloaded model
+                    yield {"event": "error", "data": {"message": str(e), "retry_after": e.retry_after}}
+                    return
+                except Exception:
+                    shared_response = None  # The leader's stream broke off; answer this request on its own
+                if shared_response:
+                    shared_response = self._coalesced_response(question, cache_key, shared_response)
+                    for event in self._replay_events(shared_response, start_time):
+                        yield event
+                    return
+        
+        response = None
+        shed_error = None
+        try:
+            try:
+                logger.info(f"🚀 === NEW STREAMING QUERY START ===")
+                logger.info(f"❓ Query: '{question}'")
+                
+                content_type = self.route_query(analysis)
+                logger.info(f"🧭 Routed query to: {content_type}")
+                documents = await self.aretrieve_documents(analysis, content_type)
+            except Exception as e:
+                response = self._error_response(question, e)
+                yield {"event": "metadata", "data": self._stream_metadata(response)}
+                yield {"event": "token", "data": {"content": response["answer"]}}
+                yield {"event": "done", "data": {"cache_hit": False, "error": str(e)}}
+                return
+            
+            # Sources and statistics are known before the LLM call - send them first
+            partial_response = self._build_response(question, "", content_type, documents, cache_key)
+            yield {"event": "metadata", "data": self._stream_metadata(partial_response)}
+            
+            time_to_first_token = None
+            answer_parts = []
+            overloaded = False
+            try:
+                async for chunk in self.astream_answer(question, documents, conversation):
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - start_time
+                        TIME_TO_FIRST_TOKEN.observe(time_to_first_token)
+                        logger.info(f"⏱️ Time to first token: {time_to_first_token * 1000:.0f} ms")
+                    answer_parts.append(chunk)
+                    yield {"event": "token", "data": {"content": chunk}}
+            except LLMOverloadedError as e:
+                # Shed before the first token: fall back to excerpts or tell the client when to retry
+                if RAGConfig.LLM_OVERLOAD_FALLBACK != "extractive":
+                    shed_error = e
+                    yield {"event": "error", "data": {"message": str(e), "retry_after": e.retry_after}}
+                    return
+                overloaded = True
+                chunk = self._extractive_answer(documents)
+                answer_parts.append(chunk)
+                yield {"event": "token", "data": {"content": chunk}}
+            
+            total_time = time.perf_counter() - start_time
+            partial_response["answer"] = "".join(answer_parts)
+            response = partial_response
+            if overloaded:
+                response["overloaded"] = True  # Not cached: the next request should get a real answer
+            else:
+                await self._run_cache_io(self._cache_response, cache_key, response.copy())
+                if self.semantic_cache:
+                    await asyncio.to_thread(self._index_semantic_response, analysis, cache_key)
+            
+            logger.info(f"✅ === STREAMING QUERY COMPLETE ({total_time * 1000:.0f} ms) ===")
+            done = {
+                "cache_hit": False,
+                "time_to_first_token_ms": round(time_to_first_token * 1000, 1) if time_to_first_token is not None else None,
+                "total_time_ms": round(total_time * 1000, 1)
+            }
+            if overloaded:
+                done["overloaded"] = True
+            yield {"event": "done", "data": done}
+        finally:
+            if flight is not None:
+                if response is not None:
+                    self.single_flight.resolve(flight_key, flight, result=response)
+                elif shed_error is not None:
+                    self.single_flight.resolve(flight_key, flight, error=shed_error)
+                else:
+                    self.single_flight.resolve(flight_key, flight, error=RuntimeError("Streaming answer was interrupted"))
+    
+    def _replay_events(self, response: Dict, start_time: float) -> List[Dict]:
+        """Streaming events for an already complete (cached or coalesced) response."""
+        elapsed_ms = round((time.perf_counter() - start_time) * 1000, 1)
+        done = {
+            "cache_hit": response.get("cache_hit", False),
+            "time_to_first_token_ms": elapsed_ms,
+            "total_time_ms": elapsed_ms
+        }
+        if response.get("coalesced"):
+            done["coalesced"] = True
+        return [
+            {"event": "metadata", "data": self._stream_metadata(response)},
+            {"event": "token", "data": {"content": response["answer"]}},
+            {"event": "done", "data": done}
+        ]
+    
+    def _coalesced_response(self, question: str, cache_key: str, response: Dict) -> Dict:
+        """Response for a request that waited on an identical in-flight question (a copy of the leader's)."""
+        coalesced_response = dict(response)
+        coalesced_response["cache_hit"] = False
+        coalesced_response["coalesced"] = True
+        coalesced_response["cache_key"] = cache_key
+        logger.info(f"🔗 Coalesced with in-flight request: '{question}'")
+        return coalesced_response
+    
+    @staticmethod
+    def _stream_metadata(response: Dict) -> Dict:
+        """The part of a response sent as the first streaming event (everything but the answer)."""
+        return {
+            "content_type": response["content_type"],
+            "sources": response["sources"],
+            "num_documents_retrieved": response["num_documents_retrieved"],
+            "response_stats": response["response_stats"],
+            "top_courses": response["response_stats"].get("top_courses", []),
+            "cache_hit": response.get("cache_hit", False)
+        }
+    
+    @STAGE_DURATION.timed(stage="validation")
+    def _validate_question(self, question: str, conversation: ConversationContext) -> QueryAnalysis:
+        """Apply rate limiting and input validation; return the analysis of the cleaned, typo-corrected question."""
         if not self.is_initialized:
             raise ValueError("RAG system not initialized. Call initialize_vector_store() first.")
         
         # === RATE LIMITING ===
-        rate_info = self.rate_limiter.is_allowed(self.client_id)
-        if not rate_info.allowed:
-            error_msg = f"Rate limit exceeded. Please wait {rate_info.retry_after:.1f} seconds before trying again."
-            logger.warning(f"🚦 Rate limit exceeded for client {self.client_id}")
-            raise ValueError(error_msg)
+        if not conversation.rate_limit_checked:
+            rate_info = self.rate_limiter.is_allowed(conversation.client_id)
+            if not rate_info.allowed:
+                error_msg = f"Rate limit exceeded. Please wait {rate_info.retry_after:.1f} seconds before trying again."
+                logger.warning(f"🚦 Rate limit exceeded for client {conversation.client_id}")
+                RATE_LIMITED.inc()
+                raise ValueError(error_msg)
         
         # === INPUT VALIDATION ===
         if not question or not isinstance(question, str):
@@ -1281,207 +2369,264 @@ Section: {section_name}
         if len(question) > RAGConfig.MAX_QUESTION_LENGTH:
             raise ValueError(f"Question is too long (max {RAGConfig.MAX_QUESTION_LENGTH} characters)")
         
+        # One pass: suspicious patterns, cleanup, typo corrections, course codes and intents
+        analysis = self.analyze_query(question)
+        
         # Security validation: Check for suspicious patterns
-        for pattern in RAGConfig.SUSPICIOUS_PATTERNS:
-            if re.search(pattern, question, re.IGNORECASE):
-                logger.warning(f"🚨 Suspicious pattern detected in query: {pattern}")
-                raise ValueError("Question contains potentially unsafe content")
-        
-        # Clean up the question and apply typo corrections
-        question = question.strip()
-        if not question:
-            raise ValueError("Question cannot be empty after stripping whitespace")
+        if analysis.suspicious_pattern:
+            logger.warning(f"🚨 Suspicious pattern detected in query: {analysis.suspicious_pattern}")
+            raise ValueError("Question contains potentially unsafe content")
         
-        # Apply common typo corrections
-        original_question = question
-        for typo, correction in RAGConfig.TYPO_CORRECTIONS.items():
-            question = re.sub(r'\b' + re.escape(typo) + r'\b', correction, question, flags=re.IGNORECASE)
+        if not analysis.text:
+            raise ValueError("Question cannot be empty after stripping whitespace")
         
-        if question != original_question:
-            logger.info(f"🔧 Applied typo corrections: '{original_question}' → '{question}'")
+        if analysis.text != question.strip():
+            logger.info(f"🔧 Applied typo corrections: '{question.strip()}' → '{analysis.text}'")
         
-        # === RESPONSE CACHING ===
-        cache_key = self._get_cache_key(question)
+        return analysis
+    
+    @STAGE_DURATION.timed(stage="cache_lookup")
+    def _lookup_cached_response(self, question: str, cache_key: str) -> Optional[Dict]:
+        """Return the cached response for a question, marked as a cache hit, if any."""
         cached_response = self._get_cached_response(cache_key)
-        
+        if self.cache_enabled:
+            CACHE_REQUESTS.inc(cache="response", result="hit" if cached_response else "miss")
         if cached_response:
             logger.info(f"💨 === CACHE HIT ===")
             logger.info(f"❓ Query: '{question}'")
             logger.info(f"🎯 Returning cached response (saved LLM call)")
-            # Add cache hit indicator
+            # Add cache hit indicator (on a copy: the in-memory cache returns the stored dict)
+            cached_response = dict(cached_response)
             cached_response["cache_hit"] = True
             cached_response["cache_key"] = cache_key
             return cached_response
+        return None
+    
+    async def _run_cache_io(self, func: Callable, *args):
+        """Call a function that reads or writes the response cache; off the event loop unless the cache is in memory."""
+        if isinstance(self.response_cache, InMemoryResponseCache):
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+    
+    @STAGE_DURATION.timed(stage="semantic_cache_lookup")
+    def _lookup_semantic_response(self, analysis: QueryAnalysis,
+                                  embedding: Optional[List[float]] = None) -> Optional[Dict]:
+        """Return a cached response for a paraphrase of a previously answered question, if any.
+        
+        Matches are scoped by the course codes of the question (including history
+        context), so they never cross courses. The question is embedded unless the
+        caller passes its embedding.
+        """
+        if not self.semantic_cache or not self.cache_enabled:
+            return None
         
-        try:
-            logger.info(f"🚀 === NEW QUERY START ===")
-            logger.info(f"❓ Query: '{question}'")
-            
-            # FIRST: Check if current question contains an explicit course code
-            current_course_pattern = r'\b(DIT\d{3}|TIA\d{3}|MSA\d{3}|LT\d{4})\b'
-            current_course_match = re.search(current_course_pattern, question, re.IGNORECASE)
-            
-            if current_course_match:
-                # User explicitly mentioned a course - DO NOT apply historical context
-                enhanced_question = question
-            else:
-                # No explicit course in current question - check if we should apply context
-                historical_course_codes = self.extract_course_codes_from_history()
-                
-                if historical_course_codes:
-                    logger.info(f"📚 Using course codes from history: {historical_course_codes}")
-                    # Check for referential patterns (more careful with 'it')
-                    referential_terms = ['the course', 'that course', 'this course', 'the same', 
-                                       'mentioned above', 'previous', 'above']
-                    
-                    # Also check for implicit references (questions without explicit course mention)
-                    implicit_patterns = ['what are the', 'what is the', 'how many', 'when is', 
-                                       'who teaches', 'learning outcomes', 'prerequisites', 
-                                       'grading', 'assessment', 'credits', 'exam', 'examination']
-                    
-                    question_lower = question.lower()
-                    found_terms = [term for term in referential_terms if term in question_lower]
-                    
-                    # Be more careful with 'it' and 'its' - check surrounding context
-                    careful_terms = ['it', 'its']
-                    for term in careful_terms:
-                        if f' {term} ' in f' {question_lower} ':  # Add spaces to avoid matching within words
-                            # Check if it's actually referential (not in phrases like 'submit it', 'related to it')
-                            term_index = question_lower.find(f' {term} ')
-                            if term_index > 0:
-                                preceding_words = question_lower[:term_index].split()[-3:]  # Last 3 words before 'it'
-                                # Only count as referential if NOT preceded by action verbs or prepositions
-                                non_referential_context = ['to', 'submit', 'with', 'for', 'from', 'about', 'related', 'regarding']
-                                if not any(word in non_referential_context for word in preceding_words):
-                                    found_terms.append(term)
-                    
-                    found_implicit = any(pattern in question_lower for pattern in implicit_patterns)
-                    
-                    # Use context if we have explicit references OR implicit patterns
-                    if found_terms or found_implicit:
-                        # Add the most recent course code to the query for better retrieval
-                        enhanced_question = f"{question} (context: {historical_course_codes[0]})"
-                    else:
-                        enhanced_question = question
-                else:
-                    enhanced_question = question
+        question = analysis.text
+        if embedding is None:
+            embedding = self._embed_queries([question]).get(question)
+        if embedding is None:
+            return None
+        
+        match = self.semantic_cache.lookup(embedding, scope=analysis.course_scope)
+        if not match:
+            CACHE_REQUESTS.inc(cache="semantic", result="miss")
+            return None
+        
+        matched_key, similarity = match
+        cached_response = self._get_cached_response(matched_key)
+        # An expired or evicted exact entry is a miss, and its index entry is dropped
+        self.semantic_cache.resolve(matched_key, found=bool(cached_response))
+        if not cached_response:
+            CACHE_REQUESTS.inc(cache="semantic", result="miss")
+            return None
+        
+        CACHE_REQUESTS.inc(cache="semantic", result="hit")
+        
+        logger.info(f"💨 === SEMANTIC CACHE HIT (similarity: {similarity:.3f}) ===")
+        logger.info(f"❓ Query: '{question}' ≈ '{cached_response.get('question', '')}'")
+        # Copy before annotating: the in-memory cache returns the stored dict
+        cached_response = dict(cached_response)
+        cached_response["cache_hit"] = True
+        cached_response["semantic_cache_hit"] = True
+        cached_response["semantic_similarity"] = round(similarity, 4)
+        cached_response["cache_key"] = matched_key
+        return cached_response
     
-            
-            # Route the query
-            content_type = self.route_query(question)
-            logger.info(f"🧭 Routed query to: {content_type}")
-            
-            # Retrieve documents using enhanced question
-            documents = self.retrieve_documents(enhanced_question, content_type)
-            
-            # Generate answer
-            answer = self.generate_answer(question, documents)
-            
-            # === ENHANCED SOURCE PREPARATION ===
-            sources = []
-            course_codes_found = set()
-            sections_found = set()
-            programs_found = set()
-            
-            for doc in documents[:10]:  # Limit source analysis to top 10 docs
-                # Extract metadata
-                course_code = doc.metadata.get("course_code", "")
-                course_title = doc.metadata.get("course_title", "")
-                section = doc.metadata.get("section", "")
-                section_name = doc.metadata.get("section_name", section)
-                programmes = doc.metadata.get("programmes", "")
-                cycle = doc.metadata.get("cycle", "")
-                credits = doc.metadata.get("credits", "")
-                
-                # Collect statistics
-                if course_code:
-                    course_codes_found.add(course_code)
-                if section:
-                    sections_found.add(section_name or section)
-                if programmes:
-                    if isinstance(programmes, str):
-                        programs_found.add(programmes)
-                    elif isinstance(programmes, list):
-                        programs_found.update(programmes)
-                
-                # Create source info with rich metadata
-                source_info = {
-                    "course_code": course_code,
-                    "course_title": course_title,
-                    "section": section,
-                    "section_name": section_name,
-                    "programmes": programmes,
-                    "cycle": cycle,
-                    "credits": credits
-                    # Note: syllabus URL is generated on frontend from course_code
-                    # Course page URLs are not included due to inconsistent patterns
-                }
-                
-                # Avoid duplicate sources
-                if source_info not in sources:
-                    sources.append(source_info)
-            
-            # === RESPONSE STATISTICS ===
-            response_stats = {
-                "courses_referenced": len(course_codes_found),
-                "sections_referenced": len(sections_found), 
-                "programs_referenced": len(programs_found),
-                "top_courses": list(course_codes_found)[:5],
-                "top_sections": list(sections_found)[:5],
-                "top_programs": list(programs_found)[:3]
-            }
-            
-            logger.info(f"📊 Response stats: {response_stats['courses_referenced']} courses, {response_stats['sections_referenced']} sections, {response_stats['programs_referenced']} programs")
-            logger.info(f"🎯 Top courses: {', '.join(response_stats['top_courses'])}")
-            
-            response = {
-                "answer": answer,
-                "content_type": content_type,
-                "sources": sources[:8],  # Limit sources but provide more detail
-                "num_documents_retrieved": len(documents),
-                "response_stats": response_stats,
-                "query_metadata": {
-                    "original_question": question,
-                    "routing_decision": content_type,
-                    "documents_analyzed": len(documents),
-                    "sources_found": len(sources)
-                },
-                "cache_hit": False,  # This is a fresh response
-                "cache_key": cache_key
+    def _index_semantic_response(self, analysis: QueryAnalysis, cache_key: str,
+                                 embedding: Optional[List[float]] = None):
+        """Add a freshly cached response to the semantic index (embedding the question unless given)."""
+        if not self.semantic_cache or not self.cache_enabled:
+            return
+        
+        if embedding is None:
+            # Usually an embedding cache hit: the question was embedded for lookup and retrieval
+            embedding = self._embed_queries([analysis.text]).get(analysis.text)
+        if embedding is not None:
+            self.semantic_cache.add(cache_key, embedding, scope=analysis.course_scope)
+    
+    def _enhance_question_with_history(self, analysis: QueryAnalysis, conversation: ConversationContext) -> QueryAnalysis:
+        """Attach the most recent course code from history to referential follow-up questions.
+        
+        Returns:
+            The analysis, carrying the history course code (see QueryAnalysis.enhanced_text) if applied
+        """
+        # FIRST: Check if current question contains an explicit course code
+        if analysis.course_codes:
+            # User explicitly mentioned a course - DO NOT apply historical context
+            return analysis
+        
+        # No explicit course in current question - check if we should apply context
+        historical_course_codes = self.extract_course_codes_from_history(conversation)
+        if not historical_course_codes:
+            return analysis
+        
+        logger.info(f"📚 Using course codes from history: {historical_course_codes}")
+        # Check for referential patterns (more careful with 'it'), and for implicit
+        # references (questions without explicit course mention)
+        found_terms = [term for term in REFERENTIAL_PHRASES if term in analysis.phrases]
+        question_lower = analysis.lower
+        
+        # Be more careful with 'it' and 'its' - check surrounding context
+        careful_terms = ['it', 'its']
+        for term in careful_terms:
+            if f' {term} ' in f' {question_lower} ':  # Add spaces to avoid matching within words
+                # Check if it's actually referential (not in phrases like 'submit it', 'related to it')
+                term_index = question_lower.find(f' {term} ')
+                if term_index > 0:
+                    preceding_words = question_lower[:term_index].split()[-3:]  # Last 3 words before 'it'
+                    # Only count as referential if NOT preceded by action verbs or prepositions
+                    non_referential_context = ['to', 'submit', 'with', 'for', 'from', 'about', 'related', 'regarding']
+                    if not any(word in non_referential_context for word in preceding_words):
+                        found_terms.append(term)
+        
+        found_implicit = analysis.has(*IMPLICIT_PHRASES)
+        
+        # Use context if we have explicit references OR implicit patterns
+        if found_terms or found_implicit:
+            # Add the most recent course code to the query for better retrieval
+            return analysis.with_context(historical_course_codes[0])
+        return analysis
+    
+    @STAGE_DURATION.timed(stage="response_assembly")
+    def _build_response(self, question: str, answer: str, content_type: str,
+                        documents: List[Document], cache_key: str) -> Dict:
+        """Assemble the response dict (sources, statistics, metadata) for an answered question."""
+        # === ENHANCED SOURCE PREPARATION ===
+        sources = []
+        course_codes_found = set()
+        sections_found = set()
+        programs_found = set()
+        
+        for doc in documents[:10]:  # Limit source analysis to top 10 docs
+            # Extract metadata
+            course_code = doc.metadata.get("course_code", "")
+            course_title = doc.metadata.get("course_title", "")
+            section = doc.metadata.get("section", "")
+            section_name = doc.metadata.get("section_name", section)
+            programmes = doc.metadata.get("programmes", "")
+            cycle = doc.metadata.get("cycle", "")
+            credits = doc.metadata.get("credits", "")
+            
+            # Collect statistics
+            if course_code:
+                course_codes_found.add(course_code)
+            if section:
+                sections_found.add(section_name or section)
+            if programmes:
+                if isinstance(programmes, str):
+                    programs_found.add(programmes)
+                elif isinstance(programmes, list):
+                    programs_found.update(programmes)
+            
+            # Create source info with rich metadata
+            source_info = {
+                "course_code": course_code,
+                "course_title": course_title,
+                "section": section,
+                "section_name": section_name,
+                "programmes": programmes,
+                "cycle": cycle,
+                "credits": credits
+                # Note: syllabus URL is generated on frontend from course_code
+                # Course page URLs are not included due to inconsistent patterns
             }
             
-            # === CACHE THE RESPONSE ===
-            self._cache_response(cache_key, response.copy())  # Cache a copy
-            
-            logger.info(f"✅ === QUERY COMPLETE ===")
-            return response
-            
-        except Exception as e:
-            logger.error(f"❌ Error in query processing: {e}")
-            import traceback
-            logger.error(f"📚 Traceback: {traceback.format_exc()}")
-            
-            return {
-                "answer": f"I apologize, but I encountered an error while processing your question. For more information, please visit the official Gothenburg University website at https://www.gu.se/en/study-in-gothenburg",
-                "content_type": "error",
-                "sources": [],
-                "num_documents_retrieved": 0,
-                "response_stats": {
-                    "courses_referenced": 0,
-                    "sections_referenced": 0,
-                    "programs_referenced": 0,
-                    "top_courses": [],
-                    "top_sections": [],
-                    "top_programs": []
-                },
-                "query_metadata": {
-                    "original_question": question,
-                    "routing_decision": "error",
-                    "documents_analyzed": 0,
-                    "sources_found": 0,
-                    "error": str(e)
-                }
+            # Avoid duplicate sources
+            if source_info not in sources:
+                sources.append(source_info)
+        
+        # === RESPONSE STATISTICS ===
+        response_stats = {
+            "courses_referenced": len(course_codes_found),
+            "sections_referenced": len(sections_found), 
+            "programs_referenced": len(programs_found),
+            "top_courses": list(course_codes_found)[:5],
+            "top_sections": list(sections_found)[:5],
+            "top_programs": list(programs_found)[:3]
+        }
+        
+        logger.info(f"📊 Response stats: {response_stats['courses_referenced']} courses, {response_stats['sections_referenced']} sections, {response_stats['programs_referenced']} programs")
+        logger.info(f"🎯 Top courses: {', '.join(response_stats['top_courses'])}")
+        
+        return {
+            "answer": answer,
+            "content_type": content_type,
+            "sources": sources[:8],  # Limit sources but provide more detail
+            "num_documents_retrieved": len(documents),
+            "response_stats": response_stats,
+            "query_metadata": {
+                "original_question": question,
+                "routing_decision": content_type,
+                "documents_analyzed": len(documents),
+                "sources_found": len(sources)
+            },
+            "cache_hit": False,  # This is a fresh response
+            "cache_key": cache_key
+        }
+    
+    def _overloaded_response(self, question: str, content_type: str, documents: List[Document],
+                             cache_key: str, e: LLMOverloadedError) -> Dict:
+        """
+        Response for a question shed by LLM admission control.
+        
+        With LLM_OVERLOAD_FALLBACK="extractive" the answer is built from excerpts of
+        the retrieved documents (and not cached); otherwise the error is re-raised
+        so the API can answer 503 with Retry-After.
+        """
+        if RAGConfig.LLM_OVERLOAD_FALLBACK != "extractive":
+            raise e
+        logger.info(f"📄 LLM overloaded - answering with document excerpts")
+        response = self._build_response(question, self._extractive_answer(documents), content_type, documents, cache_key)
+        response["overloaded"] = True
+        return response
+    
+    def _error_response(self, question: str, e: Exception) -> Dict:
+        """Log a query failure and return the user-facing error response."""
+        QUERY_ERRORS.inc(error_type=type(e).__name__)
+        logger.error(f"❌ Error in query processing: {e}")
+        import traceback
+        logger.error(f"📚 Traceback: {traceback.format_exc()}")
+        
+        return {
+            "answer": f"I apologize, but I encountered an error while processing your question. For more information, please visit the official Gothenburg University website at https://www.gu.se/en/study-in-gothenburg",
+            "content_type": "error",
+            "sources": [],
+            "num_documents_retrieved": 0,
+            "response_stats": {
+                "courses_referenced": 0,
+                "sections_referenced": 0,
+                "programs_referenced": 0,
+                "top_courses": [],
+                "top_sections": [],
+                "top_programs": []
+            },
+            "query_metadata": {
+                "original_question": question,
+                "routing_decision": "error",
+                "documents_analyzed": 0,
+                "sources_found": 0,
+                "error": str(e)
             }
+        }
 
     def health_check(self) -> Dict:
         """Comprehensive system health check."""
@@ -1501,7 +2646,7 @@ Section: {section_name}
             # Check 2: Vector store
             if self.is_initialized and self.vector_store:
                 try:
-                    doc_count = len(self.vector_store.get()['ids'])
+                    doc_count = self.document_count()
                     health_status["checks"]["vector_store"] = {
                         "status": "pass" if doc_count > 0 else "fail",
                         "message": f"{doc_count} documents loaded",
@@ -1525,10 +2670,11 @@ Section: {section_name}
             }
             
             # Check 4: Cache
+            cache_size = self.response_cache.size()
             health_status["checks"]["cache"] = {
                 "status": "pass",
-                "message": f"Cache active ({len(self.response_cache)}/{self.max_cache_size})",
-                "cache_size": len(self.response_cache),
+                "message": f"Cache active ({cache_size}/{self.max_cache_size})",
+                "cache_size": cache_size,
                 "max_cache_size": self.max_cache_size
             }
             
@@ -1550,22 +2696,22 @@ Section: {section_name}
             return {"status": "not_initialized"}
         
         try:
-            collection = self.vector_store.get()
-            total_docs = len(collection['ids'])
+            total_docs = self.document_count()
             
-            # Count by document type
-            doc_types = [metadata.get('doc_type', 'unknown') for metadata in collection['metadatas']]
-            course_count = sum(1 for t in doc_types if t == 'course')
-            program_count = sum(1 for t in doc_types if t == 'program')
+            # Count by document type (course_overview, course_section, program_overview, ...)
+            course_count = sum(n for t, n in self.doc_type_counts.items() if t.startswith('course'))
+            program_count = sum(n for t, n in self.doc_type_counts.items() if t.startswith('program'))
             
             return {
                 "status": "initialized",
                 "total_documents": total_docs,
                 "course_documents": course_count,
                 "program_documents": program_count,
+                "document_types": dict(self.doc_type_counts),
                 "embedding_model": self.embedding_model,
                 "llm_model": self.llm_model,
-                "collection_name": self.collection_name
+                "collection_name": self.collection_name,
+                "cache_stats": self.get_cache_stats()
             }
         except Exception as e:
             logger.error(f"Error getting system info: {e}")
@@ -2,13 +2,19 @@
 Rate limiting implementation for the RAG system.
 Protects against API abuse and ensures fair usage.
 """
+import math
 import time
 import logging
-from typing import Dict, Optional
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
 from collections import defaultdict, deque
 from threading import Lock
 from dataclasses import dataclass, field
 
+from config import RAGConfig
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,12 +51,14 @@ class RateLimiter:
         
         logger.info(f"🚦 Rate limiter initialized: {requests_per_minute} requests per {window_seconds}s")
     
-    def is_allowed(self, client_id: str) -> RateLimitInfo:
+    def is_allowed(self, client_id: str, cost: int = 1) -> RateLimitInfo:
         """
         Check if a request from client is allowed.
         
         Args:
             client_id: Unique identifier for the client (IP, user ID, etc.)
+            cost: Requests this call counts as (e.g. the questions of a batch);
+                  admitted all at once or not at all
             
         Returns:
             RateLimitInfo with rate limit status
@@ -66,12 +74,12 @@ class RateLimiter:
             
             # Check if under limit
             remaining_requests = max(0, self.max_requests - len(client_queue))
-            allowed = len(client_queue) < self.max_requests
+            allowed = len(client_queue) + cost <= self.max_requests
             
             if allowed:
                 # Add current request timestamp
-                client_queue.append(current_time)
-                remaining_requests -= 1
+                client_queue.extend([current_time] * cost)
+                remaining_requests -= cost
             
             # Calculate reset time (when oldest request will expire)
             reset_time = current_time + self.window_seconds
@@ -80,8 +88,13 @@ class RateLimiter:
             
             # Calculate retry after time if rate limited
             retry_after = None
-            if not allowed and client_queue:
-                retry_after = client_queue[0] + self.window_seconds - current_time
+            if not allowed:
+                if client_queue and cost <= self.max_requests:
+                    # Wait until enough of the oldest requests have expired
+                    freed_at = client_queue[len(client_queue) + cost - self.max_requests - 1]
+                    retry_after = freed_at + self.window_seconds - current_time
+                else:
+                    retry_after = self.window_seconds
                 retry_after = max(1, retry_after)  # At least 1 second
             
             return RateLimitInfo(
@@ -180,15 +193,295 @@ class RateLimiter:
             return len(clients_to_remove)
 
 
+class GCRARateLimiter(RateLimiter):
+    """
+    Generic Cell Rate Algorithm limiter with O(1) memory per client.
+    
+    Each client is a single float, its theoretical arrival time (TAT): requests are
+    spaced by window / limit seconds, and a client may run up to `limit` requests
+    ahead of that schedule, which allows the same bursts as the sliding window.
+    Clients are spread over lock stripes by hash, so concurrent checks for
+    different clients rarely contend, and stats/cleanup hold one stripe at a time.
+    """
+    
+    def __init__(self, requests_per_minute: int = 10, window_seconds: int = 60, stripes: int = 64):
+        """
+        Initialize the GCRA rate limiter.
+        
+        Args:
+            requests_per_minute: Maximum requests allowed per window
+            window_seconds: Time window for rate limiting (seconds)
+            stripes: Number of independently locked client shards
+        """
+        super().__init__(requests_per_minute, window_seconds)
+        self.stripes = stripes
+        self._locks = [Lock() for _ in range(stripes)]
+        self._tats: List[Dict[str, float]] = [{} for _ in range(stripes)]
+    
+    def _stripe(self, client_id: str) -> int:
+        return hash(client_id) % self.stripes
+    
+    def is_allowed(self, client_id: str, cost: int = 1) -> RateLimitInfo:
+        window = self.window_seconds
+        interval = window / self.max_requests  # max_requests may be changed by AdaptiveRateLimiter
+        stripe = self._stripe(client_id)
+        
+        with self._locks[stripe]:
+            current_time = time.time()
+            tats = self._tats[stripe]
+            tat = tats.get(client_id, current_time)
+            new_tat = (tat if tat > current_time else current_time) + interval * cost
+            # A request is allowed while the client is at most one window ahead of schedule
+            allowed = new_tat - current_time <= window
+            if allowed:
+                tats[client_id] = new_tat
+        
+        ahead = new_tat - current_time
+        if allowed:
+            return RateLimitInfo(True, int((window - ahead) / interval + 1e-9), new_tat)
+        return RateLimitInfo(False, 0, max(tat, current_time), max(1, ahead - window))
+    
+    def get_client_stats(self, client_id: str) -> Dict:
+        stripe = self._stripe(client_id)
+        with self._locks[stripe]:
+            tat = self._tats[stripe].get(client_id)
+        current_time = time.time()
+        interval = self.window_seconds / self.max_requests
+        ahead = max(0.0, tat - current_time) if tat is not None else 0.0
+        current_requests = min(self.max_requests, math.ceil(ahead / interval))
+        return {
+            "client_id": client_id,
+            "current_requests": current_requests,
+            "max_requests": self.max_requests,
+            "remaining_requests": max(0, self.max_requests - current_requests),
+            "window_seconds": self.window_seconds,
+            "oldest_request_age": 0  # Not tracked: GCRA keeps no per-request timestamps
+        }
+    
+    def get_global_stats(self) -> Dict:
+        current_time = time.time()
+        interval = self.window_seconds / self.max_requests
+        active_clients = 0
+        active_requests = 0
+        for lock, tats in zip(self._locks, self._tats):
+            with lock:
+                aheads = [tat - current_time for tat in tats.values() if tat > current_time]
+            active_clients += len(aheads)
+            # Requests still counting against the clients, derived from how far ahead of schedule they are
+            active_requests += sum(min(self.max_requests, math.ceil(ahead / interval)) for ahead in aheads)
+        return {
+            "total_active_clients": active_clients,
+            "total_active_requests": active_requests,
+            "max_requests_per_client": self.max_requests,
+            "window_seconds": self.window_seconds,
+            "timestamp": current_time
+        }
+    
+    def reset_client(self, client_id: str) -> bool:
+        stripe = self._stripe(client_id)
+        with self._locks[stripe]:
+            existed = self._tats[stripe].pop(client_id, None) is not None
+        if existed:
+            logger.info(f"🔄 Rate limit reset for client: {client_id}")
+        return existed
+    
+    def cleanup_expired(self) -> int:
+        """
+        Drop clients whose schedule has caught up with the clock (their next request
+        would be treated like a first one anyway).
+        
+        Returns:
+            Number of clients cleaned up
+        """
+        removed = 0
+        for lock, tats in zip(self._locks, self._tats):
+            with lock:
+                current_time = time.time()
+                expired = [client_id for client_id, tat in tats.items() if tat <= current_time]
+                for client_id in expired:
+                    del tats[client_id]
+                removed += len(expired)
+        logger.debug(f"🧹 Cleaned up {removed} expired clients")
+        return removed
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Sliding window rate limiter stored in a SQLite database in WAL mode.
+    
+    Every uvicorn worker opening the same file shares the limits. Each check runs
+    in one BEGIN IMMEDIATE transaction, so concurrent workers can't both admit the
+    last request of a window. Database errors fail open (the request is allowed).
+    """
+    
+    # Expired rows of all clients are purged every this many checks
+    CLEANUP_INTERVAL = 1000
+    
+    def __init__(self, db_path: str, requests_per_minute: int = 10, window_seconds: int = 60):
+        """
+        Initialize the SQLite rate limiter.
+        
+        Args:
+            db_path: Path to the rate limit database file (created if missing)
+            requests_per_minute: Maximum requests allowed per window
+            window_seconds: Time window for rate limiting (seconds)
+        """
+        super().__init__(requests_per_minute, window_seconds)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()  # One connection per thread
+        self._checks = 0
+        
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_requests (
+                client_id TEXT NOT NULL,
+                requested_at REAL NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rate_limit_client ON rate_limit_requests(client_id, requested_at)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limit_requested_at ON rate_limit_requests(requested_at)")
+        logger.info(f"🗄️ SQLite rate limiter at {self.db_path}")
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def is_allowed(self, client_id: str, cost: int = 1) -> RateLimitInfo:
+        current_time = time.time()
+        cutoff_time = current_time - self.window_seconds
+        max_requests = self.max_requests
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "DELETE FROM rate_limit_requests WHERE client_id = ? AND requested_at <= ?",
+                    (client_id, cutoff_time)
+                )
+                count, oldest = conn.execute(
+                    "SELECT COUNT(*), MIN(requested_at) FROM rate_limit_requests WHERE client_id = ?",
+                    (client_id,)
+                ).fetchone()
+                allowed = count + cost <= max_requests
+                freed_at = oldest
+                if not allowed and cost <= max_requests and count + cost - max_requests > 1:
+                    # Enough room opens when the (count + cost - max)th oldest request expires
+                    freed_at = conn.execute(
+                        "SELECT requested_at FROM rate_limit_requests WHERE client_id = ? "
+                        "ORDER BY requested_at LIMIT 1 OFFSET ?",
+                        (client_id, count + cost - max_requests - 1)
+                    ).fetchone()[0]
+                if allowed:
+                    conn.executemany(
+                        "INSERT INTO rate_limit_requests (client_id, requested_at) VALUES (?, ?)",
+                        [(client_id, current_time)] * cost
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            return RateLimitInfo(allowed=True, remaining_requests=max_requests,
+                                 reset_time=current_time + self.window_seconds)
+        
+        self._checks += 1
+        if self._checks % self.CLEANUP_INTERVAL == 0:
+            self.cleanup_expired()
+        
+        oldest = oldest if oldest is not None else current_time
+        remaining_requests = max(0, max_requests - count - (cost if allowed else 0))
+        if allowed:
+            retry_after = None
+        elif cost > max_requests:
+            retry_after = self.window_seconds
+        else:
+            retry_after = max(1, (freed_at if freed_at is not None else current_time)
+                              + self.window_seconds - current_time)
+        return RateLimitInfo(
+            allowed=allowed,
+            remaining_requests=remaining_requests,
+            reset_time=oldest + self.window_seconds,
+            retry_after=retry_after
+        )
+    
+    def get_client_stats(self, client_id: str) -> Dict:
+        current_time = time.time()
+        count, oldest = self._connection().execute(
+            "SELECT COUNT(*), MIN(requested_at) FROM rate_limit_requests WHERE client_id = ? AND requested_at > ?",
+            (client_id, current_time - self.window_seconds)
+        ).fetchone()
+        return {
+            "client_id": client_id,
+            "current_requests": count,
+            "max_requests": self.max_requests,
+            "remaining_requests": max(0, self.max_requests - count),
+            "window_seconds": self.window_seconds,
+            "oldest_request_age": current_time - oldest if oldest is not None else 0
+        }
+    
+    def get_global_stats(self) -> Dict:
+        current_time = time.time()
+        clients, requests = self._connection().execute(
+            "SELECT COUNT(DISTINCT client_id), COUNT(*) FROM rate_limit_requests WHERE requested_at > ?",
+            (current_time - self.window_seconds,)
+        ).fetchone()
+        return {
+            "total_active_clients": clients,
+            "total_active_requests": requests,
+            "max_requests_per_client": self.max_requests,
+            "window_seconds": self.window_seconds,
+            "timestamp": current_time
+        }
+    
+    def reset_client(self, client_id: str) -> bool:
+        deleted = self._connection().execute(
+            "DELETE FROM rate_limit_requests WHERE client_id = ?", (client_id,)
+        ).rowcount
+        if deleted:
+            logger.info(f"🔄 Rate limit reset for client: {client_id}")
+        return deleted > 0
+    
+    def cleanup_expired(self) -> int:
+        """
+        Delete expired request rows of all clients.
+        
+        Returns:
+            Number of rows deleted
+        """
+        try:
+            deleted = self._connection().execute(
+                "DELETE FROM rate_limit_requests WHERE requested_at <= ?", (time.time() - self.window_seconds,)
+            ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limit cleanup failed: {e}")
+            return 0
+        logger.debug(f"🧹 Cleaned up {deleted} expired rate limit rows")
+        return deleted
+
+
 class AdaptiveRateLimiter(RateLimiter):
     """
     Advanced rate limiter that adapts based on system load.
     Reduces limits during high load periods.
+    
+    Uses its own sliding window, or drives another limiter (e.g. GCRA or SQLite)
+    passed as `backend` by adjusting that limiter's max_requests.
     """
     
     def __init__(self, base_requests_per_minute: int = 10, 
                  window_seconds: int = 60, 
-                 load_threshold: float = 0.8):
+                 load_threshold: float = 0.8,
+                 backend: Optional[RateLimiter] = None):
         """
         Initialize adaptive rate limiter.
         
@@ -196,11 +489,13 @@ class AdaptiveRateLimiter(RateLimiter):
             base_requests_per_minute: Base rate limit
             window_seconds: Time window
             load_threshold: System load threshold (0.0-1.0) to reduce limits
+            backend: Optional limiter that does the actual counting
         """
         super().__init__(base_requests_per_minute, window_seconds)
         self.base_requests_per_minute = base_requests_per_minute
         self.load_threshold = load_threshold
         self.current_load = 0.0
+        self.backend = backend
         
     def update_system_load(self, load: float):
         """Update current system load (0.0-1.0)."""
@@ -213,20 +508,86 @@ class AdaptiveRateLimiter(RateLimiter):
             self.max_requests = max(1, int(self.base_requests_per_minute * reduction_factor))
         else:
             self.max_requests = self.base_requests_per_minute
+        if self.backend:
+            self.backend.max_requests = self.max_requests
         
         logger.debug(f"📊 System load: {self.current_load:.2f}, Rate limit: {self.max_requests}/min")
+    
+    def get_load_stats(self) -> Dict:
+        """Current load factor and the effective limit it produced."""
+        return {
+            "load_factor": round(self.current_load, 3),
+            "load_threshold": self.load_threshold,
+            "base_limit": self.base_requests_per_minute,
+            "effective_limit": self.max_requests,
+            "window_seconds": self.window_seconds
+        }
+    
+    def is_allowed(self, client_id: str, cost: int = 1) -> RateLimitInfo:
+        return self.backend.is_allowed(client_id, cost) if self.backend else super().is_allowed(client_id, cost)
+    
+    def get_client_stats(self, client_id: str) -> Dict:
+        return self.backend.get_client_stats(client_id) if self.backend else super().get_client_stats(client_id)
+    
+    def get_global_stats(self) -> Dict:
+        return self.backend.get_global_stats() if self.backend else super().get_global_stats()
+    
+    def reset_client(self, client_id: str) -> bool:
+        return self.backend.reset_client(client_id) if self.backend else super().reset_client(client_id)
+    
+    def cleanup_expired(self) -> int:
+        return self.backend.cleanup_expired() if self.backend else super().cleanup_expired()
+
+
+def create_rate_limiter(backend: str, requests_per_minute: int, window_seconds: int,
+                        db_path: str = None) -> RateLimiter:
+    """
+    Create the configured rate limiter backend.
+    
+    Args:
+        backend: "memory" (sliding window log), "gcra" (O(1) memory per client, lock
+                 striping) or "sqlite" (shared by all workers using db_path)
+        requests_per_minute: Maximum requests allowed per window
+        window_seconds: Time window for rate limiting (seconds)
+        db_path: Database file for the sqlite backend
+        
+    Returns:
+        Rate limiter instance (falls back to in-memory if SQLite can't be opened)
+    """
+    if backend == "sqlite":
+        try:
+            return SQLiteRateLimiter(db_path, requests_per_minute, window_seconds)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not open SQLite rate limiter at {db_path}: {e}. Using in-memory rate limiter.")
+    elif backend == "gcra":
+        return GCRARateLimiter(requests_per_minute, window_seconds, RAGConfig.RATE_LIMIT_LOCK_STRIPES)
+    elif backend != "memory":
+        logger.warning(f"Unknown rate limiter backend '{backend}'. Using in-memory rate limiter.")
+    return RateLimiter(requests_per_minute, window_seconds)
 
 
 # Global rate limiter instance
 _global_rate_limiter: Optional[RateLimiter] = None
+_global_rate_limiter_lock = Lock()
 
 
-def get_rate_limiter(requests_per_minute: int = 10, window_seconds: int = 60) -> RateLimiter:
-    """Get or create global rate limiter instance."""
+def get_rate_limiter(requests_per_minute: int = None, window_seconds: int = None) -> RateLimiter:
+    """Get or create the process-wide rate limiter (backend and defaults from RAGConfig)."""
     global _global_rate_limiter
     
-    if _global_rate_limiter is None:
-        _global_rate_limiter = RateLimiter(requests_per_minute, window_seconds)
+    with _global_rate_limiter_lock:
+        if _global_rate_limiter is None:
+            requests_per_minute = requests_per_minute or RAGConfig.RATE_LIMIT_REQUESTS
+            window_seconds = window_seconds or RAGConfig.RATE_LIMIT_WINDOW
+            _global_rate_limiter = create_rate_limiter(
+                RAGConfig.RATE_LIMIT_BACKEND, requests_per_minute, window_seconds, RAGConfig.RATE_LIMIT_DB_PATH
+            )
+            if RAGConfig.RATE_LIMIT_ADAPTIVE:
+                # Limits tighten under load (see load_monitor.LoadMonitor)
+                _global_rate_limiter = AdaptiveRateLimiter(
+                    requests_per_minute, window_seconds, RAGConfig.RATE_LIMIT_LOAD_THRESHOLD,
+                    backend=_global_rate_limiter
+                )
     
     return _global_rate_limiter
 
@@ -0,0 +1,276 @@
+"""
+Response cache backends for the RAG system.
+The in-memory backend is local to one process; the SQLite backend is shared by all
+uvicorn workers on a machine and survives restarts.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(ABC):
+    """Interface of a response cache backend with TTL and size-bounded eviction."""
+
+    def __init__(self, max_size: int, ttl: int):
+        """
+        Initialize the cache backend.
+
+        Args:
+            max_size: Maximum number of cached responses
+            ttl: Time-to-live of a cached response in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, cache_key: str) -> Optional[Dict]:
+        """Return the cached response for a key, or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, cache_key: str, response: Dict):
+        """Store a response, evicting expired and (if full) the oldest entries."""
+
+    @abstractmethod
+    def delete(self, cache_key: str):
+        """Remove a single entry."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all entries."""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of stored entries."""
+
+    @abstractmethod
+    def keys(self, limit: int = 5) -> List[str]:
+        """Up to `limit` cache keys, most recent first (for debugging)."""
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Per-process LRU response cache with lazy TTL expiry.
+
+    Entries live in an OrderedDict ordered from least to most recently used, so
+    lookups, inserts and evictions are O(1). Expired entries are dropped when they
+    are looked up or reach the LRU end, instead of scanning the whole cache.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        super().__init__(max_size, ttl)
+        self._entries = OrderedDict()  # key -> (cached_at, response)
+        self._lock = threading.Lock()
+
+    def get(self, cache_key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+
+            cached_at, response = entry
+            if time.time() - cached_at > self.ttl:
+                # Expired, remove from cache
+                del self._entries[cache_key]
+                logger.debug(f"🕐 Cache entry expired and removed: {cache_key[:8]}...")
+                return None
+
+            self._entries.move_to_end(cache_key)
+            return response
+
+    def set(self, cache_key: str, response: Dict):
+        now = time.time()
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = (now, response)
+
+            # Drop expired entries sitting at the LRU end, then evict least recently used if full
+            while self._entries:
+                oldest_key, (cached_at, _) = next(iter(self._entries.items()))
+                if now - cached_at <= self.ttl and len(self._entries) <= self.max_size:
+                    break
+                del self._entries[oldest_key]
+
+    def delete(self, cache_key: str):
+        with self._lock:
+            self._entries.pop(cache_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        # May include expired entries that have not been touched since they expired
+        return len(self._entries)
+
+    def keys(self, limit: int = 5) -> List[str]:
+        with self._lock:
+            return [key for key, _ in zip(reversed(self._entries), range(limit))]
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Response cache stored in a SQLite database in WAL mode.
+
+    Several worker processes can read and write the same file concurrently, and
+    cached answers survive restarts. Expired entries are deleted with each insert;
+    size eviction runs every EVICTION_BATCH_FRACTION * max_size inserts of a
+    process, so the table may briefly hold that many extra rows per worker.
+    """
+
+    # Finding the max_size-th newest row scans max_size rows, so it isn't done per insert
+    EVICTION_BATCH_FRACTION = 0.1
+
+    # Bumped whenever the cache key scheme changes; older entries are dropped on open.
+    # 2: keys include the course carried over from chat history (see _get_cache_key)
+    KEY_VERSION = 2
+
+    def __init__(self, db_path: str, max_size: int, ttl: int):
+        """
+        Initialize the SQLite cache.
+
+        Args:
+            db_path: Path to the cache database file (created if missing)
+            max_size: Maximum number of cached responses
+            ttl: Time-to-live of a cached response in seconds
+        """
+        super().__init__(max_size, ttl)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()  # One connection per thread
+        self._eviction_interval = max(1, int(max_size * self.EVICTION_BATCH_FRACTION))
+        self._inserts_since_eviction = 0
+        self._eviction_lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    cached_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_cached_at ON response_cache(cached_at)")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.KEY_VERSION:
+                # Entries under older keys may hold a follow-up answered for another conversation's course
+                dropped = conn.execute("DELETE FROM response_cache").rowcount
+                conn.execute(f"PRAGMA user_version = {self.KEY_VERSION}")
+                if dropped:
+                    logger.info(f"🧹 Dropped {dropped} response cache entries with outdated keys")
+        logger.info(f"🗄️ SQLite response cache at {self.db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")  # Readers don't block the writer
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, cache_key: str) -> Optional[Dict]:
+        try:
+            row = self._connection().execute(
+                "SELECT response FROM response_cache WHERE cache_key = ? AND cached_at > ?",
+                (cache_key, time.time() - self.ttl)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, cache_key: str, response: Dict):
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (cache_key, response, cached_at) VALUES (?, ?, ?)",
+                    (cache_key, json.dumps(response, default=str), now)
+                )
+                conn.execute("DELETE FROM response_cache WHERE cached_at <= ?", (now - self.ttl,))
+                if self._eviction_due():
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def _eviction_due(self) -> bool:
+        with self._eviction_lock:
+            self._inserts_since_eviction += 1
+            if self._inserts_since_eviction < self._eviction_interval:
+                return False
+            self._inserts_since_eviction = 0
+            return True
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Keep only the newest max_size entries."""
+        # INSERT OR REPLACE gives the written row the highest rowid, so rowids follow
+        # write order, but replacing a key leaves a gap: count max_size rows down from
+        # the newest instead of subtracting from MAX(rowid).
+        evicted = conn.execute(
+            "DELETE FROM response_cache WHERE rowid <= "
+            "(SELECT rowid FROM response_cache ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+            (self.max_size,)
+        ).rowcount
+        if evicted:
+            logger.debug(f"🧹 Evicted {evicted} response cache entries")
+
+    def delete(self, cache_key: str):
+        try:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (cache_key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache delete failed: {e}")
+
+    def clear(self):
+        try:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM response_cache")
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache clear failed: {e}")
+
+    def size(self) -> int:
+        try:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM response_cache WHERE cached_at > ?", (time.time() - self.ttl,)
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache count failed: {e}")
+            return 0
+
+    def keys(self, limit: int = 5) -> List[str]:
+        try:
+            rows = self._connection().execute(
+                "SELECT cache_key FROM response_cache ORDER BY cached_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache key listing failed: {e}")
+            return []
+        return [row[0] for row in rows]
+
+
+def create_response_cache(backend: str, max_size: int, ttl: int, db_path: str = None) -> ResponseCache:
+    """
+    Create the configured response cache backend.
+
+    Args:
+        backend: "memory" or "sqlite"
+        max_size: Maximum number of cached responses
+        ttl: Time-to-live in seconds
+        db_path: Database file for the sqlite backend
+
+    Returns:
+        Response cache instance (falls back to in-memory if SQLite can't be opened)
+    """
+    if backend == "sqlite":
+        try:
+            return SQLiteResponseCache(db_path, max_size, ttl)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not open SQLite response cache at {db_path}: {e}. Using in-memory cache.")
+    elif backend != "memory":
+        logger.warning(f"Unknown response cache backend '{backend}'. Using in-memory cache.")
+    return InMemoryResponseCache(max_size, ttl)
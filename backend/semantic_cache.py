@@ -0,0 +1,148 @@
+"""
+Semantic response cache for the RAG system.
+Matches paraphrased questions ("prereqs for DIT042" vs "What are the prerequisites
+for DIT042?") to previously answered ones by cosine similarity of their embeddings.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """In-memory index of question embeddings pointing at exact response cache keys.
+
+    Embeddings are kept L2-normalized in a preallocated matrix so a lookup is a
+    single matrix-vector product. Entries are scoped (e.g. by course code) and a
+    lookup only considers entries with the same scope, so answers never cross courses.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_size: int = 1000):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cached question to count as a match
+            max_size: Maximum number of indexed questions before evicting the oldest
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self._matrix: Optional[np.ndarray] = None  # Allocated on first insert (embedding size unknown until then)
+        self._scopes = np.empty(max_size, dtype=object)
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._slots: "OrderedDict[str, int]" = OrderedDict()  # cache_key -> row, in insertion order
+        self._keys: List[Optional[str]] = [None] * max_size
+        self._free = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def add(self, cache_key: str, embedding: List[float], scope: str = ""):
+        """Index a cached question, evicting the oldest entry if the cache is full."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                return  # Embedding model changed; ignore mismatched vectors
+
+            slot = self._slots.pop(cache_key, None)
+            if slot is None:
+                if not self._free:
+                    _, oldest_slot = self._slots.popitem(last=False)
+                    self._release(oldest_slot)
+                slot = self._free.pop()
+
+            self._slots[cache_key] = slot
+            self._keys[slot] = cache_key
+            self._matrix[slot] = vector
+            self._scopes[slot] = scope
+            self._valid[slot] = True
+
+    def lookup(self, embedding: List[float], scope: str = "") -> Optional[Tuple[str, float]]:
+        """Find the most similar indexed question within the same scope.
+
+        A match is not counted as a hit until the caller reports with resolve()
+        whether its cached response still exists.
+
+        Returns:
+            (cache_key, similarity) of the best match above the threshold, or None
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._matrix is None or vector.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+
+            candidates = self._valid & (self._scopes == scope)
+            if not candidates.any():
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ vector
+            similarities[~candidates] = -np.inf
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            return self._keys[best], similarity
+
+    def resolve(self, cache_key: str, found: bool):
+        """Record the outcome of a match from lookup().
+
+        Args:
+            cache_key: The matched key
+            found: Whether its cached response was found; if not, the match counts
+                   as a miss and the stale entry is dropped
+        """
+        if found:
+            with self._lock:
+                self.hits += 1
+            return
+        with self._lock:
+            self.misses += 1
+        self.remove(cache_key)
+
+    def remove(self, cache_key: str):
+        """Drop an indexed question (e.g. when its cached response expired)."""
+        with self._lock:
+            slot = self._slots.pop(cache_key, None)
+            if slot is not None:
+                self._release(slot)
+
+    def _release(self, slot: int):
+        self._valid[slot] = False
+        self._scopes[slot] = None
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            for slot in self._slots.values():
+                self._release(slot)
+            self._slots.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
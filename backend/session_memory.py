@@ -0,0 +1,139 @@
+"""
+Server-side conversation memory keyed by session_id.
+Keeps one ConversationContext per session (the last CONVERSATION_MEMORY_K turns
+plus the recent course codes used for follow-up questions), so clients only send
+the new message instead of their whole chat history on every request.
+
+Requests get a copy of the session's context and their finished turn is merged
+back with remember(), so concurrent requests of one session never mutate the same
+context. Sessions expire SESSION_MEMORY_TTL seconds after their last message and the
+least recently used ones are evicted beyond SESSION_MEMORY_MAX_SESSIONS.
+
+Memory is per worker process: run a single worker or route each session to the same
+worker (sticky sessions), otherwise a follow-up can land on a worker that has never
+seen the session. Clients that still send chat_history work with any number of workers.
+"""
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+
+from config import RAGConfig
+from rag_system import ConversationContext
+
+logger = logging.getLogger(__name__)
+
+
+class SessionMemoryStore:
+    """LRU + TTL store of conversation contexts, ordered by last use."""
+
+    def __init__(self, max_sessions: int = None, ttl: float = None):
+        """
+        Initialize the session store.
+
+        Args:
+            max_sessions: Sessions kept before the least recently used is evicted
+                          (default: RAGConfig.SESSION_MEMORY_MAX_SESSIONS)
+            ttl: Seconds of inactivity after which a session is forgotten
+                 (default: RAGConfig.SESSION_MEMORY_TTL)
+        """
+        self.max_sessions = max_sessions or RAGConfig.SESSION_MEMORY_MAX_SESSIONS
+        self.ttl = ttl or RAGConfig.SESSION_MEMORY_TTL
+        self._sessions = OrderedDict()  # session_id -> (context, last used); oldest first
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        logger.info(f"🧠 Session memory: up to {self.max_sessions} sessions, TTL {self.ttl}s")
+
+    def _expire(self, now: float):
+        """Drop expired sessions; they are all at the front because the dict is ordered by last use."""
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+            self.expirations += 1
+
+    def _touch(self, session_id: str, now: float) -> ConversationContext:
+        """The stored context of a session (created empty if unknown or expired), marked as used. Call with the lock held."""
+        self._expire(now)
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            context = entry[0]
+        else:
+            context = ConversationContext(client_id=session_id)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        self._sessions[session_id] = (context, now)
+        return context
+
+    def get(self, session_id: str) -> ConversationContext:
+        """A copy of the session's conversation context (empty if unknown or expired) for one request."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if session_id in self._sessions:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return self._touch(session_id, now).copy()
+
+    def remember(self, session_id: str, question: str, response: Dict, chat_history: Optional[List[Dict]] = None):
+        """
+        Merge a finished turn into the session.
+
+        Args:
+            session_id: Session of the request
+            question: The user's question
+            response: The response dict of the turn (see ConversationContext.remember_response)
+            chat_history: History the client sent with the request, which replaces what was remembered
+        """
+        with self._lock:
+            context = self._touch(session_id, time.time())
+            if chat_history:
+                context.load_chat_history(chat_history)
+            context.remember_response(question, response)
+
+    def discard(self, session_id: str) -> bool:
+        """Forget a session (e.g. when its chat is deleted)."""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def get_stats(self) -> Dict:
+        """Session memory statistics."""
+        with self._lock:
+            self._expire(time.time())
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+# Global session memory instance
+_global_session_memory: Optional[SessionMemoryStore] = None
+_global_session_memory_lock = Lock()
+
+
+def get_session_memory() -> Optional[SessionMemoryStore]:
+    """Get or create the process-wide session memory (None if ENABLE_SESSION_MEMORY is off)."""
+    global _global_session_memory
+
+    if not RAGConfig.ENABLE_SESSION_MEMORY:
+        return None
+    with _global_session_memory_lock:
+        if _global_session_memory is None:
+            _global_session_memory = SessionMemoryStore()
+
+    return _global_session_memory
@@ -0,0 +1,145 @@
+"""
+Single-flight request coalescing for the RAG system.
+Concurrent identical questions (same cache key, which includes the course carried
+over from chat history) share one in-flight retrieval + LLM computation instead
+of each missing the cache and calling Gemini on their own.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _SyncCall:
+    """An in-flight computation awaited by threads."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs the computation; callers arriving
+    while it is in flight (followers) wait for its result. Async callers share an
+    asyncio future, threaded callers a threading.Event; the two are tracked
+    separately but counted together.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._sync_flights: Dict[str, _SyncCall] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    # === ASYNC ===
+
+    def claim(self, key: str) -> Tuple[asyncio.Future, bool]:
+        """
+        Join the in-flight computation for a key, or become its leader.
+
+        A leader must finish the flight with resolve() (also on failure), otherwise
+        followers wait forever.
+
+        Returns:
+            (future, is_leader) - followers await the future
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None and not future.done():
+                self.coalesced += 1
+                return future, False
+            future = asyncio.get_running_loop().create_future()
+            self._flights[key] = future
+            self.executions += 1
+            return future, True
+
+    def resolve(self, key: str, future: asyncio.Future, result: Any = None, error: BaseException = None):
+        """Finish a flight claimed as leader, waking its followers with the result or error."""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        # Mark the exception as retrieved when nobody joined the flight
+        if error is not None:
+            future.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once for all concurrent callers with the same key.
+
+        The computation runs as its own task, so it keeps going for the followers
+        even if the leader's request is cancelled (e.g. the client disconnected).
+
+        Returns:
+            (result, coalesced) - coalesced is True for followers
+        """
+        future, is_leader = self.claim(key)
+        if not is_leader:
+            return await asyncio.shield(future), True
+
+        task = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._settle(key, future, done))
+        return await asyncio.shield(task), False
+
+    def _settle(self, key: str, future: asyncio.Future, task: asyncio.Future):
+        """Resolve a flight from its finished computation task."""
+        if task.cancelled():
+            self.resolve(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.resolve(key, future, error=task.exception())
+        else:
+            self.resolve(key, future, result=task.result())
+
+    # === THREADS ===
+
+    def do_sync(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Blocking version of do() for callers on worker threads."""
+        with self._lock:
+            call = self._sync_flights.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _SyncCall()
+                self._sync_flights[key] = call
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_flights[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Number of keys currently being computed."""
+        with self._lock:
+            return len(self._flights) + len(self._sync_flights)
+
+    def get_stats(self) -> Dict:
+        """Get coalescing statistics."""
+        with self._lock:
+            requests = self.executions + self.coalesced
+            return {
+                "in_flight": len(self._flights) + len(self._sync_flights),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesce_rate": round(self.coalesced / requests, 3) if requests else 0.0
+            }
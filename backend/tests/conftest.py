@@ -0,0 +1,43 @@
+"""
+Shared setup for the backend unit tests.
+
+The backend modules import each other as top-level modules (run from backend/),
+so the backend directory is put on sys.path, and benchmarks/ for the stub
+embeddings and LLM used by engine-level tests.
+
+Usage:
+    cd backend
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Before any backend module reads RAGConfig: keep tests away from the real data/ files
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="csexpert-tests-")
+for setting, filename in [("LEXICAL_INDEX_PATH", "lexical_index.db"), ("RESPONSE_CACHE_DB_PATH", "response_cache.db"),
+                          ("CHAT_HISTORY_DB_PATH", "chat_histories.db"), ("RATE_LIMIT_DB_PATH", "rate_limits.db")]:
+    os.environ.setdefault(setting, os.path.join(TEST_DATA_DIR, filename))
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def _stub_engine():
+    from stubs import build_stub_engine, synthetic_documents
+    return build_stub_engine(synthetic_documents())
+
+
+@pytest.fixture
+def stub_engine(_stub_engine):
+    """A GothenburgUniversityRAG over synthetic courses with stub models, with empty caches."""
+    _stub_engine.response_cache.clear()
+    if _stub_engine.semantic_cache:
+        _stub_engine.semantic_cache.clear()
+    return _stub_engine
@@ -0,0 +1,86 @@
+"""
+Tests for the /chat/batch rate limit (distinct questions by cache key, charged in groups).
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from config import RAGConfig
+from rate_limiter import AdaptiveRateLimiter
+
+REQUEST = SimpleNamespace(client=SimpleNamespace(host="127.0.0.1"))
+
+
+@pytest.fixture
+def limiter(stub_engine, monkeypatch):
+    limiter = AdaptiveRateLimiter(base_requests_per_minute=10, window_seconds=60, load_threshold=0.8)
+    monkeypatch.setattr(main, "rag_system", stub_engine)
+    monkeypatch.setattr(main, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(RAGConfig, "CHAT_BATCH_QUESTIONS_PER_REQUEST", 10)
+    monkeypatch.setattr(RAGConfig, "RATE_LIMIT_REQUESTS", 10)
+    return limiter
+
+
+def batch(questions, session_id="client"):
+    return main.BatchChatRequest(questions=questions, session_id=session_id)
+
+
+def test_a_full_batch_is_admitted_and_charged_per_group(limiter):
+    questions = [f"What are the prerequisites for DIT{100 + i}?" for i in range(RAGConfig.CHAT_BATCH_MAX_QUESTIONS)]
+    client_id, (analyses, _, _) = main.enforce_batch_rate_limit(batch(questions), REQUEST)
+    assert client_id == "client" and len(analyses) == len(questions)
+    assert limiter.get_client_stats("client")["current_requests"] == 10
+
+
+def test_duplicates_are_counted_by_cache_key(stub_engine, limiter):
+    # Case, whitespace and typos the engine corrects don't make a question distinct
+    questions = ["What is machine learning?", "what is  MACHINE learning?", "What is machien learning?"]
+    analyses, indexes, errors = stub_engine.dedupe_batch(questions)
+    assert len(analyses) == 1 and errors == []
+    assert list(indexes.values()) == [[0, 1, 2]]
+    main.enforce_batch_rate_limit(batch(questions * 5), REQUEST)
+    assert limiter.get_client_stats("client")["current_requests"] == 1
+
+
+def test_a_batch_over_the_configured_limit_is_rejected_as_too_large(limiter, monkeypatch):
+    monkeypatch.setattr(RAGConfig, "RATE_LIMIT_REQUESTS", 5)
+    questions = [f"What are the prerequisites for DIT{100 + i}?" for i in range(100)]
+    with pytest.raises(HTTPException) as excinfo:
+        main.enforce_batch_rate_limit(batch(questions), REQUEST)
+    assert excinfo.value.status_code == 413
+    assert limiter.get_client_stats("client")["current_requests"] == 0
+
+
+def test_a_batch_over_the_limit_reduced_under_load_is_retryable(limiter):
+    limiter.update_system_load(1.0)  # The adaptive limiter shrinks under load
+    assert limiter.max_requests < 10
+    questions = [f"What are the prerequisites for DIT{100 + i}?" for i in range(100)]
+    with pytest.raises(HTTPException) as excinfo:
+        main.enforce_batch_rate_limit(batch(questions), REQUEST)
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) > 0
+    assert limiter.get_client_stats("client")["current_requests"] == 0
+
+
+def test_the_batch_is_analyzed_once(stub_engine, limiter, monkeypatch):
+    questions = ["What is machine learning?", "What are the prerequisites for DIT100?", "What is machine learning?"]
+    _, deduped = main.enforce_batch_rate_limit(batch(questions), REQUEST)
+    monkeypatch.setattr(stub_engine, "dedupe_batch", lambda *args: pytest.fail("batch analyzed twice"))
+
+    async def collect():
+        return [item async for item in stub_engine.aquery_batch(questions, "client", deduped=deduped)]
+
+    results = asyncio.run(collect())
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+
+
+def test_an_exhausted_budget_is_retryable(limiter):
+    questions = [f"What are the prerequisites for DIT{100 + i}?" for i in range(60)]
+    main.enforce_batch_rate_limit(batch(questions), REQUEST)
+    with pytest.raises(HTTPException) as excinfo:
+        main.enforce_batch_rate_limit(batch(questions[:50]), REQUEST)
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) > 0
@@ -0,0 +1,137 @@
+"""
+Tests for the SQLite chat history store (incremental saves and keyset pagination).
+"""
+import pytest
+
+from chat_history_store import ChatHistoryStore, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChatHistoryStore(str(tmp_path / "chat_histories.db"), pool_size=2)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def inserts(store, monkeypatch):
+    """Records (start position, number of messages) of every message insert."""
+    calls = []
+    original = ChatHistoryStore._insert_messages
+
+    def recording(conn, session_id, start, messages):
+        calls.append((start, len(messages)))
+        original(conn, session_id, start, messages)
+
+    monkeypatch.setattr(ChatHistoryStore, "_insert_messages", staticmethod(recording))
+    return calls
+
+
+def message(i: int) -> dict:
+    role = "user" if i % 2 == 0 else "assistant"
+    return {"role": role, "content": f"message {i}"}
+
+
+def test_save_and_get_round_trip(store):
+    messages = [message(0), {"role": "assistant", "content": "Ja, kursen ges på engelska.",
+                             "sources": [{"course_code": "DIT100"}]}]
+    saved = store.save("s1", messages, title="First chat")
+    history = store.get("s1")
+    assert history["messages"] == messages
+    assert history["title"] == "First chat"
+    assert history["message_count"] == 2
+    assert history["created_at"] == saved["created_at"]
+    assert store.get("missing") is None
+
+
+def test_saving_a_grown_conversation_only_inserts_the_new_tail(store, inserts):
+    store.save("s1", [message(i) for i in range(4)])
+    store.save("s1", [message(i) for i in range(6)])
+    assert inserts == [(0, 4), (4, 2)]
+    assert store.get("s1")["messages"] == [message(i) for i in range(6)]
+
+
+def test_saving_an_edited_conversation_rewrites_it(store, inserts):
+    store.save("s1", [message(i) for i in range(4)])
+    edited = [message(0), message(1), message(2), {"role": "assistant", "content": "regenerated"}, message(4)]
+    store.save("s1", edited)
+    assert inserts[-1] == (0, 5)
+    assert store.get("s1")["messages"] == edited
+
+
+def test_saving_a_shorter_conversation_drops_the_removed_messages(store):
+    store.save("s1", [message(i) for i in range(6)])
+    store.save("s1", [message(i) for i in range(2)])
+    history = store.get("s1")
+    assert history["messages"] == [message(0), message(1)]
+    assert history["message_count"] == 2
+
+
+def test_append_messages_keeps_stored_messages(store, inserts):
+    store.save("s1", [message(0)], title="Kept title")
+    updated = store.append_messages("s1", [message(1), message(2)])
+    assert inserts[-1] == (1, 2)
+    assert updated["message_count"] == 3 and updated["title"] == "Kept title"
+    assert store.get("s1")["messages"] == [message(i) for i in range(3)]
+
+    created = store.append_messages("s2", [message(0)])
+    assert created["title"] == "New Chat" and created["message_count"] == 1
+
+
+def test_update_and_delete(store):
+    store.save("s1", [message(0)])
+    assert store.update("s1", title="Renamed")["messages"] == [message(0)]
+    assert store.update("s1", messages=[message(0), message(1)])["message_count"] == 2
+    assert store.update("missing", title="x") is None
+    assert store.delete("s1") is True
+    assert store.delete("s1") is False
+    with store.db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0] == 0
+
+
+def test_list_is_newest_first_and_follows_updates(store):
+    for session_id in ("a", "b", "c"):
+        store.save(session_id, [message(0)])
+    store.append_messages("a", [message(1)])
+    listing = store.list(limit=10)
+    assert [h["session_id"] for h in listing["histories"]] == ["a", "c", "b"]
+    assert listing["total"] == 3 and listing["next_cursor"] is None
+    assert listing["histories"][0]["messages"] == [message(0), message(1)]
+    assert "messages" not in store.list(limit=10, include_messages=False)["histories"][0]
+
+
+def test_cursor_pages_cover_every_history_exactly_once(store):
+    # Half of the histories share one timestamp, so the session_id tie-break matters
+    with store.db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO chat_histories (session_id, title, message_count, created_at, updated_at) "
+            "VALUES (?, ?, 0, ?, ?)",
+            [(f"s{i:02d}", f"Chat {i}", "2025-01-01T00:00:00.000000",
+              "2025-01-01T00:00:00.000000" if i % 2 else f"2025-01-01T00:00:{i:02d}.000000")
+             for i in range(23)]
+        )
+    expected = [h["session_id"] for h in store.list(limit=100)["histories"]]
+
+    paged, cursor = [], None
+    while True:
+        page = store.list(limit=5, cursor=cursor)
+        paged += [h["session_id"] for h in page["histories"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert paged == expected
+    assert len(set(paged)) == 23
+
+
+def test_offset_paging_matches_cursor_paging(store):
+    for i in range(7):
+        store.save(f"s{i}", [message(i)])
+    first = store.list(limit=3)
+    assert [h["session_id"] for h in store.list(limit=3, cursor=first["next_cursor"])["histories"]] == \
+           [h["session_id"] for h in store.list(limit=3, offset=3)["histories"]]
+
+
+def test_cursor_round_trip_and_invalid_cursors():
+    assert decode_cursor(encode_cursor("2025-01-01T00:00:00.000000", "s1")) == ("2025-01-01T00:00:00.000000", "s1")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
@@ -0,0 +1,65 @@
+"""
+Tests for POST /chat/stream (Server-Sent Events order and when the turn is remembered).
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+REQUEST = SimpleNamespace(client=SimpleNamespace(host="127.0.0.1"), state=SimpleNamespace())
+
+
+@pytest.fixture
+def remembered(stub_engine, monkeypatch):
+    """Turns passed to remember_turn, and how many events had been sent when it ran."""
+    calls = []
+    monkeypatch.setattr(main, "rag_system", stub_engine)
+    monkeypatch.setattr(main, "remember_turn", lambda message, response: calls.append((message, response)))
+    return calls
+
+
+def stream(text: str, remembered: list) -> list:
+    """(event, data, remember_turn calls so far) for each Server-Sent Event of a /chat/stream request."""
+    message = main.ChatMessage(message=text, session_id="session")
+
+    async def collect():
+        response = await main.chat_stream(message, REQUEST, client_id="client")
+        events = []
+        async for chunk in response.body_iterator:
+            event, data = chunk.strip().split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: ")), len(remembered)))
+        return events
+
+    return asyncio.run(collect())
+
+
+def test_events_arrive_as_metadata_tokens_done(remembered):
+    events = stream("What are the prerequisites for DIT100?", remembered)
+    names = [name for name, _, _ in events]
+    assert names[0] == "metadata" and names[-1] == "done"
+    assert len(names) > 2 and set(names[1:-1]) == {"token"}
+    assert events[0][1]["session_id"] == "session" and events[0][1]["sources"]
+
+    answer = "".join(data["content"] for name, data, _ in events if name == "token")
+    assert answer and events[-1][1]["cache_hit"] is False
+
+
+def test_the_turn_is_remembered_only_when_done(remembered):
+    events = stream("What are the prerequisites for DIT100?", remembered)
+    assert [calls for _, _, calls in events[:-1]] == [0] * (len(events) - 1)
+    assert events[-1][2] == 1
+
+    (message, response), = remembered
+    assert message.message == "What are the prerequisites for DIT100?"
+    assert response["answer"] == "".join(data["content"] for name, data, _ in events if name == "token")
+    assert response["error"] is None
+
+
+def test_invalid_input_is_answered_with_an_error_event(remembered):
+    events = stream("a", remembered)
+    assert [name for name, _, _ in events] == ["error"]
+    assert "at least" in events[0][1]["message"]
+    assert remembered == []
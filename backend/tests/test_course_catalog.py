@@ -0,0 +1,103 @@
+"""
+Tests for the in-memory course catalog (builders and exact-match lookups).
+"""
+import sqlite3
+
+import pytest
+
+from course_catalog import CatalogCourse, CatalogProgram, CourseCatalog
+
+
+@pytest.fixture
+def catalog():
+    return CourseCatalog([
+        CatalogCourse("DIT200", title="Databases", department="Department of Computer Science and Engineering",
+                      cycle="First cycle", programs=["N2COS"]),
+        CatalogCourse("DIT100", title="Machine Learning", department="Department of Computer Science and Engineering",
+                      cycle="Second cycle", programs=["N2COS", "N2SOF"], tuition_fee="40000"),
+        CatalogCourse("MSG100", title="Statistics", department="Department of Mathematical Sciences",
+                      cycle="First cycle"),
+    ], [CatalogProgram("N2COS", name="Computer Science")])
+
+
+def codes(courses):
+    return [course.code for course in courses]
+
+
+def test_lookups(catalog):
+    assert catalog.get_course("dit100").title == "Machine Learning"
+    assert catalog.get_course("DIT999") is None
+    assert codes(catalog.list_courses()) == ["DIT100", "DIT200", "MSG100"]
+    assert codes(catalog.courses_by_program("n2cos")) == ["DIT100", "DIT200"]
+    assert codes(catalog.courses_by_cycle("first cycle")) == ["DIT200", "MSG100"]
+    assert codes(catalog.courses_with_tuition()) == ["DIT100"]
+    assert catalog.get_stats() == {"source": "database", "courses": 3, "programs": 1,
+                                   "departments": 2, "courses_with_tuition": 1}
+
+
+@pytest.mark.parametrize("department", ["Department of Computer Science and Engineering",
+                                        "computer science and engineering",
+                                        "computer-science-and-engineering"])
+def test_departments_match_names_and_url_slugs(catalog, department):
+    assert codes(catalog.courses_by_department(department)) == ["DIT100", "DIT200"]
+    assert catalog.department_name(department) == "Department of Computer Science and Engineering"
+
+
+def test_summary_returns_the_requested_fields_in_order(catalog):
+    assert catalog.get_course("DIT100").summary("code", "title") == {"code": "DIT100", "title": "Machine Learning"}
+
+
+def test_from_metadatas_merges_the_documents_of_a_course():
+    catalog = CourseCatalog.from_metadatas([
+        {"doc_type": "course_overview", "course_code": "DIT100", "course_title": "Machine Learning",
+         "credits": 7.5, "programs": "N2SOF, N2COS"},
+        {"doc_type": "course_section", "course_code": "DIT100", "department": "Computer Science",
+         "course_title": "Ignored, the title is already known"},
+        {"doc_type": "course_details", "course_code": "DIT100", "has_tuition": True, "tuition_fee": 40000},
+        {"doc_type": "program_overview", "program_code": "N2COS"},
+        None,
+    ])
+    course = catalog.get_course("DIT100")
+    assert (course.title, course.department, course.credits) == ("Machine Learning", "Computer Science", "7.5")
+    assert course.programs == ["N2COS", "N2SOF"]
+    assert course.tuition_fee == "40000"
+    assert len(catalog.courses) == 1
+
+
+def test_from_database_reads_only_current_courses(tmp_path):
+    db_path = tmp_path / "csexpert.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE language_standards (id INTEGER PRIMARY KEY, display_name TEXT);
+        CREATE TABLE courses (id INTEGER PRIMARY KEY, course_code TEXT, course_title TEXT, department TEXT,
+                              credits REAL, cycle TEXT, study_form TEXT, term TEXT,
+                              language_of_instruction_id INTEGER, is_current INTEGER, is_replaced INTEGER);
+        CREATE TABLE course_details (course_id INTEGER, tuition_fee REAL);
+        CREATE TABLE programs (id INTEGER PRIMARY KEY, program_code TEXT, program_name TEXT,
+                               program_type TEXT, department TEXT);
+        CREATE TABLE course_program_mapping (course_id INTEGER, program_id INTEGER);
+        INSERT INTO language_standards VALUES (1, 'English');
+        INSERT INTO courses VALUES (1, 'DIT100', 'Machine Learning', 'CSE', 7.5, 'Second cycle', 'Campus',
+                                    'Autumn', 1, 1, 0);
+        INSERT INTO courses VALUES (2, 'DIT101', 'Old Course', 'CSE', 7.5, NULL, NULL, NULL, NULL, 1, 1);
+        INSERT INTO courses VALUES (3, 'DIT102', 'Retired Course', 'CSE', 7.5, NULL, NULL, NULL, NULL, 0, 0);
+        INSERT INTO course_details VALUES (1, 40000);
+        INSERT INTO programs VALUES (1, 'N2COS', 'Computer Science', 'master', 'CSE');
+        INSERT INTO programs VALUES (2, 'N2SOF', 'Software Engineering', 'master', 'CSE');
+        INSERT INTO programs VALUES (3, 'XXXXX', 'Broken', 'invalid', '');
+        INSERT INTO course_program_mapping VALUES (1, 2), (1, 1);
+    """)
+    conn.commit()
+    conn.close()
+
+    catalog = CourseCatalog.from_database(str(db_path))
+    assert list(catalog.courses) == ["DIT100"]
+    course = catalog.get_course("DIT100")
+    assert (course.language, course.credits, course.tuition_fee) == ("English", "7.5", "40000.0")
+    assert course.programs == ["N2COS", "N2SOF"]
+    assert sorted(catalog.programs) == ["N2COS", "N2SOF"]
+
+
+def test_from_database_requires_the_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CourseCatalog.from_database(str(tmp_path / "missing.db"))
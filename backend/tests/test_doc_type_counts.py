@@ -0,0 +1,54 @@
+"""
+Tests for the per-doc_type document counts kept at index time and reused on restart.
+"""
+import json
+
+import pytest
+
+from rag_system import GothenburgUniversityRAG
+from stubs import StubChatModel, StubEmbeddings, synthetic_documents
+
+DOCUMENTS = synthetic_documents(num_courses=3)
+EXPECTED = {"course_overview": 3, "course_section": 3 * (len(DOCUMENTS) // 3 - 1)}
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    def make_engine() -> GothenburgUniversityRAG:
+        engine = GothenburgUniversityRAG(client_id="test", embeddings=StubEmbeddings(), llm=StubChatModel())
+        engine.chroma_persist_dir = str(tmp_path / "chroma")
+        engine.collection_name = "doc_type_counts_test"
+        engine.lexical_index = None
+        monkeypatch.setattr(engine, "load_json_documents", lambda: synthetic_documents(num_courses=3))
+        return engine
+    return make_engine
+
+
+def no_recount(*args, **kwargs):
+    pytest.fail("document types were recounted from the vector store")
+
+
+def test_counts_tallied_at_index_time_are_loaded_on_restart(make_engine, monkeypatch):
+    first = make_engine()
+    assert first.initialize_vector_store(force_reload=True) == len(DOCUMENTS)
+    assert first.doc_type_counts == EXPECTED
+
+    restarted = make_engine()
+    monkeypatch.setattr(restarted, "_refresh_doc_type_counts", no_recount)
+    assert restarted.initialize_vector_store() == len(DOCUMENTS)
+    assert restarted.doc_type_counts == EXPECTED
+
+
+@pytest.mark.parametrize("stored", [None, "not json", json.dumps({"course_overview": 1})])
+def test_missing_or_inconsistent_counts_are_recounted(make_engine, stored):
+    make_engine().initialize_vector_store(force_reload=True)
+    restarted = make_engine()
+    path = restarted._doc_type_counts_path()
+    if stored is None:
+        path.unlink()
+    else:
+        path.write_text(stored)
+
+    restarted.initialize_vector_store()
+    assert restarted.doc_type_counts == EXPECTED
+    assert json.loads(path.read_text()) == EXPECTED
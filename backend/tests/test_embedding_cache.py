@@ -0,0 +1,93 @@
+"""
+Tests for the query embedding cache (LRU, normalization, batched misses, pre-warming).
+"""
+import asyncio
+
+from embedding_cache import EmbeddingCache
+
+
+def test_normalized_texts_share_an_entry():
+    cache = EmbeddingCache("model", max_size=10)
+    cache.put("What is  Machine Learning? ", [1.0, 0.0])
+    assert cache.get("what is machine learning?") == [1.0, 0.0]
+    assert cache.contains("WHAT IS MACHINE LEARNING?")
+    assert cache.get("something else") is None
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 1
+
+
+def test_entries_are_keyed_by_model():
+    assert EmbeddingCache("model-a")._key("query") != EmbeddingCache("model-b")._key("query")
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache("model", max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", [3.0])
+    assert not cache.contains("b")
+    assert cache.contains("a") and cache.contains("c")
+    assert cache.get_stats()["size"] == 2
+
+
+def test_contains_does_not_count_as_a_lookup():
+    cache = EmbeddingCache("model", max_size=10)
+    cache.put("a", [1.0])
+    cache.contains("a")
+    cache.contains("b")
+    assert cache.get_stats()["hits"] == 0 and cache.get_stats()["misses"] == 0
+
+
+def test_engine_embeds_only_misses_in_one_batched_call(stub_engine, monkeypatch):
+    stub_engine.embedding_cache.clear()
+    monkeypatch.setattr(stub_engine.embeddings, "calls", 0)
+    monkeypatch.setattr(stub_engine.embeddings, "texts_embedded", 0)
+
+    first = stub_engine._embed_queries(["course prerequisites", "course language", "course prerequisites"])
+    assert set(first) == {"course prerequisites", "course language"}
+    assert (stub_engine.embeddings.calls, stub_engine.embeddings.texts_embedded) == (1, 2)
+
+    second = stub_engine._embed_queries(["course language", "course credits"])
+    assert second["course language"] == first["course language"]
+    assert (stub_engine.embeddings.calls, stub_engine.embeddings.texts_embedded) == (2, 3)
+
+    stub_engine._embed_queries(["course language", "course credits"])
+    assert stub_engine.embeddings.calls == 2
+
+
+def test_warming_embeds_the_static_vocabulary_once(stub_engine):
+    stub_engine.embedding_cache.clear()
+    warmed = stub_engine.warm_embedding_cache()
+    assert warmed > 0
+    assert stub_engine.embedding_cache.get_stats()["size"] == warmed
+    assert stub_engine.warm_embedding_cache() == 0
+
+
+def answer_batch(engine, questions):
+    async def collect():
+        return [item async for item in engine.aquery_batch(questions)]
+    return asyncio.run(collect())
+
+
+def test_a_batch_embeds_each_question_once_without_the_embedding_cache(stub_engine, monkeypatch):
+    assert stub_engine.semantic_cache is None
+    monkeypatch.setattr(stub_engine, "embedding_cache", None)
+    embedded = []
+    embed_documents = stub_engine.embeddings.embed_documents
+    monkeypatch.setattr(stub_engine.embeddings, "embed_documents",
+                        lambda texts, **kwargs: embedded.extend(texts) or embed_documents(texts, **kwargs))
+
+    questions = ["What is machine learning?", "What are the prerequisites for DIT100?"]
+    answer_batch(stub_engine, questions)
+    assert [text for text in embedded if text in questions] == questions
+
+
+def test_cached_batch_answers_need_no_embedding_without_the_semantic_cache(stub_engine, monkeypatch):
+    questions = ["What is machine learning?", "What are the prerequisites for DIT100?"]
+    answer_batch(stub_engine, questions)
+    monkeypatch.setattr(stub_engine, "embedding_cache", None)
+    monkeypatch.setattr(stub_engine.embeddings, "calls", 0)
+
+    results = answer_batch(stub_engine, questions)
+    assert all(result.get("cache_hit") for result in results)
+    assert stub_engine.embeddings.calls == 0
@@ -0,0 +1,78 @@
+"""
+Tests for the FTS5 lexical index and reciprocal rank fusion.
+"""
+import pytest
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+
+def section(code: str, section_name: str, content: str) -> Document:
+    return Document(page_content=content, metadata={"course_code": code, "doc_type": "course_section",
+                                                    "section_name": section_name})
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical_index.db"))
+    index.rebuild([
+        section("DIT100", "Prerequisites", "Students need programming experience in Python."),
+        section("DIT100", "Content", "Neural networks, gradient descent and regularisation."),
+        section("DIT200", "Content", "Relational databases, SQL and transactions."),
+        Document(page_content="The master's programme in computer science.",
+                 metadata={"program_code": "N2COS", "program_name": "Computer Science",
+                           "doc_type": "program_overview"}),
+    ])
+    return index
+
+
+def test_search_ranks_matching_documents_by_bm25(index):
+    results = index.search("What is gradient descent?", k=5)
+    assert [doc.metadata["section_name"] for doc in results] == ["Content"]
+    assert results[0].metadata["course_code"] == "DIT100"
+
+
+def test_course_codes_outweigh_body_text(index):
+    results = index.search("DIT200 programming", k=5)
+    assert results[0].metadata["course_code"] == "DIT200"
+
+
+def test_stemming_matches_word_forms(index):
+    assert index.search("relational database", k=5)[0].metadata["course_code"] == "DIT200"
+
+
+def test_filters_restrict_results(index):
+    results = index.search("DIT100 python networks", k=5, filter={"course_code": "DIT100", "doc_type": "course_section"})
+    assert {doc.metadata["course_code"] for doc in results} == {"DIT100"}
+    assert index.search("programme", k=5, filter={"doc_type": "course_section"}) == []
+    with pytest.raises(ValueError):
+        index.search("python", k=5, filter={"content": "python"})
+
+
+def test_rebuild_replaces_the_contents(index):
+    assert index.count() == 4
+    index.rebuild([section("DIT300", "Content", "Compilers.")])
+    assert index.count() == 1
+    assert index.search("python", k=5) == []
+
+
+@pytest.mark.parametrize("question", ['what is "the" course?', "DIT100: NEAR(prerequisites*", "-- OR AND NOT"])
+def test_question_text_is_never_fts5_syntax(index, question):
+    index.search(question, k=5)  # No sqlite3.OperationalError
+
+
+def test_match_query_drops_stopwords_and_quotes_terms():
+    assert LexicalIndex.build_match_query("What are the prerequisites for DIT100?") == \
+           '"prerequisites" OR "dit100"'
+    assert LexicalIndex.build_match_query("What is the course about?") is None
+
+
+def test_rrf_rewards_items_ranked_by_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d", "b"]], key=lambda item: item)
+    assert fused == ["c", "b", "a", "d"]
+
+
+def test_rrf_keeps_the_first_occurrence_of_an_item():
+    first = {"id": 1, "source": "lexical"}
+    fused = reciprocal_rank_fusion([[first], [{"id": 1, "source": "vector"}]], key=lambda item: item["id"])
+    assert fused == [first]
@@ -0,0 +1,223 @@
+"""
+Tests for LLM admission control (slot hand-off, queue limits, timeout/grant races).
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_admission
+from llm_admission import LLMAdmissionController, LLMOverloadedError
+
+
+def occupy(controller: LLMAdmissionController):
+    """Take a free slot without a with-block; the test releases it with controller.release()."""
+    assert controller._enter(llm_admission._Waiter())
+
+
+def test_slots_up_to_max_concurrency_are_granted_immediately():
+    controller = LLMAdmissionController(max_concurrency=2, max_queue=1, max_wait=1.0)
+    with controller.slot() as first_wait, controller.slot() as second_wait:
+        assert controller.active == 2
+        assert first_wait < 0.1 and second_wait < 0.1
+    assert controller.active == 0
+    assert controller.get_stats()["admitted"] == 2
+
+
+def test_full_queue_rejects_immediately_with_retry_after():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=0, max_wait=2.5)
+    occupy(controller)
+    start = time.perf_counter()
+    with pytest.raises(LLMOverloadedError) as excinfo:
+        with controller.slot():
+            pass
+    assert time.perf_counter() - start < 0.5
+    assert excinfo.value.retry_after == 3
+    assert controller.rejected == 1
+    controller.release()
+    assert controller.active == 0
+
+
+def test_waiter_times_out_and_leaves_the_queue():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=5, max_wait=0.05)
+    occupy(controller)
+    with pytest.raises(LLMOverloadedError):
+        with controller.slot():
+            pass
+    assert controller.queue_depth == 0
+    controller.release()
+    assert controller.active == 0
+
+
+def test_release_hands_the_slot_to_waiters_in_fifo_order():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=5, max_wait=5.0)
+    occupy(controller)
+    order = []
+
+    def worker(name: str):
+        with controller.slot():
+            order.append(name)
+
+    threads = []
+    for name in "ABC":
+        thread = threading.Thread(target=worker, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while controller.queue_depth < len(threads):  # Queue them in a known order
+            time.sleep(0.001)
+
+    controller.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["A", "B", "C"]
+    assert controller.active == 0 and controller.queue_depth == 0
+
+
+def test_grant_racing_a_sync_timeout_keeps_the_slot(monkeypatch):
+    """A slot handed over just as the wait timed out is used, not leaked or double-counted."""
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=1, max_wait=0.01)
+    occupy(controller)
+
+    class RacingWaiter(llm_admission._Waiter):
+        def __init__(self, loop=None):
+            super().__init__(loop)
+            event = self.event
+
+            class RacingEvent:
+                def wait(self, timeout=None):
+                    controller.release()  # The holder finishes as the wait times out
+                    return False
+
+                def set(self):
+                    event.set()
+
+            self.event = RacingEvent()
+
+    monkeypatch.setattr(llm_admission, "_Waiter", RacingWaiter)
+    with controller.slot():
+        assert controller.active == 1
+    assert controller.active == 0
+    assert controller.rejected == 0
+
+
+def test_async_waiters_share_slots_with_threads():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=5, max_wait=5.0)
+
+    async def main():
+        occupy(controller)
+        order = []
+
+        async def worker(name: str):
+            async with controller.aslot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        tasks = []
+        for name in "AB":
+            tasks.append(asyncio.ensure_future(worker(name)))
+            while controller.queue_depth < len(tasks):
+                await asyncio.sleep(0.001)
+        # Released from another thread, as a finished threadpool call would
+        threading.Thread(target=controller.release).start()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["A", "B"]
+    assert controller.active == 0
+
+
+def test_async_timeout_rejects_and_leaves_the_queue():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=5, max_wait=0.05)
+
+    async def main():
+        occupy(controller)
+        with pytest.raises(LLMOverloadedError):
+            async with controller.aslot():
+                pass
+
+    asyncio.run(main())
+    assert controller.queue_depth == 0
+    controller.release()
+    assert controller.active == 0
+
+
+def test_cancelled_waiter_granted_a_slot_passes_it_on():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=5, max_wait=5.0)
+
+    async def main():
+        occupy(controller)
+        admitted = []
+
+        async def worker(name: str):
+            async with controller.aslot():
+                admitted.append(name)
+
+        first = asyncio.ensure_future(worker("first"))
+        while controller.queue_depth < 1:
+            await asyncio.sleep(0.001)
+        second = asyncio.ensure_future(worker("second"))
+        while controller.queue_depth < 2:
+            await asyncio.sleep(0.001)
+
+        # Grant the slot to the first waiter and cancel it before it can run
+        controller.release()
+        first.cancel()
+        await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return admitted
+
+    assert asyncio.run(main()) == ["second"]
+    assert controller.active == 0 and controller.queue_depth == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=5, max_wait=5.0)
+
+    async def main():
+        occupy(controller)
+        waiter = asyncio.ensure_future(controller.aslot().__aenter__())
+        while controller.queue_depth < 1:
+            await asyncio.sleep(0.001)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert controller.queue_depth == 0
+    controller.release()
+    assert controller.active == 0
+
+
+def test_streaming_releases_the_slot_when_generation_ends_not_when_the_client_has_read(stub_engine, monkeypatch):
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=0, max_wait=0.1)
+    monkeypatch.setattr(stub_engine, "llm_admission", controller)
+    documents = stub_engine.vector_store.similarity_search("machine learning", k=3)
+
+    async def main():
+        stream = stub_engine.astream_answer("What is machine learning?", documents)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)  # Gemini (the stub) finishes while the client reads slowly
+        assert controller.active == 0
+        rest = [chunk async for chunk in stream]
+        return first + "".join(rest)
+
+    assert "DIT" in asyncio.run(main())
+
+
+def test_abandoned_stream_frees_its_slot(stub_engine, monkeypatch):
+    controller = LLMAdmissionController(max_concurrency=1, max_queue=0, max_wait=0.1)
+    monkeypatch.setattr(stub_engine, "llm_admission", controller)
+    monkeypatch.setattr(stub_engine.llm, "token_delay", 0.05)
+    documents = stub_engine.vector_store.similarity_search("machine learning", k=3)
+
+    async def main():
+        stream = stub_engine.astream_answer("What is machine learning?", documents)
+        await stream.__anext__()
+        assert controller.active == 1
+        await stream.aclose()  # The client disconnected mid-answer
+        await asyncio.sleep(0.01)
+        assert controller.active == 0
+
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Tests for the load factor fed to the adaptive rate limiter.
+"""
+import asyncio
+from contextlib import ExitStack
+
+from config import RAGConfig
+from load_monitor import LoadMonitor
+from metrics import LLM_QUEUE_DEPTH
+from rate_limiter import AdaptiveRateLimiter, GCRARateLimiter, RateLimiter
+
+
+def test_llm_capacity_defaults_to_the_admission_limit(monkeypatch):
+    monkeypatch.setattr(RAGConfig, "LOAD_LLM_CAPACITY", 0)
+    monkeypatch.setattr(RAGConfig, "LLM_MAX_CONCURRENCY", 8)
+    assert LoadMonitor().llm_capacity == 8
+
+    monkeypatch.setattr(RAGConfig, "LLM_MAX_CONCURRENCY", 0)  # Admission control off
+    assert LoadMonitor().llm_capacity == LoadMonitor.DEFAULT_LLM_CAPACITY
+
+    monkeypatch.setattr(RAGConfig, "LOAD_LLM_CAPACITY", 12)
+    assert LoadMonitor().llm_capacity == 12
+
+
+def test_busy_admission_slots_tighten_the_adaptive_limit(monkeypatch):
+    monkeypatch.setattr(LLM_QUEUE_DEPTH, "value", lambda: 0)
+    monitor = LoadMonitor(llm_capacity=8)
+    limiter = AdaptiveRateLimiter(base_requests_per_minute=10, load_threshold=0.8)
+    monitor.limiter = limiter
+    with ExitStack() as calls:
+        for _ in range(8):  # Every admission slot busy
+            calls.enter_context(monitor.track_llm_call())
+        assert monitor.sample(loop_lag=0.0) == 1.0
+    assert limiter.max_requests < 10
+
+
+def test_queued_llm_calls_count_as_load(monkeypatch):
+    monkeypatch.setattr(LLM_QUEUE_DEPTH, "value", lambda: 4)
+    monitor = LoadMonitor(llm_capacity=8)
+    with monitor.track_llm_call(), monitor.track_llm_call():
+        assert monitor.sample(loop_lag=0.0) == 0.75
+    assert monitor.get_stats()["llm_queued"] == 4
+
+
+def test_expired_rate_limit_clients_are_purged_in_the_background():
+    limiter = RateLimiter(requests_per_minute=5, window_seconds=0.05)
+    monitor = LoadMonitor(interval=0.01, cleanup_interval=0.02)
+
+    async def run():
+        monitor.start(limiter)
+        limiter.is_allowed("anonymous")
+        assert "anonymous" in limiter.client_requests
+        await asyncio.sleep(0.3)  # The client's window has passed
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert "anonymous" not in limiter.client_requests
+
+
+def test_gcra_schedules_behind_the_adaptive_limiter_are_purged_in_the_background():
+    gcra = GCRARateLimiter(requests_per_minute=5, window_seconds=0.05, stripes=4)
+    limiter = AdaptiveRateLimiter(base_requests_per_minute=5, window_seconds=0.05, backend=gcra)
+    monitor = LoadMonitor(interval=0.01, cleanup_interval=0.02)
+
+    async def run():
+        monitor.start(limiter)
+        for i in range(20):
+            limiter.is_allowed(f"client-{i}")
+        assert sum(len(tats) for tats in gcra._tats) == 20
+        await asyncio.sleep(0.3)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert sum(len(tats) for tats in gcra._tats) == 0
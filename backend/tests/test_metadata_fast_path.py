@@ -0,0 +1,32 @@
+"""
+Tests for the metadata fast path: a course's sections fetched by course_code and ranked without a vector search.
+"""
+import numpy as np
+import pytest
+
+from stubs import SYNTHETIC_SECTIONS
+
+
+def no_vector_search(*args, **kwargs):
+    pytest.fail("the course lookup ran a vector search")
+
+
+def test_a_course_question_fetches_its_sections_by_metadata(stub_engine, monkeypatch):
+    question = "How is DIT105 assessed in the examination?"
+    plan = stub_engine._plan_retrieval(question, "course")
+    lookups = [search for search in plan.searches if search.search_type == "metadata"]
+    assert [search.filter for search in lookups] == [{"course_code": "DIT105"}]
+
+    for method in ("similarity_search", "similarity_search_by_vector", "similarity_search_with_relevance_scores",
+                   "similarity_search_by_vector_with_relevance_scores", "max_marginal_relevance_search_by_vector"):
+        monkeypatch.setattr(stub_engine.vector_store, method, no_vector_search)
+    embedding = stub_engine.embeddings.embed_query(question)
+    documents = stub_engine._execute_search(lookups[0], embedding)
+
+    assert {doc.metadata["course_code"] for doc in documents} == {"DIT105"}
+    assert len(documents) == 1 + len(SYNTHETIC_SECTIONS)  # The overview and every section
+    # Ranked by cosine similarity to the query embedding
+    vectors = np.asarray(stub_engine.embeddings.embed_documents([doc.page_content for doc in documents]))
+    similarities = vectors @ np.asarray(embedding) / np.linalg.norm(vectors, axis=1) / np.linalg.norm(embedding)
+    assert list(similarities) == sorted(similarities, reverse=True)
+    assert documents[0].metadata.get("section_name") == "Assessment"
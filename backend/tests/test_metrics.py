@@ -0,0 +1,113 @@
+"""
+Tests for the dependency-free Prometheus metrics (text format, histograms, timing helpers).
+"""
+import asyncio
+
+import pytest
+
+from metrics import MetricsRegistry, _Metric
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counters_render_labels_in_order_and_unlabelled_zero(registry):
+    requests = registry.counter("requests_total", "Requests", ["cache", "result"])
+    errors = registry.counter("errors_total", "Errors")
+    requests.inc(cache="response", result="hit")
+    requests.inc(2, result="miss", cache="response")
+    assert requests.value(cache="response", result="miss") == 2
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{cache="response",result="hit"} 1',
+        'requests_total{cache="response",result="miss"} 2',
+        "# HELP errors_total Errors",
+        "# TYPE errors_total counter",
+        "errors_total 0",
+    ]
+    with pytest.raises(ValueError):
+        errors.inc(-1)
+
+
+def test_labels_must_match_exactly(registry):
+    counter = registry.counter("requests_total", "Requests", ["cache"])
+    with pytest.raises(ValueError):
+        counter.inc(cache="response", result="hit")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_label_values_are_escaped(registry):
+    counter = registry.counter("errors_total", "Errors", ["error_type"])
+    counter.inc(error_type='say "hi"\\\n')
+    assert 'errors_total{error_type="say \\"hi\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_duplicate_names_are_rejected(registry):
+    registry.gauge("queue_depth", "Depth")
+    with pytest.raises(ValueError):
+        registry.counter("queue_depth", "Depth")
+
+
+def test_a_metric_without_samples_cannot_be_instantiated():
+    class Untyped(_Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Untyped("untyped", "No samples")
+
+
+def test_gauges_go_up_and_down(registry):
+    gauge = registry.gauge("in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.value() == 1
+    gauge.set(0.5)
+    assert "in_flight 0.5" in registry.render()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = registry.histogram("duration_seconds", "Duration", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="llm")
+    assert histogram.count(stage="llm") == 4
+    assert histogram.count(stage="embedding") == 0
+    assert registry.render().splitlines()[2:] == [
+        'duration_seconds_bucket{stage="llm",le="0.1"} 2',
+        'duration_seconds_bucket{stage="llm",le="1.0"} 3',
+        'duration_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'duration_seconds_sum{stage="llm"} 3.65',
+        'duration_seconds_count{stage="llm"} 4',
+    ]
+
+
+def test_timed_observes_sync_and_async_calls_even_when_they_raise(registry):
+    histogram = registry.histogram("duration_seconds", "Duration", ["stage"])
+
+    @histogram.timed(stage="sync")
+    def failing():
+        raise RuntimeError("boom")
+
+    @histogram.timed(stage="async")
+    async def waiting():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    with pytest.raises(RuntimeError):
+        failing()
+    assert asyncio.run(waiting()) == "done"
+    assert histogram.count(stage="sync") == 1 and histogram.count(stage="async") == 1
+    with pytest.raises(ValueError):
+        histogram.timed(phase="llm")  # Wrong labels fail at decoration time
+
+
+def test_engine_queries_record_stage_durations(stub_engine):
+    from metrics import QUERY_DURATION, STAGE_DURATION
+    queries, llm_calls = QUERY_DURATION.count(method="query"), STAGE_DURATION.count(stage="llm")
+    stub_engine.query("What is DIT120 about?")
+    assert QUERY_DURATION.count(method="query") == queries + 1
+    assert STAGE_DURATION.count(stage="llm") == llm_calls + 1
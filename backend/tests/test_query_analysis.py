@@ -0,0 +1,102 @@
+"""
+Tests for single-pass query analysis (phrase trie, course codes, typos, context markers).
+"""
+import random
+import re
+
+import pytest
+
+from query_analysis import QueryAnalyzer, _trie_pattern
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return QueryAnalyzer()
+
+
+QUESTIONS = [
+    "What are the prerequisites for DIT100?",
+    "Which courses in department of computer science are taught in English?",
+    "What courses are in the master programme in software engineering?",
+    "Is HP101 worth 7.5 hp?",
+    "Tell me about the same course, the grading and the exam",
+    "Courses in department of mathematical sciences for a bachelor degree",
+    "who teaches lt2001 and what is the assessment?",
+    "second cycle courses with 15 credits",
+    "",
+]
+
+
+def random_questions(vocabulary, count=200, seed=7):
+    """Questions glued together from vocabulary phrases, fragments and course codes."""
+    rng = random.Random(seed)
+    pieces = list(vocabulary) + [phrase[:rng.randint(1, len(phrase))] for phrase in vocabulary] + \
+        ["DIT100", "hp101", " ", "?", "-", "what"]
+    return ["".join(rng.choice(pieces) + rng.choice(["", " "]) for _ in range(rng.randint(1, 8)))
+            for _ in range(count)]
+
+
+def test_trie_pattern_matches_the_longest_phrase():
+    pattern = re.compile(_trie_pattern(["program", "programme", "prerequisites", "pre"]))
+    assert pattern.match("programme").group(0) == "programme"
+    assert pattern.match("programs").group(0) == "program"
+    assert pattern.match("prereq").group(0) == "pre"
+    assert pattern.match("course") is None
+
+
+def test_phrases_match_separate_substring_checks(analyzer):
+    vocabulary = set(QueryAnalyzer.default_vocabulary())
+    for question in QUESTIONS + random_questions(vocabulary):
+        analysis = analyzer.analyze(question)
+        expected = {phrase for phrase in vocabulary if phrase in analysis.lower}
+        assert analysis.phrases == expected, question
+
+
+def test_course_codes_are_found_in_order_without_duplicates(analyzer):
+    analysis = analyzer.analyze("Compare dit100, MSG200 and DIT100 with LT2001")
+    assert analysis.course_codes == ("DIT100", "MSG200", "LT2001")
+    assert analysis.course_code == "DIT100"
+
+
+def test_a_phrase_starting_a_course_code_is_found(analyzer):
+    analysis = analyzer.analyze("Is HP101 hard?")
+    assert analysis.course_codes == ("HP101",)
+    assert "hp" in analysis.phrases
+
+
+def test_credit_value_is_extracted_for_credit_questions(analyzer):
+    assert analyzer.analyze("Which courses give 7.5 credits?").credits == "7.5"
+    assert analyzer.analyze("What is DIT100 about?").credits is None
+
+
+def test_typos_are_corrected_as_whole_words():
+    analyzer = QueryAnalyzer(vocabulary=["machine"], typo_corrections={"machien": "machine", "programm": "program"},
+                             suspicious_patterns=[])
+    analysis = analyzer.analyze("  What is Machien learning in the programme?  ")
+    assert analysis.text == "What is machine learning in the programme?"
+    assert analysis.original == "  What is Machien learning in the programme?  "
+    assert "machine" in analysis.phrases
+
+
+def test_suspicious_input_is_flagged(analyzer):
+    assert analyzer.analyze("<script>alert(1)</script> prerequisites?").suspicious_pattern
+    assert analyzer.analyze("What are the prerequisites?").suspicious_pattern is None
+
+
+def test_context_marker_round_trips(analyzer):
+    analysis = analyzer.analyze("What are the prerequisites?").with_context("DIT100")
+    assert analysis.enhanced_text == "What are the prerequisites? (context: DIT100)"
+    parsed = analyzer.analyze(analysis.enhanced_text)
+    assert parsed.text == "What are the prerequisites?"
+    assert parsed.context_course_code == "DIT100"
+    assert parsed.course_code == "DIT100"
+
+
+def test_course_scope_includes_the_history_course(analyzer):
+    analysis = analyzer.analyze("Compare MSG200 and DIT100").with_context("DIT105")
+    assert analysis.course_scope == "DIT100,DIT105,MSG200"
+
+
+def test_an_analysis_is_returned_unchanged(analyzer):
+    analysis = analyzer.analyze("What is DIT100?")
+    assert analyzer.analyze(analysis) is analysis
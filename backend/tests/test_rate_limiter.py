@@ -0,0 +1,162 @@
+"""
+Tests for the rate limiter backends (window limits, batch costs, Retry-After, shared SQLite state).
+"""
+import time
+
+import pytest
+
+from rate_limiter import AdaptiveRateLimiter, RateLimiter, SQLiteRateLimiter, create_rate_limiter
+
+
+class Clock:
+    """Controllable time.time() for the limiters."""
+
+    def __init__(self, monkeypatch):
+        self.now = 1_000_000.0
+        monkeypatch.setattr(time, "time", lambda: self.now)
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path, clock):
+    return create_rate_limiter(request.param, 5, 60, str(tmp_path / "rate_limits.db"))
+
+
+def test_requests_up_to_the_limit_are_allowed(limiter):
+    results = [limiter.is_allowed("client") for _ in range(6)]
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert results[0].remaining_requests == 4
+    assert results[-1].remaining_requests == 0
+    assert limiter.get_client_stats("client")["current_requests"] == 5
+
+
+def test_clients_are_limited_separately(limiter):
+    for _ in range(5):
+        limiter.is_allowed("a")
+    assert not limiter.is_allowed("a").allowed
+    assert limiter.is_allowed("b").allowed
+    assert limiter.get_global_stats()["total_active_clients"] == 2
+
+
+def test_retry_after_is_when_the_oldest_request_expires(limiter, clock):
+    limiter.is_allowed("client")
+    clock.advance(20)
+    for _ in range(4):
+        limiter.is_allowed("client")
+    rejected = limiter.is_allowed("client")
+    assert rejected.retry_after == pytest.approx(40)
+    clock.advance(40.5)
+    assert limiter.is_allowed("client").allowed
+
+
+def test_cost_is_admitted_all_at_once_or_not_at_all(limiter, clock):
+    assert limiter.is_allowed("client", cost=3).allowed
+    rejected = limiter.is_allowed("client", cost=3)
+    assert not rejected.allowed
+    assert limiter.get_client_stats("client")["current_requests"] == 3  # Nothing of the rejected batch counted
+    assert rejected.retry_after == pytest.approx(60)
+    assert limiter.is_allowed("client", cost=2).allowed
+
+
+def test_cost_above_the_limit_is_never_allowed(limiter):
+    rejected = limiter.is_allowed("client", cost=6)
+    assert not rejected.allowed
+    assert rejected.retry_after == 60
+    assert limiter.get_client_stats("client")["current_requests"] == 0
+
+
+def test_reset_and_cleanup(limiter, clock):
+    limiter.is_allowed("a")
+    limiter.is_allowed("b")
+    assert limiter.reset_client("a") is True
+    assert limiter.reset_client("a") is False
+    clock.advance(61)
+    assert limiter.cleanup_expired() == 1
+    assert limiter.get_global_stats()["total_active_requests"] == 0
+
+
+def test_sqlite_limits_are_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / "rate_limits.db")
+    first, second = SQLiteRateLimiter(path, 3, 60), SQLiteRateLimiter(path, 3, 60)
+    assert first.is_allowed("client", cost=2).allowed
+    assert second.is_allowed("client").allowed
+    assert not first.is_allowed("client").allowed
+
+
+def test_unknown_backend_falls_back_to_memory():
+    assert type(create_rate_limiter("redis", 5, 60)) is RateLimiter
+
+
+@pytest.fixture
+def gcra(clock):
+    return create_rate_limiter("gcra", 5, 60)
+
+
+def test_gcra_allows_a_burst_of_the_limit_then_one_request_per_interval(gcra, clock):
+    assert [gcra.is_allowed("client").allowed for _ in range(6)] == [True] * 5 + [False]
+    rejected = gcra.is_allowed("client")
+    assert rejected.retry_after == pytest.approx(12)  # window / limit
+    clock.advance(12)
+    assert gcra.is_allowed("client").allowed
+    assert not gcra.is_allowed("client").allowed
+
+
+def test_gcra_rejected_requests_do_not_push_the_schedule(gcra, clock):
+    for _ in range(5):
+        gcra.is_allowed("client")
+    for _ in range(10):
+        gcra.is_allowed("client")
+    clock.advance(12)
+    assert gcra.is_allowed("client").allowed
+
+
+def test_gcra_cost_is_admitted_all_at_once_or_not_at_all(gcra, clock):
+    assert gcra.is_allowed("client", cost=3).allowed
+    assert gcra.is_allowed("client").remaining_requests == 1
+    rejected = gcra.is_allowed("client", cost=2)
+    assert not rejected.allowed and rejected.retry_after == pytest.approx(12)
+    assert gcra.get_client_stats("client")["current_requests"] == 4
+
+
+def test_gcra_clients_on_every_stripe_are_tracked(clock):
+    gcra = create_rate_limiter("gcra", 1, 60)
+    clients = [f"client-{i}" for i in range(200)]
+    assert all(gcra.is_allowed(client).allowed for client in clients)
+    assert not any(gcra.is_allowed(client).allowed for client in clients)
+    stats = gcra.get_global_stats()
+    assert stats["total_active_clients"] == 200 and stats["total_active_requests"] == 200
+
+
+def test_gcra_cleanup_drops_clients_back_on_schedule(gcra, clock):
+    gcra.is_allowed("a")
+    gcra.is_allowed("b", cost=5)
+    clock.advance(13)
+    assert gcra.cleanup_expired() == 1
+    assert gcra.get_client_stats("b")["current_requests"] == 4
+    assert gcra.reset_client("b") is True and gcra.reset_client("a") is False
+
+
+@pytest.mark.parametrize("load, limit", [(0.5, 10), (0.8, 10), (0.9, 5), (1.0, 1), (7.0, 1)])
+def test_adaptive_limit_shrinks_above_the_load_threshold(load, limit):
+    limiter = AdaptiveRateLimiter(base_requests_per_minute=10, load_threshold=0.8)
+    limiter.update_system_load(load)
+    assert limiter.max_requests == limit
+    limiter.update_system_load(0.0)
+    assert limiter.max_requests == 10
+
+
+def test_adaptive_limiter_drives_its_backend(clock):
+    backend = create_rate_limiter("gcra", 10, 60)
+    limiter = AdaptiveRateLimiter(base_requests_per_minute=10, load_threshold=0.8, backend=backend)
+    limiter.update_system_load(0.9)
+    assert backend.max_requests == 5
+    assert [limiter.is_allowed("client").allowed for _ in range(6)] == [True] * 5 + [False]
+    assert limiter.get_client_stats("client") == backend.get_client_stats("client")
+    assert limiter.get_load_stats()["effective_limit"] == 5
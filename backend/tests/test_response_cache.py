@@ -0,0 +1,95 @@
+"""
+Tests for the response cache backends (LRU/TTL eviction, SQLite batched eviction and key versions).
+"""
+import sqlite3
+import time
+
+import pytest
+
+from response_cache import InMemoryResponseCache, ResponseCache, SQLiteResponseCache, create_response_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    return create_response_cache(request.param, max_size=50, ttl=60, db_path=str(tmp_path / "cache.db"))
+
+
+def test_set_get_delete_clear(cache):
+    cache.set("a", {"answer": "A"})
+    cache.set("b", {"answer": "B"})
+    assert cache.get("a") == {"answer": "A"}
+    assert cache.get("missing") is None
+    assert cache.size() == 2
+    assert sorted(cache.keys(limit=5)) == ["a", "b"]
+    cache.delete("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_expired_entries_are_not_returned(cache, monkeypatch):
+    cache.set("a", {"answer": "A"})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("a") is None
+
+
+def test_memory_cache_evicts_the_least_recently_used():
+    cache = InMemoryResponseCache(max_size=3, ttl=60)
+    for key in "abc":
+        cache.set(key, {"answer": key})
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("d", {"answer": "d"})
+    assert cache.get("b") is None
+    assert [cache.get(key)["answer"] for key in "acd"] == ["a", "c", "d"]
+    assert cache.size() == 3
+
+
+def test_sqlite_cache_evicts_in_batches_and_keeps_the_newest(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.db"), max_size=100, ttl=60)
+    assert cache._eviction_interval == 10
+    for i in range(109):
+        cache.set(f"k{i}", {"answer": i})
+    assert cache.size() == 109  # No eviction yet: it runs every 10 inserts
+    cache.set("k109", {"answer": 109})
+    assert cache.size() == 100
+    assert cache.get("k9") is None
+    assert cache.get("k10") == {"answer": 10}
+
+
+def test_sqlite_cache_eviction_counts_from_the_newest_despite_replaced_keys(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.db"), max_size=10, ttl=60)
+    for i in range(10):
+        cache.set("same", {"answer": i})  # Every replace leaves a rowid gap
+    for i in range(10):
+        cache.set(f"k{i}", {"answer": i})
+    assert cache.size() == 10
+    assert cache.get("same") is None
+    assert all(cache.get(f"k{i}") == {"answer": i} for i in range(10))
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteResponseCache(path, max_size=10, ttl=60).set("a", {"answer": "A"})
+    assert SQLiteResponseCache(path, max_size=10, ttl=60).get("a") == {"answer": "A"}
+
+
+def test_sqlite_cache_drops_entries_with_outdated_keys(tmp_path):
+    path = tmp_path / "cache.db"
+    SQLiteResponseCache(str(path), max_size=10, ttl=60).set("a", {"answer": "A"})
+    with sqlite3.connect(path) as conn:
+        conn.execute(f"PRAGMA user_version = {SQLiteResponseCache.KEY_VERSION - 1}")
+    assert SQLiteResponseCache(str(path), max_size=10, ttl=60).get("a") is None
+
+
+def test_unknown_backend_falls_back_to_memory():
+    assert isinstance(create_response_cache("redis", max_size=10, ttl=60), InMemoryResponseCache)
+
+
+def test_an_incomplete_backend_cannot_be_instantiated():
+    class GetOnlyCache(ResponseCache):
+        def get(self, cache_key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyCache(max_size=10, ttl=60)
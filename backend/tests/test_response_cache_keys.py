@@ -0,0 +1,89 @@
+"""
+Tests that cached answers are scoped to the course a follow-up question refers to.
+"""
+import asyncio
+
+import main
+from rag_system import ConversationContext
+
+
+def conversation_about(course_code: str) -> ConversationContext:
+    """A conversation whose last answer was about course_code."""
+    conversation = ConversationContext(client_id=f"client-{course_code}")
+    conversation.rate_limit_checked = True
+    conversation.load_chat_history([
+        {"role": "user", "content": f"Tell me about {course_code}"},
+        {"role": "assistant", "content": f"{course_code} is a course.", "top_courses": [course_code]},
+    ])
+    return conversation
+
+
+def fresh_conversation() -> ConversationContext:
+    conversation = ConversationContext(client_id="client")
+    conversation.rate_limit_checked = True
+    return conversation
+
+
+def test_follow_ups_about_different_courses_do_not_share_a_cached_answer(stub_engine):
+    first = stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT101"))
+    second = stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT130"))
+
+    assert not second.get("cache_hit")
+    assert "DIT130" in second["answer"] and "DIT130" not in first["answer"]
+
+
+def test_follow_ups_about_the_same_course_share_a_cached_answer(stub_engine):
+    first = stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT101"))
+    second = stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT101"))
+
+    assert second.get("cache_hit")
+    assert second["answer"] == first["answer"]
+
+
+def test_follow_up_does_not_reuse_the_answer_to_the_bare_question(stub_engine):
+    stub_engine.query("What are the prerequisites?", conversation=fresh_conversation())
+    follow_up = stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT130"))
+
+    assert not follow_up.get("cache_hit")
+    assert "DIT130" in follow_up["answer"]
+
+
+def test_async_follow_ups_are_scoped_too(stub_engine):
+    async def main():
+        await stub_engine.aquery("What are the prerequisites?", conversation=conversation_about("DIT101"))
+        return await stub_engine.aquery("What are the prerequisites?", conversation=conversation_about("DIT130"))
+
+    second = asyncio.run(main())
+    assert not second.get("cache_hit")
+    assert "DIT130" in second["answer"]
+
+
+def test_concurrent_follow_ups_are_coalesced_only_within_a_course(stub_engine, monkeypatch):
+    if not stub_engine.single_flight:
+        return
+    monkeypatch.setattr(stub_engine.llm, "latency", 0.2)  # Keep the flights in the air together
+
+    async def main():
+        return await asyncio.gather(*[
+            stub_engine.aquery("What are the prerequisites?", conversation=conversation_about(code))
+            for code in ("DIT101", "DIT130", "DIT101")
+        ])
+
+    dit101, dit130, dit101_again = asyncio.run(main())
+    assert "DIT130" in dit130["answer"] and not dit130.get("coalesced")
+    assert "DIT130" not in dit101["answer"]
+    assert dit101_again.get("coalesced") and dit101_again["answer"] == dit101["answer"]
+
+
+def test_a_data_reload_drops_cached_answers(stub_engine, monkeypatch):
+    stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT101"))
+    assert stub_engine.response_cache.size() == 1
+
+    monkeypatch.setattr(main, "rag_system", stub_engine)
+    monkeypatch.setattr(stub_engine, "initialize_vector_store", lambda force_reload=False: 0)
+    monkeypatch.setattr(stub_engine, "load_catalog", lambda: None)
+    asyncio.run(main.reload_rag_system())
+
+    assert stub_engine.response_cache.size() == 0
+    again = stub_engine.query("What are the prerequisites?", conversation=conversation_about("DIT101"))
+    assert not again.get("cache_hit")
@@ -0,0 +1,87 @@
+"""
+Tests for the lightweight /search mode (doc_type filter, relevance scores and cursor paging).
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import RAGConfig
+
+
+@pytest.fixture
+def client(stub_engine, monkeypatch):
+    monkeypatch.setattr(main, "rag_system", stub_engine)
+    return TestClient(main.app)
+
+
+def test_cursors_round_trip_and_are_tied_to_their_search():
+    cursor = main.encode_search_cursor(20, "machine learning", "course")
+    assert main.decode_search_cursor(cursor, "machine learning", "course") == 20
+    for q, doc_type in [("databases", "course"), ("machine learning", "program"), ("machine learning", None)]:
+        with pytest.raises(ValueError):
+            main.decode_search_cursor(cursor, q, doc_type)
+    with pytest.raises(ValueError):
+        main.decode_search_cursor("not-a-cursor", "machine learning", "course")
+
+
+def test_a_cursor_from_another_search_is_rejected(client):
+    first = client.get("/search", params={"q": "machine learning", "doc_type": "course", "limit": 5}).json()
+    assert first["next_cursor"]
+    for params in [{"q": "databases", "doc_type": "course"}, {"q": "machine learning", "doc_type": "program"}]:
+        response = client.get("/search", params={**params, "cursor": first["next_cursor"]})
+        assert response.status_code == 400
+
+
+def test_pages_continue_where_the_previous_one_ended(client):
+    params = {"q": "machine learning", "doc_type": "course", "limit": 5}
+    first = client.get("/search", params=params).json()
+    second = client.get("/search", params={**params, "cursor": first["next_cursor"]}).json()
+    everything = client.get("/search", params={**params, "limit": 10}).json()
+    assert first["results"] + second["results"] == everything["results"]
+    scores = [result["score"] for result in everything["results"]]
+    assert scores == sorted(scores, reverse=True) and all(0 <= score <= 1 for score in scores)
+
+
+def test_scores_match_chroma_relevance_scores(stub_engine):
+    page, _ = stub_engine.search_documents("machine learning", limit=5)
+    expected = stub_engine.vector_store.similarity_search_with_relevance_scores("machine learning", k=5)
+    assert [score for _, score in page] == pytest.approx([score for _, score in expected])
+
+
+def test_doc_type_groups_become_an_in_filter(client, stub_engine, monkeypatch):
+    filters = []
+    search = stub_engine.vector_store.similarity_search_by_vector_with_relevance_scores
+
+    def recording_search(embedding, k, filter=None):
+        filters.append(filter)
+        return search(embedding, k=k, filter=filter)
+
+    monkeypatch.setattr(stub_engine.vector_store, "similarity_search_by_vector_with_relevance_scores", recording_search)
+    client.get("/search", params={"q": "machine learning", "doc_type": "course"})
+    overviews = client.get("/search", params={"q": "machine learning", "doc_type": "course_overview"}).json()
+    client.get("/search", params={"q": "machine learning"})
+
+    assert filters == [
+        {"doc_type": {"$in": ["course_overview", "course_section", "course_details"]}},
+        {"doc_type": {"$in": ["course_overview"]}},
+        None,
+    ]
+    assert {result["metadata"]["doc_type"] for result in overviews["results"]} == {"course_overview"}
+
+
+def test_paging_stops_at_search_max_results(client, monkeypatch):
+    monkeypatch.setattr(RAGConfig, "SEARCH_MAX_RESULTS", 12)
+    params = {"q": "machine learning", "limit": 5}
+    seen, cursor = [], None
+    while True:
+        page = client.get("/search", params={**params, "cursor": cursor} if cursor else params).json()
+        seen.extend(page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(page["results"]) == 2  # The last page is cut at the cap
+    assert len(seen) == 12
+
+
+def test_an_unknown_mode_is_rejected(client):
+    assert client.get("/search", params={"q": "machine learning", "mode": "Full"}).status_code == 422
@@ -0,0 +1,96 @@
+"""
+Tests for the semantic response cache (threshold, course scoping, eviction, hit accounting).
+"""
+import asyncio
+
+import pytest
+
+from semantic_cache import SemanticResponseCache
+
+
+@pytest.fixture
+def semantic_engine(stub_engine, monkeypatch):
+    monkeypatch.setattr(stub_engine, "semantic_cache", SemanticResponseCache(threshold=0.9, max_size=100))
+    return stub_engine
+
+
+def test_similar_embeddings_match_above_the_threshold():
+    cache = SemanticResponseCache(threshold=0.9, max_size=10)
+    cache.add("key-a", [1.0, 0.0, 0.0])
+    cache.add("key-b", [0.0, 1.0, 0.0])
+    key, similarity = cache.lookup([0.95, 0.1, 0.0])
+    assert key == "key-a" and similarity > 0.9
+    assert cache.lookup([0.6, 0.6, 0.5]) is None
+
+
+def test_matches_never_cross_scopes():
+    cache = SemanticResponseCache(threshold=0.9, max_size=10)
+    cache.add("dit100", [1.0, 0.0], scope="DIT100")
+    assert cache.lookup([1.0, 0.0], scope="DIT101") is None
+    assert cache.lookup([1.0, 0.0], scope="DIT100")[0] == "dit100"
+
+
+def test_oldest_entry_is_evicted_when_full():
+    cache = SemanticResponseCache(threshold=0.9, max_size=2)
+    cache.add("a", [1.0, 0.0, 0.0])
+    cache.add("b", [0.0, 1.0, 0.0])
+    cache.add("c", [0.0, 0.0, 1.0])
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.lookup([0.0, 0.0, 1.0])[0] == "c"
+    assert cache.get_stats()["size"] == 2
+
+
+def test_hits_are_counted_only_when_the_response_still_exists():
+    cache = SemanticResponseCache(threshold=0.9, max_size=10)
+    cache.add("a", [1.0, 0.0])
+    cache.resolve(cache.lookup([1.0, 0.0])[0], found=True)
+    cache.resolve(cache.lookup([1.0, 0.0])[0], found=False)  # The exact entry expired
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert cache.lookup([1.0, 0.0]) is None  # The stale entry was dropped
+
+
+def test_mismatched_embedding_sizes_are_ignored():
+    cache = SemanticResponseCache(threshold=0.9, max_size=10)
+    cache.add("a", [1.0, 0.0])
+    cache.add("b", [1.0, 0.0, 0.0])
+    assert cache.get_stats()["size"] == 1
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+
+
+def test_engine_answers_a_paraphrase_from_the_cache(semantic_engine):
+    first = semantic_engine.query("What are the prerequisites for DIT105?")
+    llm_calls = semantic_engine.llm.calls
+    paraphrase = semantic_engine.query("what are the prerequisites for DIT105")
+    assert semantic_engine.llm.calls == llm_calls
+    assert paraphrase["semantic_cache_hit"] is True
+    assert paraphrase["answer"] == first["answer"]
+
+    # The stored entry is not annotated by the semantic hit
+    exact = semantic_engine.query("What are the prerequisites for DIT105?")
+    assert exact["cache_hit"] is True and "semantic_cache_hit" not in exact
+
+
+def test_engine_does_not_reuse_answers_across_courses(semantic_engine):
+    semantic_engine.query("What are the prerequisites for DIT105?")
+    other = semantic_engine.query("What are the prerequisites for DIT106?")
+    assert not other.get("cache_hit")
+    assert semantic_engine.semantic_cache.get_stats()["hits"] == 0
+
+
+def test_batch_questions_are_embedded_once_for_lookup_and_retrieval(semantic_engine, monkeypatch):
+    semantic_engine.query("What are the prerequisites for DIT105?")
+    monkeypatch.setattr(semantic_engine, "embedding_cache", None)
+    embedded = []
+    embed_documents = semantic_engine.embeddings.embed_documents
+    monkeypatch.setattr(semantic_engine.embeddings, "embed_documents",
+                        lambda texts, **kwargs: embedded.extend(texts) or embed_documents(texts, **kwargs))
+
+    questions = ["what are the prerequisites for DIT105", "How is DIT107 assessed?"]
+
+    async def collect():
+        return [item async for item in semantic_engine.aquery_batch(questions)]
+
+    results = {result["index"]: result for result in asyncio.run(collect())}
+    assert results[0]["semantic_cache_hit"] is True and not results[1].get("cache_hit")
+    assert [text for text in embedded if text in questions] == questions
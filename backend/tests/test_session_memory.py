@@ -0,0 +1,100 @@
+"""
+Tests for server-side session memory (copy on read, merge on write, LRU + TTL).
+"""
+import time
+
+from session_memory import SessionMemoryStore
+
+
+def answer(text: str, *courses: str) -> dict:
+    return {"answer": text, "response_stats": {"top_courses": list(courses)}}
+
+
+def messages(context) -> list:
+    return [message.content for message in context.memory.chat_memory.messages]
+
+
+def test_turns_are_remembered_across_requests():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    assert messages(store.get("s1")) == []
+    store.remember("s1", "What is DIT100?", answer("DIT100 is about ML.", "DIT100"))
+    context = store.get("s1")
+    assert messages(context) == ["What is DIT100?", "DIT100 is about ML."]
+    assert context.chat_history_top_courses == ["DIT100"]
+    assert store.get_stats()["hits"] == 1 and store.get_stats()["misses"] == 1
+
+
+def test_a_request_mutating_its_copy_does_not_touch_the_session():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    context = store.get("s1")
+    context.memory.save_context({"question": "half-finished"}, {"answer": "turn"})
+    context.chat_history_top_courses.append("DIT999")
+    fresh = store.get("s1")
+    assert messages(fresh) == [] and fresh.chat_history_top_courses == []
+
+
+def test_concurrent_turns_of_a_session_are_both_merged():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    first, second = store.get("s1"), store.get("s1")
+    # Both requests generate their answer (which adds the turn to their own copy)
+    first.memory.save_context({"question": "About DIT100?"}, {"answer": "DIT100 answer"})
+    second.memory.save_context({"question": "About DIT101?"}, {"answer": "DIT101 answer"})
+    store.remember("s1", "About DIT100?", answer("DIT100 answer", "DIT100"))
+    store.remember("s1", "About DIT101?", answer("DIT101 answer", "DIT101"))
+    context = store.get("s1")
+    assert messages(context) == ["About DIT100?", "DIT100 answer", "About DIT101?", "DIT101 answer"]
+    assert context.chat_history_top_courses == ["DIT101", "DIT100"]
+
+
+def test_a_repeated_answer_is_remembered_as_its_own_turn():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    # e.g. the same question answered from the cache, or the generic fallback text twice
+    store.remember("s1", "What is DIT100?", answer("DIT100 is about ML.", "DIT100"))
+    store.remember("s1", "What is DIT100?", answer("DIT100 is about ML.", "DIT100"))
+    assert messages(store.get("s1")) == ["What is DIT100?", "DIT100 is about ML."] * 2
+
+
+def test_client_chat_history_replaces_the_remembered_one():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    store.remember("s1", "Old question", answer("Old answer", "DIT100"))
+    history = [{"role": "user", "content": "Edited question"},
+               {"role": "assistant", "content": "Edited answer", "top_courses": ["DIT105"]}]
+    store.remember("s1", "Next question", answer("Next answer"), chat_history=history)
+    context = store.get("s1")
+    assert messages(context) == ["Edited question", "Edited answer", "Next question", "Next answer"]
+    assert context.chat_history_top_courses == ["DIT105"]
+
+
+def test_failed_turns_are_not_remembered():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    store.remember("s1", "Question", {"answer": "", "error": "LLM failed"})
+    assert messages(store.get("s1")) == []
+
+
+def test_least_recently_used_sessions_are_evicted():
+    store = SessionMemoryStore(max_sessions=2, ttl=60)
+    for session_id in ("a", "b"):
+        store.remember(session_id, "Question", answer(f"Answer {session_id}"))
+    store.get("a")  # "b" is now the least recently used
+    store.remember("c", "Question", answer("Answer c"))
+    assert store.get_stats()["evictions"] == 1
+    assert messages(store.get("a")) == ["Question", "Answer a"]
+    assert messages(store.get("b")) == []
+
+
+def test_idle_sessions_expire(monkeypatch):
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    store.remember("s1", "Question", answer("Answer"))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert messages(store.get("s1")) == []
+    stats = store.get_stats()
+    assert stats["expirations"] == 1 and stats["misses"] == 1
+
+
+def test_discard_forgets_the_session():
+    store = SessionMemoryStore(max_sessions=10, ttl=60)
+    store.remember("s1", "Question", answer("Answer"))
+    assert store.discard("s1") is True
+    assert store.discard("s1") is False
+    assert messages(store.get("s1")) == []
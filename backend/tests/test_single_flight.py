@@ -0,0 +1,213 @@
+"""
+Tests for single-flight request coalescing (leader/follower hand-off, cancellation, errors).
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import RAGConfig
+from llm_admission import LLMOverloadedError
+from rag_system import ConversationContext
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"answer": "42"}
+
+    async def main():
+        return await asyncio.gather(*[flight.do("key", compute) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [coalesced for _, coalesced in results].count(False) == 1
+    assert all(result == {"answer": "42"} for result, _ in results)
+    assert flight.get_stats()["coalesced"] == 4
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0.01, "a")),
+                                    flight.do("b", lambda: asyncio.sleep(0.01, "b")))
+
+    assert asyncio.run(main()) == [("a", False), ("b", False)]
+    assert flight.executions == 2
+
+
+def test_leader_error_fans_out_to_followers():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("LLM failed")
+
+    async def main():
+        return await asyncio.gather(*[flight.do("key", failing) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.in_flight() == 0
+
+
+def test_cancelled_leader_keeps_computing_for_followers():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)  # Let the leader claim the flight
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == ("answer", True)
+    assert flight.executions == 1
+
+
+def test_cancelled_follower_does_not_cancel_the_flight():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == ("answer", False)
+
+
+def test_streaming_leader_resolves_followers():
+    """claim()/resolve() as used by astream_query: followers get the leader's final response."""
+    flight = SingleFlight()
+
+    async def main():
+        future, is_leader = flight.claim("key")
+        follower_future, follower_is_leader = flight.claim("key")
+        assert is_leader and not follower_is_leader and follower_future is future
+        flight.resolve("key", future, result="streamed")
+        return await follower_future
+
+    assert asyncio.run(main()) == "streamed"
+    assert flight.in_flight() == 0
+
+
+def test_interrupted_stream_raises_in_followers_and_frees_the_key():
+    flight = SingleFlight()
+
+    async def main():
+        future, _ = flight.claim("key")
+        follower_future, _ = flight.claim("key")
+        flight.resolve("key", future, error=RuntimeError("Streaming answer was interrupted"))
+        with pytest.raises(RuntimeError):
+            await follower_future
+        # The next request leads a new flight instead of joining the failed one
+        _, is_leader = flight.claim("key")
+        return is_leader
+
+    assert asyncio.run(main()) is True
+
+
+def test_sync_calls_share_one_execution_and_errors():
+    flight = SingleFlight()
+    calls = 0
+    started = threading.Event()
+
+    def compute():
+        nonlocal calls
+        calls += 1
+        started.set()
+        time.sleep(0.05)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do_sync("key", compute)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do_sync("key", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert calls == 1
+    assert sorted(results) == [("answer", False)] + [("answer", True)] * 3
+
+    started.clear()
+    errors = []
+
+    def failing():
+        started.set()
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do_sync("key", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait()
+    threads += [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert flight.in_flight() == 0
+
+
+def test_followers_of_a_shed_streaming_leader_get_the_overload_error(stub_engine, monkeypatch):
+    monkeypatch.setattr(RAGConfig, "LLM_OVERLOAD_FALLBACK", "error")
+    llm_attempts = 0
+
+    async def shed_answer(question, documents, conversation):
+        nonlocal llm_attempts
+        llm_attempts += 1
+        await asyncio.sleep(0.05)  # Queued for an admission slot while the follower joins
+        raise LLMOverloadedError("LLM overloaded", retry_after=7)
+        yield  # An async generator, like astream_answer
+
+    monkeypatch.setattr(stub_engine, "astream_answer", shed_answer)
+
+    async def stream():
+        conversation = ConversationContext(client_id="client")
+        conversation.rate_limit_checked = True
+        return [event async for event in stub_engine.astream_query("What is machine learning?", conversation)]
+
+    async def main():
+        leader = asyncio.ensure_future(stream())
+        await asyncio.sleep(0.01)  # The leader has claimed the flight
+        return await asyncio.gather(leader, stream())
+
+    leader_events, follower_events = asyncio.run(main())
+    assert llm_attempts == 1
+    assert leader_events[-1] == {"event": "error", "data": {"message": "LLM overloaded", "retry_after": 7}}
+    assert follower_events == [{"event": "error", "data": {"message": "LLM overloaded", "retry_after": 7}}]
+    assert stub_engine.single_flight.in_flight() == 0
@@ -0,0 +1,73 @@
+"""
+Tests for the summary memory mode (older turns folded into a bounded extractive summary).
+"""
+from config import RAGConfig
+from rag_system import ConversationContext
+
+
+def turns(*pairs) -> list:
+    history = []
+    for question, answer in pairs:
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return history
+
+
+def summary_context(*pairs) -> ConversationContext:
+    context = ConversationContext(client_id="client", memory_mode="summary")
+    context.load_chat_history(turns(*pairs))
+    return context
+
+
+def messages(context) -> list:
+    return [message.content for message in context.memory.chat_memory.messages]
+
+
+def test_each_turn_is_folded_once():
+    context = summary_context(("Q1", "A1"), ("Q2", "A2"), ("Q3", "A3"))
+    context.prompt_history()
+    context.prompt_history()
+    assert context.summary_lines == ["- Student asked: Q1 | Assistant: A1", "- Student asked: Q2 | Assistant: A2"]
+
+    context.memory.save_context({"question": "Q4"}, {"answer": "A4"})
+    context.prompt_history()
+    assert len(context.summary_lines) == 3 and context.summary_lines[-1].endswith("Q3 | Assistant: A3")
+
+
+def test_the_last_turn_stays_verbatim():
+    context = summary_context(("What is DIT100?", "A machine learning course."), ("Who teaches it?", "**Dr. Smith**"))
+    history = context.prompt_history()
+    assert history.endswith("Student: Who teaches it?\n\nAssistant: **Dr. Smith**")
+    assert history.startswith("Summary of earlier turns:\n- Student asked: What is DIT100?")
+    assert messages(context) == ["Who teaches it?", "**Dr. Smith**"]
+
+
+def test_the_summary_stays_within_its_token_budget(monkeypatch):
+    monkeypatch.setattr(RAGConfig, "SUMMARY_MEMORY_MAX_TOKENS", 60)  # About 240 characters
+    context = summary_context(*[(f"Question {i} " + "x" * 30, f"Answer {i}") for i in range(10)])
+    context.prompt_history()
+    assert sum(len(line) + 1 for line in context.summary_lines) <= 240
+    assert 1 < len(context.summary_lines) < 9
+    # The oldest lines are the ones dropped
+    assert context.summary_lines[-1].startswith("- Student asked: Question 8")
+    assert "Question 0" not in "\n".join(context.summary_lines)
+
+
+def test_recent_course_codes_come_first_and_are_capped(monkeypatch):
+    monkeypatch.setattr(ConversationContext, "MAX_SUMMARY_COURSE_CODES", 3)
+    context = summary_context(
+        ("What is DIT100?", "DIT100 is about ML, see also dit101."),
+        ("And DIT102?", "DIT102 is about databases."),
+        ("Compare DIT103 with DIT100", "DIT103 is harder than DIT100."),
+        ("Thanks", "You're welcome."),
+    )
+    context.prompt_history()
+    assert context.summary_course_codes == ["DIT103", "DIT100", "DIT102"]
+    assert "Courses discussed earlier: DIT103, DIT100, DIT102" in context.prompt_history()
+
+
+def test_remember_response_keeps_exactly_one_verbatim_turn():
+    context = summary_context(("Q1", "A1"), ("Q2", "A2"))
+    context.remember_response("Q3", {"answer": "A3", "response_stats": {"top_courses": ["DIT100"]}})
+    assert messages(context) == ["Q3", "A3"]
+    assert len(context.summary_lines) == 2
+    assert context.chat_history_top_courses == ["DIT100"]